@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CAMPAIGNR_CACHE", "off")  # time the real work, not the response cache
+os.environ.setdefault("CAMPAIGNR_TRACE", "off")  # nor the trace file writes around each stage
+
+from campaignr import engine
+from campaignr.clients import get_client
+from campaignr.mock_server import start_mock_server
+from campaignr.pdf import PdfRenderPool
+from campaignr.prompts import DEFAULT_PROPOSAL_PROMPT, DEFAULT_IMAGE_PROMPT
+from campaignr.proposal import extract_title_from_text, parse_text_for_html
+from campaignr.render import get_report_template
+
+# --- End-to-End Pipeline Benchmark ---
+# Times every stage of a campaign against the offline OpenAI stand-in and reports p50/p95 per stage.
+#   python benchmarks/bench_pipeline.py --runs 10
+#   python benchmarks/bench_pipeline.py --save-baseline        # record the current numbers
+#   python benchmarks/bench_pipeline.py                         # exits 1 if a stage regressed against the baseline
+# The generation stages include the mock's configured latency, so compare runs made with the same settings.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+CONCEPT = {'communication_issue': "Excessive and high-risk drinking on college campuses.",
+           'need_and_audience': "College students (18-24) often misperceive peer drinking norms.",
+           'main_goal': "To correct misperceptions of drinking norms and reduce high-risk drinking behaviors."}
+MIN_REGRESSION_S = 0.002  # ignore sub-millisecond noise on the fast stages
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))]
+
+def time_stage(fn, runs, repeat=1):
+    # repeat > 1 times fast stages in a loop and reports the per-call time.
+    durations, result = [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        for _ in range(repeat): result = fn()
+        durations.append((time.perf_counter() - started) / repeat)
+    return durations, result
+
+def run_benchmarks(args):
+    server = start_mock_server(ttft_s=args.ttft, tokens_per_s=args.tokens_per_sec, image_latency_s=args.image_latency, jitter=0)
+    client = get_client("sk-benchmark", base_url=server.base_url)
+    stages = {}
+
+    stages['format_prompt'], prompt = time_stage(lambda: engine.build_proposal_prompt(DEFAULT_PROPOSAL_PROMPT, CONCEPT), args.runs, repeat=1000)
+    stages['generate_stream'], (text, _) = time_stage(lambda: engine.stream_complete(client, prompt, use_cache=False), args.runs)
+    stages['generate_sections'], _ = time_stage(
+        lambda: engine.generate_proposal_by_sections(client, DEFAULT_PROPOSAL_PROMPT, CONCEPT, use_cache=False), args.runs)
+    image_prompt = DEFAULT_IMAGE_PROMPT.format(campaign_title=extract_title_from_text(text))
+    stages['generate_image'], cover = time_stage(lambda: engine.generate_cover_image(client, image_prompt, use_cache=False), args.runs)
+    stages['extract_title'], title = time_stage(lambda: extract_title_from_text(text), args.runs, repeat=1000)
+    stages['parse_sections'], sections = time_stage(lambda: parse_text_for_html(text), args.runs, repeat=100)
+    template = get_report_template()[0]
+    report_data = {'report_title': title, 'author_name': "Directed by Benchmark", 'title_image_b64': cover.report_b64,
+                   'title_image_mime': cover.report_mime, 'sections': sections, 'generation_date': "2025-01-01"}
+    stages['jinja_render'], html_content = time_stage(lambda: template.render(report_data), args.runs, repeat=10)
+    if not args.no_pdf:
+        pool = PdfRenderPool(args.pdf_backend, workers=1, max_queue=1)
+        try:
+            pool.render(html_content)  # warm-up, and checks that the backend works here at all
+            stages['pdf'], _ = time_stage(lambda: pool.render(html_content), args.runs)
+        except Exception as e:
+            print(f"PDF stage skipped: {e}".splitlines()[0])
+        pool.close()
+    server.shutdown()
+    return {name: {'p50_s': statistics.median(values), 'p95_s': percentile(values, 95), 'runs': len(values)}
+            for name, values in stages.items()}
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline: continue
+        before, after = baseline[name]['p50_s'], result['p50_s']
+        if after > before * (1 + tolerance) and after - before > MIN_REGRESSION_S:
+            regressions.append(f"{name}: p50 {before * 1000:.1f} ms -> {after * 1000:.1f} ms (+{(after / before - 1):.0%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each campaign pipeline stage against the offline OpenAI stand-in.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ttft", type=float, default=0.05, help="mock seconds to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=5000.0, help="mock token rate")
+    parser.add_argument("--image-latency", type=float, default=0.2, help="mock seconds per image")
+    parser.add_argument("--pdf-backend", default="pdfkit")
+    parser.add_argument("--no-pdf", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before flagging a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    print(f"{'stage':<20}{'p50':>12}{'p95':>12}")
+    for name, result in results.items():
+        print(f"{name:<20}{result['p50_s'] * 1000:>10.2f}ms{result['p95_s'] * 1000:>10.2f}ms")
+
+    settings = {'ttft': args.ttft, 'tokens_per_sec': args.tokens_per_sec, 'image_latency': args.image_latency}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json"), 'w') as f:
+        json.dump({'settings': settings, 'stages': results}, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f: json.dump({'settings': settings, 'stages': results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}"); return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save-baseline to record one."); return 0
+    baseline = json.load(open(args.baseline))
+    if baseline.get('settings') != settings:
+        print(f"Baseline was recorded with different mock settings {baseline.get('settings')}; not comparing."); return 0
+    regressions = compare(results, baseline['stages'], args.tolerance)
+    for line in regressions: print(f"REGRESSION {line}")
+    if not regressions: print("No regressions against the baseline.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
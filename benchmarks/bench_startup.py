@@ -0,0 +1,132 @@
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+# --- Startup Import-Time Benchmark ---
+# Imports each entry point in a fresh interpreter under `python -X importtime` and reports the p50 import time of
+# each, the slowest modules it pulls in, and any heavy dependency loaded eagerly that should only load on first use.
+#   python benchmarks/bench_startup.py --runs 10
+#   python benchmarks/bench_startup.py --save-baseline        # record the current numbers
+#   python benchmarks/bench_startup.py                         # exits 1 on a slower import or a new eager dependency
+# "app" runs the top-level imports of campaignr_app.py (Streamlit included) without running the page itself.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, "startup_baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+MIN_REGRESSION_S = 0.005  # interpreter start-up noise
+# Loaded on demand (first client, first report, first similarity lookup, first plot); never at import.
+LAZY_MODULES = ("openai", "httpx", "jinja2", "pdfkit", "weasyprint", "numpy", "matplotlib", "IPython", "requests", "PIL")
+
+def app_imports():
+    # The import statements at the top of campaignr_app.py, as source.
+    with open(os.path.join(REPO_DIR, "campaignr_app.py"), encoding="utf-8") as f: tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+def targets():
+    modules = sorted(name[:-3] for name in os.listdir(os.path.join(REPO_DIR, "campaignr"))
+                     if name.endswith(".py") and name != "__init__.py")
+    found = {'app': (app_imports(), REPO_DIR),
+             'old_jupyter.utils': ("import utils", os.path.join(REPO_DIR, "old_jupyter"))}
+    found.update({f"campaignr.{name}": (f"import campaignr.{name}", REPO_DIR) for name in modules})
+    return found
+
+def _top_level(stderr):
+    # {module: cumulative seconds} for the modules an import statement loads directly (not their dependencies)
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "): modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+_interpreter = []
+
+def interpreter_modules():
+    # What the bare interpreter imports at start-up (site, encodings, ...); not charged to any target.
+    if not _interpreter:
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+        _interpreter.extend(_top_level(result.stderr))
+    return _interpreter
+
+def measure(source, cwd):
+    # (seconds for the whole import, {top-level module: cumulative seconds}, eagerly loaded LAZY_MODULES)
+    check = f"\nimport sys; print(sorted(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("OPENAI_API_KEY", None)  # importing must not need the key
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", source + check], cwd=cwd, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    startup = interpreter_modules()
+    modules = {name: seconds for name, seconds in _top_level(result.stderr).items() if name not in startup}
+    eager = ast.literal_eval(result.stdout.strip().splitlines()[-1])
+    return sum(modules.values()), modules, eager
+
+def run_benchmarks(args):
+    results = {}
+    for name, (source, cwd) in targets().items():
+        if args.only and name not in args.only: continue
+        totals, slowest, eager = [], {}, set()
+        try:
+            for _ in range(args.runs):
+                total, modules, loaded = measure(source, cwd)
+                totals.append(total); eager.update(loaded)
+                for module, seconds in modules.items(): slowest.setdefault(module, []).append(seconds)
+        except RuntimeError as e:
+            print(f"{name}: skipped ({e})"); continue
+        top = sorted(((statistics.median(v), m) for m, v in slowest.items()), reverse=True)[:args.top]
+        results[name] = {'p50_s': statistics.median(totals), 'max_s': max(totals), 'runs': len(totals),
+                         'eager': sorted(eager), 'slowest': {m: s for s, m in top}}
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        for module in result['eager']:
+            if module not in baseline.get(name, {}).get('eager', ()):
+                regressions.append(f"{name}: now imports {module} eagerly")
+        if name not in baseline: continue
+        before, after = baseline[name]['p50_s'], result['p50_s']
+        if after > before * (1 + tolerance) and after - before > MIN_REGRESSION_S:
+            regressions.append(f"{name}: p50 {before * 1000:.1f} ms -> {after * 1000:.1f} ms (+{(after / before - 1):.0%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the app and each campaignr module.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="targets to time, e.g. app campaignr.engine")
+    parser.add_argument("--top", type=int, default=3, help="slowest imports to list per target")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before flagging a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    print(f"{'target':<24}{'p50':>10}{'max':>10}  slowest imports")
+    for name, result in results.items():
+        slowest = ", ".join(f"{m} {s * 1000:.0f} ms" for m, s in result['slowest'].items())
+        print(f"{name:<24}{result['p50_s'] * 1000:>8.1f}ms{result['max_s'] * 1000:>8.1f}ms  {slowest}")
+        if result['eager']: print(f"{'':<24}eager: {', '.join(result['eager'])}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f"startup-{datetime.now():%Y%m%d-%H%M%S}.json"), 'w') as f:
+        json.dump({'python': sys.version.split()[0], 'targets': results}, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f: json.dump({'python': sys.version.split()[0], 'targets': results}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}"); return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save-baseline to record one."); return 0
+    baseline = json.load(open(args.baseline))
+    regressions = compare(results, baseline['targets'], args.tolerance)
+    for line in regressions: print(f"REGRESSION {line}")
+    if not regressions: print("No regressions against the baseline.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from campaignr.mock_server import start_mock_server
+from campaignr.tracing import percentile
+
+# --- Concurrent Session Load Test ---
+# Starts `streamlit run campaignr_app.py` against the offline OpenAI stand-in and drives N simulated browser sessions
+# through it over Streamlit's own websocket protocol, the way the frontend does: fill in the concept, click Generate,
+# poll the job fragment until the draft is shown, open the formatted report and download the PDF. Each concurrency
+# level reports throughput, p50/p99 end-to-end latency and the server process's RSS and CPU; the levels together
+# are the capacity curve, saved under benchmarks/results/ and compared against a baseline like bench_pipeline.py.
+#   python benchmarks/load_test.py --levels 1 2 4 8 16 --flows 2
+#   python benchmarks/load_test.py --save-baseline           # record the current curve
+#   python benchmarks/load_test.py --url http://host:8501 --server-pid 1234   # an already running server
+# Latency includes the mock's configured delays, so only compare curves made with the same settings. Without a
+# working PDF backend the report step still renders the HTML; the PDF download is then counted as unavailable.
+# Needs `websockets` (pip install -r benchmarks/requirements.txt); recent Streamlit releases already depend on it.
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, "capacity_baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+GENERATE_LABEL = "🎨 Generate Campaign Components"
+TEXT_DOWNLOAD_LABEL = "⬇️ Download Text File (.txt)"
+REPORT_LABEL = "Generate styled report from the text above"
+PDF_DOWNLOAD_LABEL = "⬇️ Download PDF Report"
+SAMPLE_INTERVAL_S = 0.5
+
+class FlowFailed(Exception):
+    pass
+
+# -- A simulated browser session --
+
+class Session:
+    # One websocket, one Streamlit session. Widget values are re-sent on every rerun, as the frontend does.
+
+    def __init__(self, url):
+        self.url = url
+        self.widgets = {}       # widget key (or label, for widgets without one) -> widget id
+        self.values = {}        # widget id -> (WidgetState field, value)
+        self.elements = []      # (element type, proto) of the latest script run
+        self.fragment = None    # (fragment id, interval) while the job fragment is polling
+        self.ws = None
+
+    async def __aenter__(self):
+        try: import websockets
+        except ImportError: raise SystemExit("load_test.py needs websockets: pip install -r benchmarks/requirements.txt")
+        ws_url = self.url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        self.ws = await websockets.connect(ws_url, origin=self.url.rstrip("/"), max_size=None)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.ws.close()
+
+    def set(self, name, field, value):
+        self.values[self.widgets[name]] = (field, value)
+
+    def find(self, label, element_type=None):
+        for kind, proto in self.elements:
+            if (element_type is None or kind == element_type) and getattr(proto, "label", None) == label: return proto
+        return None
+
+    async def rerun(self, trigger=None, fragment_id=None, timeout=60):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        for widget_id, (field, value) in self.values.items():
+            state = message.rerun_script.widget_states.widgets.add(); state.id = widget_id
+            setattr(state, field, value)
+        if trigger is not None:
+            state = message.rerun_script.widget_states.widgets.add(); state.id = self.widgets[trigger]; state.trigger_value = True
+        if fragment_id: message.rerun_script.fragment_id = fragment_id; message.rerun_script.is_auto_rerun = True
+        await self.ws.send(message.SerializeToString())
+        await self._read_run(timeout)
+
+    async def _read_run(self, timeout):
+        # Reads ForwardMsgs until the script run (and any st.rerun() it triggered) has finished.
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        self.elements = []
+        deadline = time.monotonic() + timeout
+        while True:
+            data = await asyncio.wait_for(self.ws.recv(), max(0.1, deadline - time.monotonic()))
+            message = ForwardMsg(); message.ParseFromString(data)
+            kind = message.WhichOneof("type")
+            if kind == "delta" and message.delta.WhichOneof("type") == "new_element":
+                element_type = message.delta.new_element.WhichOneof("type")
+                proto = getattr(message.delta.new_element, element_type)
+                self.elements.append((element_type, proto))
+                widget_id = getattr(proto, "id", "")
+                if widget_id.startswith("$$ID-"):
+                    key = widget_id.rsplit("-", 1)[1]
+                    self.widgets[proto.label if key == "None" else key] = widget_id
+            elif kind == "auto_rerun":
+                self.fragment = (message.auto_rerun.fragment_id, message.auto_rerun.interval)
+            elif kind == "stop_auto_rerun":
+                self.fragment = None
+            elif kind == "script_finished":
+                if message.script_finished != message.FINISHED_EARLY_FOR_RERUN: return
+
+    def errors(self):
+        return [proto.body for kind, proto in self.elements if kind == "alert" and proto.format == 1]
+
+async def run_flow(url, number, args):
+    # One user from opening the page to holding the PDF; returns the timings in seconds.
+    async with Session(url) as session:
+        await session.rerun()
+        concept = (f"Load test concept {number}: excessive drinking on campus", "College students aged 18-24",
+                   "Reduce high-risk drinking")
+        for name, value in zip(("issue_input", "audience_input", "goal_input"), concept): session.set(name, "string_value", value)
+        session.set("api_key_input", "string_value", "sk-load-test"); session.set("author_input", "string_value", "Load Test")
+        session.set("mode_input", "string_value", args.mode); session.set("stream_input", "bool_value", not args.no_stream)
+        session.set("cache_input", "bool_value", args.cache)
+        await session.rerun()
+
+        started = time.perf_counter()
+        await session.rerun(trigger=GENERATE_LABEL)
+        deadline = started + args.timeout
+        while session.find(TEXT_DOWNLOAD_LABEL, "download_button") is None:
+            if session.errors(): raise FlowFailed(session.errors()[0].splitlines()[0])
+            if time.perf_counter() > deadline: raise FlowFailed(f"no draft after {args.timeout:.0f} s")
+            fragment_id, interval = session.fragment or (None, 1.0)
+            await asyncio.sleep(interval)
+            await session.rerun(fragment_id=fragment_id, timeout=args.timeout)
+        generated = time.perf_counter()
+
+        session.set(REPORT_LABEL, "bool_value", True)
+        await session.rerun(timeout=args.timeout)
+        reported = time.perf_counter()
+        pdf = session.find(PDF_DOWNLOAD_LABEL, "download_button")
+        pdf_bytes = 0
+        if pdf is not None:
+            data = await asyncio.to_thread(lambda: urllib.request.urlopen(url.rstrip("/") + pdf.url, timeout=args.timeout).read())
+            if not data.startswith(b"%PDF"): raise FlowFailed("the PDF download is not a PDF")
+            pdf_bytes = len(data)
+        finished = time.perf_counter()
+    return {'e2e_s': finished - started, 'generate_s': generated - started, 'report_s': reported - generated,
+            'download_s': finished - reported, 'pdf_bytes': pdf_bytes}
+
+# -- Server process metrics --
+
+def read_process(pid):
+    # (RSS bytes, CPU seconds including waited-for children such as wkhtmltopdf) from /proc.
+    with open(f"/proc/{pid}/statm") as f: rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    with open(f"/proc/{pid}/stat") as f: fields = f.read().rsplit(")", 1)[1].split()
+    ticks = sum(int(fields[i]) for i in (11, 12, 13, 14))  # utime, stime, cutime, cstime
+    return rss, ticks / os.sysconf("SC_CLK_TCK")
+
+async def sample_process(pid, samples, stop):
+    last = (time.perf_counter(), read_process(pid)[1])
+    while not stop.is_set():
+        try: await asyncio.wait_for(stop.wait(), SAMPLE_INTERVAL_S)
+        except asyncio.TimeoutError: pass
+        now = time.perf_counter(); rss, cpu = read_process(pid)
+        samples.append({'rss_bytes': rss, 'cpu_percent': 100 * (cpu - last[1]) / (now - last[0])})
+        last = (now, cpu)
+
+# -- Capacity curve --
+
+async def run_level(url, pid, sessions, args):
+    samples, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(sample_process(pid, samples, stop)) if pid else None
+    flows, errors = [], []
+    async def user(number):
+        for flow in range(args.flows):
+            try: flows.append(await run_flow(url, number * args.flows + flow, args))
+            except (FlowFailed, OSError, asyncio.TimeoutError) as e: errors.append(str(e) or type(e).__name__)
+    started = time.perf_counter()
+    await asyncio.gather(*(user(sessions * 1000 + i) for i in range(sessions)))
+    wall = time.perf_counter() - started
+    stop.set()
+    if sampler: await sampler
+    e2e = [flow['e2e_s'] for flow in flows]
+    level = {'sessions': sessions, 'flows': len(flows), 'errors': len(errors), 'wall_s': wall,
+             'throughput_per_min': 60 * len(flows) / wall,
+             'p50_s': percentile(e2e, 50), 'p99_s': percentile(e2e, 99),
+             'generate_p50_s': percentile([f['generate_s'] for f in flows], 50),
+             'report_p50_s': percentile([f['report_s'] for f in flows], 50),
+             'pdf_downloads': sum(1 for f in flows if f['pdf_bytes']),
+             'error_samples': sorted(set(errors))[:3]}
+    if samples:
+        level.update(rss_peak_bytes=max(s['rss_bytes'] for s in samples), rss_end_bytes=samples[-1]['rss_bytes'],
+                     cpu_mean_percent=statistics.mean(s['cpu_percent'] for s in samples),
+                     cpu_peak_percent=max(s['cpu_percent'] for s in samples))
+    return level
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
+
+def start_app(mock_url, args):
+    # A Streamlit server on a free port with its own scratch storage; returns (process, url).
+    scratch = tempfile.mkdtemp(prefix="campaignr-load-")
+    env = dict(os.environ, OPENAI_BASE_URL=mock_url, CAMPAIGNR_CACHE="on" if args.cache else "off",
+               **{f"CAMPAIGNR_{name}_DIR": os.path.join(scratch, name.lower())
+                  for name in ("JOBS", "ARTIFACT", "ARCHIVE", "CACHE", "TRACE")})
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "-m", "streamlit", "run", os.path.join(REPO_DIR, "campaignr_app.py"),
+                                "--server.headless", "true", "--server.port", str(port), "--server.fileWatcherType", "none",
+                                "--browser.gatherUsageStats", "false"],
+                               cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        if process.poll() is not None: raise RuntimeError("streamlit exited during start-up")
+        try:
+            with urllib.request.urlopen(url + "/_stcore/health", timeout=1): return process, url
+        except OSError: time.sleep(0.1)
+    process.terminate(); raise RuntimeError("streamlit did not start within 30 s")
+
+async def run_curve(url, pid, args):
+    levels = []
+    for sessions in args.levels:
+        level = await run_level(url, pid, sessions, args)
+        levels.append(level); print_level(level)
+        if args.stop_p99 and level['p99_s'] and level['p99_s'] > args.stop_p99:
+            print(f"p99 above {args.stop_p99:.0f} s; stopping the curve here."); break
+    return levels
+
+def _ms(seconds): return f"{seconds:.1f}s" if seconds is not None else "-"
+
+def print_level(level):
+    rss = f"{level['rss_peak_bytes'] / 1e6:.0f}MB" if 'rss_peak_bytes' in level else "-"
+    cpu = f"{level['cpu_mean_percent']:.0f}/{level['cpu_peak_percent']:.0f}%" if 'cpu_mean_percent' in level else "-"
+    print(f"{level['sessions']:>8}{level['flows']:>7}{level['errors']:>7}{level['throughput_per_min']:>10.1f}"
+          f"{_ms(level['p50_s']):>9}{_ms(level['p99_s']):>9}{_ms(level['generate_p50_s']):>10}{_ms(level['report_p50_s']):>9}"
+          f"{rss:>9}{cpu:>11}")
+    for error in level['error_samples']: print(f"{'':<8}error: {error[:100]}")
+
+def compare(levels, baseline, tolerance):
+    regressions, before = [], {level['sessions']: level for level in baseline}
+    for level in levels:
+        old = before.get(level['sessions'])
+        if old is None: continue
+        name = f"{level['sessions']} sessions"
+        if level['throughput_per_min'] < old['throughput_per_min'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old['throughput_per_min']:.1f} -> {level['throughput_per_min']:.1f}/min")
+        if old['p99_s'] and level['p99_s'] and level['p99_s'] > old['p99_s'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {old['p99_s']:.1f} s -> {level['p99_s']:.1f} s")
+        if level['errors'] > old['errors']:
+            regressions.append(f"{name}: {old['errors']} -> {level['errors']} failed flows")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test campaignr_app.py with concurrent simulated sessions.")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="concurrent sessions per step")
+    parser.add_argument("--flows", type=int, default=1, help="campaigns each session generates per step, one after another")
+    parser.add_argument("--mode", default="Single pass", choices=["Single pass", "Parallel sections"])
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="let the response cache answer repeated requests")
+    parser.add_argument("--ttft", type=float, default=0.5, help="mock seconds to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0, help="mock token rate")
+    parser.add_argument("--image-latency", type=float, default=2.0, help="mock seconds per image")
+    parser.add_argument("--jitter", type=float, default=0.1, help="relative random variation of the mock's delays")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds before a single flow counts as failed")
+    parser.add_argument("--stop-p99", type=float, help="stop the curve once p99 exceeds this many seconds")
+    parser.add_argument("--url", help="load-test this running server (its OpenAI base URL is up to you) instead")
+    parser.add_argument("--server-pid", type=int, help="with --url: the server's pid, for RSS and CPU")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this curve as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed throughput drop / p99 rise per level")
+    args = parser.parse_args(argv)
+
+    mock = process = None
+    if args.url:
+        url, pid = args.url, args.server_pid
+    else:
+        mock = start_mock_server(ttft_s=args.ttft, tokens_per_s=args.tokens_per_sec, image_latency_s=args.image_latency,
+                                 jitter=args.jitter)
+        process, url = start_app(mock.base_url, args); pid = process.pid
+    print(f"{'sessions':>8}{'flows':>7}{'errors':>7}{'per min':>10}{'p50':>9}{'p99':>9}{'generate':>10}{'report':>9}"
+          f"{'rss':>9}{'cpu avg/pk':>11}")
+    try:
+        levels = asyncio.run(run_curve(url, pid, args))
+    finally:
+        if process: process.terminate(); process.wait(timeout=30)
+        if mock: mock.shutdown()
+
+    settings = {'mode': args.mode, 'stream': not args.no_stream, 'cache': args.cache, 'flows': args.flows,
+                'ttft': args.ttft, 'tokens_per_sec': args.tokens_per_sec, 'image_latency': args.image_latency,
+                'jitter': args.jitter, 'cpus': os.cpu_count()}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f"capacity-{datetime.now():%Y%m%d-%H%M%S}.json"), 'w') as f:
+        json.dump({'settings': settings, 'levels': levels}, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f: json.dump({'settings': settings, 'levels': levels}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}"); return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save-baseline to record one."); return 0
+    baseline = json.load(open(args.baseline))
+    if baseline.get('settings') != settings:
+        print(f"Baseline was recorded with different settings {baseline.get('settings')}; not comparing."); return 0
+    regressions = compare(levels, baseline['levels'], args.tolerance)
+    for line in regressions: print(f"REGRESSION {line}")
+    if not regressions: print("No regressions against the baseline.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
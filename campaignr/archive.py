@@ -0,0 +1,321 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from html.parser import HTMLParser
+
+from .proposal import extract_title_from_text
+from .sections import parse_sections
+
+# --- Campaign Archive ---
+# Every finished campaign is kept: metadata and parsed sections in SQLite, a full-text (FTS5) index over title,
+# concept and body, and the large payloads (text, cover PNG, HTML/PDF reports) in a content-addressed blob store
+# next to it. Searching and reopening a past campaign is an index lookup and a file read, never a regeneration.
+# Campaigns from before the archive (the notebook's 01_output/<title>/ folders, the batch CLI's row folders) are
+# brought in with: python -m campaignr.archive import <folder>
+
+DEFAULT_ARCHIVE_DIR = os.environ.get("CAMPAIGNR_ARCHIVE_DIR", ".campaignr_archive")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY, title TEXT NOT NULL, author TEXT, concept TEXT, created REAL NOT NULL,
+    updated REAL NOT NULL, source TEXT UNIQUE, text_key TEXT, cover_key TEXT, html_key TEXT, pdf_key TEXT,
+    meta TEXT);
+CREATE INDEX IF NOT EXISTS campaigns_created ON campaigns (created);
+CREATE INDEX IF NOT EXISTS campaigns_updated ON campaigns (updated);
+CREATE TABLE IF NOT EXISTS sections (
+    campaign_id INTEGER NOT NULL REFERENCES campaigns (id) ON DELETE CASCADE, position INTEGER NOT NULL,
+    level INTEGER NOT NULL, header TEXT NOT NULL, content TEXT NOT NULL, PRIMARY KEY (campaign_id, position));
+CREATE VIRTUAL TABLE IF NOT EXISTS campaigns_fts USING fts5(title, author, concept, body, tokenize='porter unicode61');
+"""
+
+class BlobStore:
+    # Write-once files at <directory>/<sha256[:2]>/<sha256>; identical payloads are stored once.
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key): return os.path.join(self.directory, key[:2], key)
+
+    def put(self, data):
+        if isinstance(data, str): data = data.encode('utf-8')
+        key = hashlib.sha256(data).hexdigest()
+        path = self.path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f: f.write(data)
+            os.replace(tmp, path)
+        return key
+
+    def get(self, key):
+        if not key: return None
+        try:
+            with open(self.path(key), 'rb') as f: return f.read()
+        except FileNotFoundError:
+            return None
+
+@dataclass
+class ArchivedCampaign:
+    id: int
+    title: str
+    author: str
+    concept: dict
+    created: float
+    source: str
+    sections: list          # (level, header, content) in document order
+    meta: dict
+    text_key: str = None
+    cover_key: str = None
+    html_key: str = None
+    pdf_key: str = None
+
+class CampaignArchive:
+    # Thread-safe; one per process (see get_archive).
+
+    def __init__(self, directory=DEFAULT_ARCHIVE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.blobs = BlobStore(os.path.join(directory, "blobs"))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "archive.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    # -- writing --
+
+    def add(self, title, text, cover=None, concept=None, author=None, html=None, pdf=None, source=None,
+            created=None, meta=None):
+        # Returns the campaign id. Adding an already imported source (a folder path, a job id) replaces that entry.
+        now = time.time()
+        keys = [self.blobs.put(data) if data else None for data in (text, cover, html, pdf)]
+        with self._lock, self._db:
+            if source is not None:
+                row = self._db.execute("SELECT id FROM campaigns WHERE source = ?", (source,)).fetchone()
+                if row: self._delete(row[0])
+            cursor = self._db.execute(
+                "INSERT INTO campaigns (title, author, concept, created, updated, source, text_key, cover_key, html_key, "
+                "pdf_key, meta) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (title, author, json.dumps(concept) if concept else None, created or now, now, source, *keys,
+                 json.dumps(meta or {})))
+            campaign_id = cursor.lastrowid
+            self._index(campaign_id, title, author, concept, text or "")
+        return campaign_id
+
+    def update_text(self, campaign_id, text):
+        # After a section rewrite: the new text replaces the old one (the stale HTML/PDF reports are dropped).
+        key = self.blobs.put(text)
+        with self._lock, self._db:
+            row = self._db.execute("SELECT title, author, concept FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+            if row is None: return False
+            self._db.execute("UPDATE campaigns SET text_key = ?, html_key = NULL, pdf_key = NULL, updated = ? WHERE id = ?",
+                             (key, time.time(), campaign_id))
+            self._db.execute("DELETE FROM sections WHERE campaign_id = ?", (campaign_id,))
+            self._db.execute("DELETE FROM campaigns_fts WHERE rowid = ?", (campaign_id,))
+            self._index(campaign_id, row[0], row[1], json.loads(row[2]) if row[2] else None, text)
+        return True
+
+    def _index(self, campaign_id, title, author, concept, text):
+        nodes = parse_sections(text, dialects=("markdown",)).sections    # every level, in document order
+        self._db.executemany("INSERT INTO sections VALUES (?, ?, ?, ?, ?)",
+                             [(campaign_id, i, node.level, node.title, node.content) for i, node in enumerate(nodes)])
+        self._db.execute("INSERT INTO campaigns_fts (rowid, title, author, concept, body) VALUES (?, ?, ?, ?, ?)",
+                         (campaign_id, title, author or "", " ".join((concept or {}).values()), text))
+
+    def delete(self, campaign_id):
+        # Blobs are left in place: another campaign may share them.
+        with self._lock, self._db: self._delete(campaign_id)
+
+    def _delete(self, campaign_id):
+        self._db.execute("DELETE FROM campaigns_fts WHERE rowid = ?", (campaign_id,))
+        self._db.execute("DELETE FROM campaigns WHERE id = ?", (campaign_id,))
+
+    # -- reading --
+
+    def search(self, query, limit=20):
+        # [(id, title, created, snippet)], best match first. Plain words are matched as prefixes ("vacc" finds
+        # "vaccinate"); an empty query lists the most recent campaigns.
+        words = re.findall(r'\w+', query or "")
+        with self._lock:
+            if not words:
+                return [(row[0], row[1], row[2], None) for row in self._db.execute(
+                    "SELECT id, title, created FROM campaigns ORDER BY created DESC LIMIT ?", (limit,))]
+            match = " ".join(f'"{word}"*' for word in words)
+            return self._db.execute(
+                "SELECT c.id, c.title, c.created, snippet(campaigns_fts, 3, '**', '**', '…', 16) FROM campaigns_fts "
+                "JOIN campaigns c ON c.id = campaigns_fts.rowid WHERE campaigns_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit)).fetchall()
+
+    def get(self, campaign_id):
+        with self._lock:
+            row = self._db.execute("SELECT id, title, author, concept, created, source, meta, text_key, cover_key, "
+                                   "html_key, pdf_key FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+            if row is None: return None
+            sections = self._db.execute("SELECT level, header, content FROM sections WHERE campaign_id = ? "
+                                        "ORDER BY position", (campaign_id,)).fetchall()
+        return ArchivedCampaign(row[0], row[1], row[2], json.loads(row[3]) if row[3] else None, row[4], row[5],
+                                sections, json.loads(row[6] or "{}"), *row[7:])
+
+    def concepts_since(self, updated):
+        # [(id, concept, updated)] for campaigns with a concept added or changed after `updated`, oldest first.
+        with self._lock:
+            rows = self._db.execute("SELECT id, concept, updated FROM campaigns WHERE updated > ? AND concept IS NOT NULL "
+                                    "ORDER BY updated", (updated,)).fetchall()
+        return [(campaign_id, json.loads(concept), changed) for campaign_id, concept, changed in rows]
+
+    def text(self, campaign):
+        data = self.blobs.get(campaign.text_key)
+        return None if data is None else data.decode('utf-8')
+
+    def cover(self, campaign): return self.blobs.get(campaign.cover_key)
+
+    def stats(self):
+        with self._lock:
+            campaigns, sections = (self._db.execute("SELECT COUNT(*) FROM campaigns").fetchone()[0],
+                                   self._db.execute("SELECT COUNT(*) FROM sections").fetchone()[0])
+        return {'campaigns': campaigns, 'sections': sections}
+
+    def close(self):
+        with self._lock: self._db.close()
+
+_archive = None
+_archive_lock = threading.Lock()
+
+def get_archive():
+    global _archive
+    with _archive_lock:
+        if _archive is None: _archive = CampaignArchive()
+        return _archive
+
+# --- Importing Output Folders ---
+
+class _ReportParser(HTMLParser):
+    # Recovers title, author, date and (header, content) sections from a rendered report: the notebook's template
+    # (h1, div.author, h2 + div.section-content, div.footer) and templates/report_template.html (h1, p > em, h2 + p).
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title, self.author, self.sections, self.date = "", None, [], None
+        self._field, self._text = None, []
+
+    def handle_starttag(self, tag, attrs):
+        classes = (dict(attrs).get('class') or "").split()
+        if tag in ("h1", "h2"): self._flush(); self._field = tag
+        elif tag == "div" and "author" in classes: self._flush(); self._field = "author"
+        elif tag == "div" and "footer" in classes: self._flush(); self._field = "footer"
+        elif tag == "em" and self._field is None and self.title and not self.sections: self._field = "em"
+
+    def handle_endtag(self, tag):
+        if (self._field, tag) in (("h1", "h1"), ("h2", "h2"), ("author", "div"), ("em", "em")): self._flush()
+
+    def handle_data(self, data):
+        if self._field is not None: self._text.append(data)
+
+    def _flush(self):
+        text = "".join(self._text).strip(); field = self._field
+        self._field, self._text = None, []
+        if field == "h1": self.title = text
+        elif field == "h2": self.sections.append([text.lstrip('#').strip(), ""]); self._field = "content"
+        elif field == "content" and self.sections: self.sections[-1][1] = text
+        elif field in ("author", "em") and text:
+            date = re.search(r'Generated on:?\s*(\d{4}-\d{2}-\d{2})', text)
+            if date: self.date = date.group(1)
+            elif self.author is None: self.author = text
+        elif field == "footer":
+            date = re.search(r'(\d{4}-\d{2}-\d{2})', text)
+            if date: self.date = date.group(1)
+
+    def close(self):
+        super().close(); self._flush()
+
+def parse_report_html(html_content):
+    # (title, author, generation date or None, proposal text rebuilt as "## Header" sections)
+    parser = _ReportParser(); parser.feed(html_content); parser.close()
+    text = parser.title + "\n\n" + "\n\n".join(f"## {header}\n{content}" for header, content in parser.sections)
+    return parser.title, parser.author, parser.date, text.strip()
+
+def _read(path, mode='rb'):
+    with open(path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f: return f.read()
+
+def import_output_folder(folder, archive=None):
+    # Imports one campaign folder; returns its id, or None if the folder holds no campaign. Understands the notebook's
+    # "<title>/<title>.html|.pdf|_Cover.png" layout and the batch CLI's proposal.txt/cover.png/report.*/meta.json.
+    archive = archive or get_archive()
+    files = {name.lower(): os.path.join(folder, name) for name in os.listdir(folder)}
+    pick = lambda *suffixes: next((path for name, path in sorted(files.items()) if name.endswith(suffixes)), None)
+    meta = json.loads(_read(files['meta.json'], 'r')) if 'meta.json' in files else {}
+    html_path, pdf_path = pick(".html", ".htm"), pick(".pdf")
+    cover_path = files.get('cover.png') or pick("_cover.png", ".png", ".jpg", ".jpeg")
+    html_content = _read(html_path, 'r') if html_path else None
+    row = meta.get('row') or {}  # batch CLI input row
+    title, author, date, text = meta.get('title'), row.get('author'), None, None
+    if 'proposal.txt' in files:
+        text = _read(files['proposal.txt'], 'r')
+        title = title or extract_title_from_text(text)
+    elif html_content:
+        html_title, html_author, date, text = parse_report_html(html_content)
+        title, author = title or html_title, author or html_author
+    if text is None and not (pdf_path or cover_path): return None
+    # A PDF-only folder keeps its PDF and cover but has no searchable body (the PDF is not parsed).
+    title = title or os.path.basename(os.path.normpath(folder))
+    created = (datetime.strptime(date, "%Y-%m-%d").timestamp() if date
+               else os.path.getmtime(html_path or pdf_path or cover_path or folder))
+    concept = {key: row[field] for key, field in (('communication_issue', 'issue'), ('need_and_audience', 'audience'),
+                                                  ('main_goal', 'goal')) if row.get(field)}
+    return archive.add(title, text, cover=_read(cover_path) if cover_path else None, concept=concept or None,
+                       author=author, html=html_content, pdf=_read(pdf_path) if pdf_path else None,
+                       source=os.path.abspath(folder), created=created, meta={**meta, 'imported': True})
+
+def import_output_tree(root, archive=None):
+    # Imports every campaign folder below root (root itself included); returns (imported, skipped).
+    imported = skipped = 0
+    for folder, _, _ in os.walk(root):
+        if import_output_folder(folder, archive) is None: skipped += 1
+        else: imported += 1
+    return imported, skipped
+
+# --- Command Line ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m campaignr.archive", description="Search and import archived campaigns.")
+    parser.add_argument("--dir", default=DEFAULT_ARCHIVE_DIR, help="archive directory (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("import", help="import 01_output-style campaign folders")
+    command.add_argument("folders", nargs="+")
+    command = commands.add_parser("search", help="full-text search; no query lists the newest campaigns")
+    command.add_argument("query", nargs="*")
+    command.add_argument("-n", type=int, default=20, help="number of results (default: %(default)s)")
+    command = commands.add_parser("show", help="print an archived campaign's text")
+    command.add_argument("id", type=int)
+    args = parser.parse_args(argv)
+
+    archive = CampaignArchive(args.dir)
+    if args.command == "import":
+        for folder in args.folders:
+            started = time.perf_counter()
+            imported, skipped = import_output_tree(folder, archive)
+            print(f"{folder}: {imported} campaigns imported, {skipped} folders skipped in {time.perf_counter() - started:.1f} s")
+    elif args.command == "search":
+        started = time.perf_counter()
+        results = archive.search(" ".join(args.query), args.n)
+        for campaign_id, title, created, snippet in results:
+            print(f"{campaign_id:>5}  {datetime.fromtimestamp(created):%Y-%m-%d}  {title}")
+            if snippet: print(f"       {' '.join(snippet.split())}")
+        print(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
+    else:
+        campaign = archive.get(args.id)
+        if campaign is None: print(f"No campaign {args.id}."); return 1
+        print(archive.text(campaign) or f"{campaign.title}\n(no text archived; source: {campaign.source})")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
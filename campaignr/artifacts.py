@@ -0,0 +1,200 @@
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .scheduler import current_session
+
+# --- Session Artifact Store ---
+# Large per-session payloads (the proposal text, the cover image variants) are written to a content-addressed store
+# on disk and st.session_state only keeps small Artifact handles, so server memory stays flat with the number of
+# open sessions. Payloads are read back lazily, through a small in-memory LRU shared by all sessions. Identical
+# payloads (the cached placeholder example, say) are stored once. Disk use is capped per session and for the whole
+# store; the least recently used payloads go first, and a handle whose payload was evicted reads back as None.
+
+DEFAULT_ARTIFACT_DIR = os.environ.get("CAMPAIGNR_ARTIFACT_DIR", ".campaignr_artifacts")
+ARTIFACT_MEMORY_BYTES = int(os.environ.get("CAMPAIGNR_ARTIFACT_MEMORY_BYTES", str(64 * 1024 * 1024)))
+ARTIFACT_DISK_BYTES = int(os.environ.get("CAMPAIGNR_ARTIFACT_DISK_BYTES", str(2 * 1024 * 1024 * 1024)))
+SESSION_ARTIFACT_BYTES = int(os.environ.get("CAMPAIGNR_SESSION_ARTIFACT_BYTES", str(64 * 1024 * 1024)))
+MAX_TRACKED_SESSIONS = 10000
+
+@dataclass(frozen=True)
+class Artifact:
+    key: str        # sha256 of the payload
+    size: int
+
+    def exists(self): return get_artifact_store().contains(self.key)
+
+    def read(self): return get_artifact_store().get(self.key)
+
+    def text(self):
+        data = self.read()
+        return None if data is None else data.decode('utf-8')
+
+class ArtifactStore:
+    # Thread-safe; one per process (see get_artifact_store). Files live at <directory>/<key[:2]>/<key>.
+
+    def __init__(self, directory=DEFAULT_ARTIFACT_DIR, memory_bytes=ARTIFACT_MEMORY_BYTES, disk_bytes=ARTIFACT_DISK_BYTES,
+                 session_bytes=SESSION_ARTIFACT_BYTES):
+        self.directory, self.memory_limit, self.disk_limit, self.session_limit = directory, memory_bytes, disk_bytes, session_bytes
+        self.hits = self.misses = self.loads = self.evictions = 0
+        self._memory, self._memory_bytes = OrderedDict(), 0     # key -> payload, least recently used first
+        self._disk, self._disk_bytes = OrderedDict(), 0         # key -> size, least recently used first
+        self._sessions = OrderedDict()                          # session -> OrderedDict(key -> size)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Payloads from an earlier run stay available (a reconnecting job re-stores the same keys) until evicted.
+        found = []
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if len(name) == 64 and not name.endswith(".tmp"):
+                    path = os.path.join(root, name)
+                    found.append((os.path.getmtime(path), name, os.path.getsize(path)))
+        for _, key, size in sorted(found):
+            self._disk[key] = size; self._disk_bytes += size
+        with self._lock: self._evict_disk()
+
+    def _path(self, key): return os.path.join(self.directory, key[:2], key)
+
+    def put(self, data, session=None):
+        if isinstance(data, str): data = data.encode('utf-8')
+        key = hashlib.sha256(data).hexdigest()
+        session = session or current_session.get()
+        with self._lock: stored = key in self._disk
+        if not stored:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f: f.write(data)
+            os.replace(tmp, path)
+        with self._lock:
+            if key not in self._disk: self._disk_bytes += len(data)
+            self._disk[key] = len(data); self._disk.move_to_end(key)
+            self._remember(key, data)
+            refs = self._sessions.setdefault(session, OrderedDict())
+            refs[key] = len(data); refs.move_to_end(key); self._sessions.move_to_end(session)
+            while len(self._sessions) > MAX_TRACKED_SESSIONS: self._sessions.popitem(last=False)
+            # Over its quota, a session loses its own oldest payloads first; then the store as a whole is trimmed.
+            while self.session_limit and sum(refs.values()) > self.session_limit and len(refs) > 1:
+                old, _ = refs.popitem(last=False)
+                if not any(old in other for other in self._sessions.values()): self._drop(old)
+            self._evict_disk(keep=key)
+        return Artifact(key, len(data))
+
+    def contains(self, key):
+        with self._lock: return key in self._disk
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key); self.hits += 1
+                if key in self._disk: self._disk.move_to_end(key)   # a hot payload must not be the first evicted
+                return self._memory[key]
+            if key not in self._disk:
+                self.misses += 1; return None
+        try:
+            with open(self._path(key), 'rb') as f: data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                if key in self._disk: self._disk_bytes -= self._disk.pop(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.loads += 1
+            if key in self._disk: self._disk.move_to_end(key)
+            self._remember(key, data)
+        return data
+
+    def release(self, session=None):
+        # Forgets a session's payloads (e.g. on Generate, when its previous draft is discarded).
+        with self._lock:
+            refs = self._sessions.pop(session or current_session.get(), {})
+            for key in refs:
+                if not any(key in other for other in self._sessions.values()): self._drop(key)
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_limit // 4: return  # one huge payload must not flush everything else
+        if key not in self._memory: self._memory_bytes += len(data)
+        self._memory[key] = data; self._memory.move_to_end(key)
+        while self._memory_bytes > self.memory_limit:
+            _, old = self._memory.popitem(last=False); self._memory_bytes -= len(old)
+
+    def _drop(self, key):
+        if key in self._memory: self._memory_bytes -= len(self._memory.pop(key))
+        if key in self._disk: self._disk_bytes -= self._disk.pop(key)
+        for refs in self._sessions.values(): refs.pop(key, None)
+        try: os.remove(self._path(key))
+        except FileNotFoundError: pass
+        self.evictions += 1
+
+    def _evict_disk(self, keep=None):
+        for key in list(self._disk):
+            if self._disk_bytes <= self.disk_limit: break
+            if key != keep: self._drop(key)
+
+    def session_bytes(self, session=None):
+        with self._lock: return sum(self._sessions.get(session or current_session.get(), {}).values())
+
+    def stats(self):
+        with self._lock:
+            return {'memory_bytes': self._memory_bytes, 'memory_limit': self.memory_limit, 'disk_bytes': self._disk_bytes,
+                    'disk_limit': self.disk_limit, 'entries': len(self._disk), 'sessions': len(self._sessions),
+                    'hits': self.hits, 'misses': self.misses, 'loads': self.loads, 'evictions': self.evictions,
+                    'rss_bytes': process_rss()}
+
+def process_rss():
+    # Resident set size of this server process, or None where /proc is not available.
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_artifact_store():
+    global _store
+    with _store_lock:
+        if _store is None: _store = ArtifactStore()
+        return _store
+
+# --- Stored Cover Images ---
+
+@dataclass(frozen=True)
+class StoredCover:
+    # A CoverImage (see images.py) whose variants live in the artifact store: same attributes, read on access.
+    original_artifact: Artifact
+    original_mime: str
+    preview_artifact: Artifact
+    preview_mime: str
+    report_artifact: Artifact
+    report_mime: str
+
+    @property
+    def original(self): return self.original_artifact.read()
+
+    @property
+    def preview(self): return self.preview_artifact.read()
+
+    @property
+    def report(self): return self.report_artifact.read()
+
+    @property
+    def report_b64(self):
+        report = self.report
+        return None if report is None else base64.b64encode(report).decode('ascii')
+
+    @property
+    def nbytes(self):
+        artifacts = {a.key: a.size for a in (self.original_artifact, self.preview_artifact, self.report_artifact)}
+        return sum(artifacts.values())
+
+    def exists(self):
+        return all(a.exists() for a in (self.original_artifact, self.preview_artifact, self.report_artifact))
+
+def store_cover(cover, session=None):
+    store = get_artifact_store()
+    return StoredCover(store.put(cover.original, session), cover.original_mime, store.put(cover.preview, session),
+                       cover.preview_mime, store.put(cover.report, session), cover.report_mime)
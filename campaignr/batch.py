@@ -0,0 +1,128 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import engine
+from .archive import import_output_folder
+from .clients import get_client
+from .render import render_report_html, render_report_pdf
+from .scheduler import session_scope
+
+# --- Headless Batch Generation ---
+# python -m campaignr.batch campaigns.csv --out batch_output --concurrency 4
+# Each input row (CSV with a header, or JSONL) needs issue, audience, goal and author. Every finished campaign gets
+# its own directory with proposal.txt, cover.png, report.html, report.pdf and meta.json. meta.json is written last,
+# so a directory without it is unfinished, and re-running the same command skips rows that already have one.
+# Finished directories are also added to the campaign archive (see archive.py).
+
+REQUIRED_FIELDS = ('issue', 'audience', 'goal', 'author')
+
+def read_rows(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    for number, row in enumerate(rows, 1):
+        missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or '').strip()]
+        if missing: raise ValueError(f"{path}: row {number} is missing {', '.join(missing)}")
+    return rows
+
+def row_key(row, parallel_sections):
+    payload = json.dumps([row[field].strip() for field in REQUIRED_FIELDS] + [parallel_sections])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+def slugify(text, max_len=60):
+    return re.sub(r'[^A-Za-z0-9]+', '-', text).strip('-')[:max_len] or "campaign"
+
+def _write(path, data):
+    # Write-then-rename so an interrupted run never leaves a half-written file behind.
+    tmp = path + ".tmp"
+    with open(tmp, 'wb' if isinstance(data, bytes) else 'w') as f: f.write(data)
+    os.replace(tmp, path)
+
+def generate_row(client, row, out_dir, args):
+    started = time.perf_counter()
+    concept = {'communication_issue': row['issue'], 'need_and_audience': row['audience'], 'main_goal': row['goal']}
+    # Each row is its own scheduler session, so it gets a fair share of the rate limit and its own token budget.
+    with session_scope(os.path.basename(out_dir)):
+        campaign = engine.generate_campaign(client, concept, parallel_sections=args.mode == "sections",
+                                            use_cache=not args.no_cache, max_section_concurrency=args.section_concurrency)
+    os.makedirs(out_dir, exist_ok=True)
+    _write(os.path.join(out_dir, "proposal.txt"), campaign.text)
+    if campaign.cover: _write(os.path.join(out_dir, "cover.png"), campaign.cover.original)
+    html_content = render_report_html(campaign.text, campaign.title, f"Directed by {row['author']}",
+        campaign.cover.report_b64 if campaign.cover else None, image_mime=campaign.cover.report_mime if campaign.cover else None)
+    _write(os.path.join(out_dir, "report.html"), html_content)
+    pdf_error = None
+    if not args.no_pdf:
+        try: _write(os.path.join(out_dir, "report.pdf"), render_report_pdf(html_content))
+        except Exception as e: pdf_error = str(e)
+    meta = {'title': campaign.title, 'row': row, 'mode': args.mode, 'seconds': round(time.perf_counter() - started, 2),
+            'words': len(campaign.text.split()), 'cover_error': campaign.cover_error, 'pdf_error': pdf_error}
+    _write(os.path.join(out_dir, "meta.json"), json.dumps(meta, indent=2))
+    import_output_folder(out_dir)
+    return meta
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate campaign drafts (text, cover, HTML, PDF) for every row of a CSV/JSONL file.")
+    parser.add_argument("input", help="CSV with a header row, or JSONL, with issue, audience, goal and author fields")
+    parser.add_argument("--out", default="batch_output", help="output directory (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=4, help="campaigns generated at the same time")
+    parser.add_argument("--mode", choices=["sections", "single"], default="sections",
+                        help="section-parallel engine or one single-pass completion per campaign")
+    parser.add_argument("--section-concurrency", type=int, default=engine.MAX_SECTION_CONCURRENCY,
+                        help="concurrent section requests within one campaign (sections mode)")
+    parser.add_argument("--no-pdf", action="store_true", help="skip PDF rendering")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the response cache")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"), help="defaults to $OPENAI_API_KEY")
+    args = parser.parse_args(argv)
+    if not args.api_key: parser.error("no API key: pass --api-key or set OPENAI_API_KEY")
+
+    client = get_client(args.api_key)
+    rows = read_rows(args.input)
+    os.makedirs(args.out, exist_ok=True)
+    jobs, skipped = [], 0
+    for number, row in enumerate(rows, 1):
+        out_dir = os.path.join(args.out, f"{number:04d}-{row_key(row, args.mode == 'sections')}")
+        if os.path.exists(os.path.join(out_dir, "meta.json")): skipped += 1
+        else: jobs.append((number, row, out_dir))
+    print(f"{len(rows)} rows: {skipped} already done, {len(jobs)} to generate with concurrency {args.concurrency}")
+
+    log_lock = threading.Lock()
+    def log_progress(entry):
+        with log_lock, open(os.path.join(args.out, "progress.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+
+    started = time.perf_counter(); durations, failures = [], 0
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = {pool.submit(generate_row, client, row, out_dir, args): (number, out_dir) for number, row, out_dir in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            number, out_dir = futures[future]
+            try:
+                meta = future.result()
+                durations.append(meta['seconds'])
+                log_progress({'row': number, 'status': 'done', 'dir': out_dir, 'seconds': meta['seconds']})
+                print(f"[{done}/{len(jobs)}] row {number}: {meta['title']} ({meta['seconds']:.0f} s)")
+            except Exception as e:
+                failures += 1
+                log_progress({'row': number, 'status': 'failed', 'dir': out_dir, 'error': str(e)})
+                print(f"[{done}/{len(jobs)}] row {number} FAILED: {e}")
+    elapsed = time.perf_counter() - started
+
+    print(f"\nGenerated {len(durations)}, failed {failures}, skipped {skipped} in {elapsed:.0f} s")
+    if durations:
+        print(f"Throughput: {len(durations) / elapsed * 3600:.1f} campaigns/hour; per campaign "
+              f"p50 {statistics.median(durations):.0f} s, max {max(durations):.0f} s")
+    if failures: print("Re-run the same command to retry the failed rows.")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
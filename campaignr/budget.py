@@ -0,0 +1,136 @@
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .scheduler import current_session
+
+# --- Token Budgeting and Model Tiers ---
+# Prompt tokens are counted locally before a request is sent (tiktoken when installed, ~4 characters per token
+# otherwise), the completion length is estimated from the word counts the prompt asks for, and that estimate sets
+# the request's max_tokens. Each kind of sub-task is routed to a model tier (small for title and outline, large for
+# body text), overridable with CAMPAIGNR_MODEL_<TASK>. Two ceilings are enforced: one per request and one per
+# session (a Streamlit user, or a batch row), so a runaway prompt or a user clicking Generate in a loop is refused
+# before it reaches OpenAI.
+
+MODEL_TIERS = {  # task -> model
+    'title': "gpt-4o-mini", 'outline': "gpt-4o-mini", 'section': "gpt-4o", 'proposal': "gpt-4o", 'rewrite': "gpt-4o"}
+MAX_OUTPUT_TOKENS = {'gpt-4o': 16384, 'gpt-4o-mini': 16384}
+DEFAULT_OUTPUT_TOKENS = {'title': 60}           # tasks whose prompt names no word count
+FALLBACK_OUTPUT_TOKENS = 1000
+TOKENS_PER_WORD = 1.35                          # English prose with the odd Markdown marker
+OUTPUT_HEADROOM = 1.5                           # max_tokens = estimate * headroom, so long answers are not cut short
+MESSAGE_OVERHEAD_TOKENS = 7                     # role and framing tokens the chat format adds per request
+
+REQUEST_TOKEN_CEILING = int(os.environ.get("CAMPAIGNR_REQUEST_TOKEN_CEILING", "24000"))
+SESSION_TOKEN_BUDGET = int(os.environ.get("CAMPAIGNR_SESSION_TOKEN_BUDGET", "250000"))   # 0 disables
+MAX_TRACKED_SESSIONS = 10000
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+def model_for(task):
+    return os.environ.get(f"CAMPAIGNR_MODEL_{task.upper()}") or MODEL_TIERS.get(task, MODEL_TIERS['proposal'])
+
+# -- Counting --
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+def _encoding(model):
+    # tiktoken fetches its BPE tables on first use; without network access we fall back to the heuristic for good.
+    with _encodings_lock:
+        if model not in _encodings:
+            try: _encodings[model] = tiktoken.encoding_for_model(model) if tiktoken else None
+            except Exception: _encodings[model] = None
+        return _encodings[model]
+
+def count_tokens(text, model="gpt-4o"):
+    encoding = _encoding(model)
+    if encoding is not None: return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+def count_prompt_tokens(prompt_text, model="gpt-4o"):
+    return count_tokens(prompt_text, model) + MESSAGE_OVERHEAD_TOKENS
+
+# "at least 500-700 words per main section", "80-150 words", "(at most 250 words)"
+_WORD_COUNT_RE = re.compile(r'(\d+)(?:\s*-\s*(\d+))?\s+words(\s+per\s+(main\s+)?section)?', re.I)
+_MAIN_SECTION_RE = re.compile(r'^\*\*## ', re.M)
+_ANY_SECTION_RE = re.compile(r'^\*\*#{2,3} ', re.M)
+
+def estimate_output_tokens(prompt_text, task="proposal"):
+    # Uses the last word count the prompt asks for (the instructions that matter come last), at its upper bound.
+    matches = _WORD_COUNT_RE.findall(prompt_text)
+    if not matches: return DEFAULT_OUTPUT_TOKENS.get(task, FALLBACK_OUTPUT_TOKENS)
+    low, high, per_section, main_only = matches[-1]
+    words = int(high or low)
+    if per_section:
+        sections = len((_MAIN_SECTION_RE if main_only else _ANY_SECTION_RE).findall(prompt_text))
+        words *= max(1, sections)
+    return math.ceil(words * TOKENS_PER_WORD)
+
+def max_tokens_for(expected_tokens, model):
+    return min(MAX_OUTPUT_TOKENS.get(model, 4096), math.ceil(expected_tokens * OUTPUT_HEADROOM))
+
+# -- Ceilings --
+
+class TokenBudget:
+    # Per-session token accounting. reserve() books the expected usage before a request is sent (so parallel
+    # section requests see each other), settle() replaces the booking with the real usage afterwards.
+
+    def __init__(self, session_limit=SESSION_TOKEN_BUDGET, request_limit=REQUEST_TOKEN_CEILING):
+        self.session_limit, self.request_limit = session_limit, request_limit
+        self._used = OrderedDict()
+        self._lock = threading.Lock()
+
+    def used(self, session=None):
+        with self._lock: return self._used.get(session or current_session.get(), 0)
+
+    def remaining(self, session=None):
+        return None if not self.session_limit else max(0, self.session_limit - self.used(session))
+
+    def reserve(self, prompt_tokens, expected_tokens, max_tokens, session=None):
+        # Returns the max_tokens to send, clamped to the per-request ceiling; raises BudgetExceeded instead of sending.
+        session = session or current_session.get()
+        if self.request_limit:
+            if prompt_tokens >= self.request_limit:
+                raise BudgetExceeded(f"The prompt is {prompt_tokens} tokens, over the per-request ceiling of "
+                                     f"{self.request_limit}. Shorten the prompt or raise CAMPAIGNR_REQUEST_TOKEN_CEILING.")
+            max_tokens = min(max_tokens, self.request_limit - prompt_tokens)
+        booked = prompt_tokens + min(expected_tokens, max_tokens)
+        with self._lock:
+            used = self._used.get(session, 0)
+            if self.session_limit and used + booked > self.session_limit:
+                raise BudgetExceeded(f"This request needs about {booked} tokens but only {max(0, self.session_limit - used)} "
+                                     f"of this session's {self.session_limit}-token budget are left.")
+            self._used[session] = used + booked; self._used.move_to_end(session)
+            while len(self._used) > MAX_TRACKED_SESSIONS: self._used.popitem(last=False)
+        return max_tokens, booked
+
+    def settle(self, booked, actual_tokens, session=None):
+        session = session or current_session.get()
+        with self._lock:
+            self._used[session] = max(0, self._used.get(session, 0) - booked + actual_tokens)
+
+_budget = None
+_budget_lock = threading.Lock()
+
+def get_token_budget():
+    global _budget
+    with _budget_lock:
+        if _budget is None: _budget = TokenBudget()
+        return _budget
+
+def plan_request(prompt_text, model, task="proposal", expected_tokens=None):
+    # Counts the prompt, sizes max_tokens and books the request against the session budget.
+    # Returns (prompt_tokens, max_tokens, booked); pass booked and the real usage to get_token_budget().settle().
+    prompt_tokens = count_prompt_tokens(prompt_text, model)
+    expected = expected_tokens or estimate_output_tokens(prompt_text, task)
+    max_tokens, booked = get_token_budget().reserve(prompt_tokens, expected, max_tokens_for(expected, model))
+    return prompt_tokens, max_tokens, booked
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- Persistent Response Cache ---
+# Content-addressed: the key is a hash of the model, the fully formatted prompt and the request parameters,
+# so identical requests (e.g. a workshop full of people trying the placeholder example) are answered from disk.
+
+DEFAULT_CACHE_DIR = os.environ.get("CAMPAIGNR_CACHE_DIR", ".campaignr_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL_S = 30 * 24 * 3600
+
+def cache_key(kind, model, prompt, **params):
+    payload = json.dumps({'kind': kind, 'model': model, 'prompt': prompt, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    # SQLite-backed, size-bounded LRU with a TTL. Safe to share between threads and Streamlit sessions.
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl_s=DEFAULT_TTL_S, enabled=True):
+        self.directory, self.max_bytes, self.ttl_s, self.enabled = directory, max_bytes, ttl_s, enabled
+        self.hits = self.misses = self.stores = self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "responses.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,
+            created REAL NOT NULL, accessed REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    def get(self, key):
+        if not self.enabled: return None
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl_s:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,)); self._db.commit(); row = None
+            if row is None:
+                self.misses += 1; return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key)); self._db.commit()
+            self.hits += 1
+            return bytes(row[0])
+
+    def set(self, key, value):
+        if not self.enabled: return
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, value, len(value), now, now))
+            self.stores += 1
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_s,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes: return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.evictions += 1; total -= size
+            if total <= self.max_bytes: break
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses"); self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'stores': self.stores, 'evictions': self.evictions, 'entries': entries, 'bytes': size}
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_response_cache():
+    # One cache per process; CAMPAIGNR_CACHE=off disables it without code changes.
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(enabled=os.environ.get("CAMPAIGNR_CACHE", "on").lower() not in ("0", "off", "false"))
+        return _default_cache
@@ -0,0 +1,115 @@
+import hashlib
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+
+# --- Shared API Client Registry ---
+# One OpenAI client (and therefore one HTTP connection pool) per API key for the whole process, instead of a new
+# client per button click. Connections are kept alive between requests and sessions, and use HTTP/2 when the
+# `h2` package is installed (requirements.txt asks for httpx[http2]), so most requests skip the TCP and TLS
+# handshakes entirely. A client evicted from the registry is closed once its last request in flight has finished.
+# `openai` and `httpx` are imported with the first client: `openai` alone takes longer to import than Streamlit.
+
+MAX_CONNECTIONS = int(os.environ.get("CAMPAIGNR_HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.environ.get("CAMPAIGNR_HTTP_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY_S = float(os.environ.get("CAMPAIGNR_HTTP_KEEPALIVE_EXPIRY", "120"))
+CONNECT_TIMEOUT_S = float(os.environ.get("CAMPAIGNR_HTTP_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT_S = float(os.environ.get("CAMPAIGNR_HTTP_READ_TIMEOUT", "600"))  # a single-pass proposal takes minutes
+MAX_CLIENTS = 256
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+class ConnectionStats:
+    # Counts requests against new TCP connections and TLS handshakes via httpcore's trace hook.
+    def __init__(self):
+        self.requests = self.connections = self.tls_handshakes = 0
+        self._lock = threading.Lock()
+
+    def trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.started":
+            with self._lock: self.connections += 1
+        elif event_name == "connection.start_tls.started":
+            with self._lock: self.tls_handshakes += 1
+
+    def on_request(self, request):
+        with self._lock: self.requests += 1
+        request.extensions["trace"] = self.trace
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(0, self.requests - self.connections)
+            return {'requests': self.requests, 'connections': self.connections, 'tls_handshakes': self.tls_handshakes,
+                    'reused': reused, 'reuse_rate': reused / self.requests if self.requests else 0.0, 'http2': HTTP2}
+
+class ClientLease:
+    # Requests in flight on one HTTP client (a streamed response counts until it is closed), so that an evicted
+    # client is closed by whichever request finishes last instead of under a job that is still using it.
+    def __init__(self):
+        self.active = 0
+        self._close = None
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock: self.active += 1
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            close, self._close = (self._close, None) if not self.active else (None, self._close)
+        if close: close()
+
+    def retire(self, close):
+        with self._lock:
+            if self.active: self._close = close; return
+        close()
+
+connection_stats = ConnectionStats()
+_clients = OrderedDict()     # registry key -> (client, lease)
+_clients_lock = threading.Lock()
+
+def make_http_client(lease=None):
+    import httpx
+
+    class LeasedStream(httpx.SyncByteStream):
+        def __init__(self, stream): self.stream, self.released = stream, False
+        def __iter__(self): yield from self.stream
+        def close(self):
+            try: self.stream.close()
+            finally:
+                if not self.released: self.released = True; lease.release()
+
+    class LeasedTransport(httpx.HTTPTransport):
+        def handle_request(self, request):
+            lease.acquire()
+            try: response = super().handle_request(request)
+            except BaseException: lease.release(); raise
+            response.stream = LeasedStream(response.stream)
+            return response
+
+    transport = (LeasedTransport if lease else httpx.HTTPTransport)(
+        http2=HTTP2, limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE,
+                                         keepalive_expiry=KEEPALIVE_EXPIRY_S))
+    return httpx.Client(transport=transport, timeout=httpx.Timeout(READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S),
+                        event_hooks={'request': [connection_stats.on_request]})
+
+def get_client(api_key, base_url=None):
+    # max_retries=0: retries and backoff are handled by campaignr.scheduler for all sessions together.
+    # Keys are stored hashed; least recently used clients are dropped beyond MAX_CLIENTS keys.
+    base_url = base_url or os.environ.get("OPENAI_BASE_URL")
+    registry_key = (hashlib.sha256(api_key.encode('utf-8')).hexdigest(), base_url)
+    with _clients_lock:
+        if registry_key not in _clients:
+            from openai import OpenAI
+            lease = ClientLease()
+            client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=make_http_client(lease))
+            _clients[registry_key] = (client, lease)
+            while len(_clients) > MAX_CLIENTS:
+                # Release its connection pool rather than wait for garbage collection, but not under a running request.
+                _, (evicted, evicted_lease) = _clients.popitem(last=False)
+                evicted_lease.retire(evicted.close)
+        _clients.move_to_end(registry_key)
+        return _clients[registry_key][0]
+
+def client_stats():
+    with _clients_lock: clients = len(_clients)
+    return dict(connection_stats.snapshot(), clients=clients)
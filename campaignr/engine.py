@@ -0,0 +1,417 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from .cache import cache_key, get_response_cache
+from .images import cover_image_from_b64
+from .prompts import (DEFAULT_PROPOSAL_PROMPT, DEFAULT_IMAGE_PROMPT, OUTLINE_PROMPT, SECTION_SYSTEM_PROMPT, SECTION_PROMPT,
+                      SECTION_LENGTH, PARENT_SECTION_LENGTH, REWRITE_SECTION_PROMPT, REWRITE_SECTION_LENGTH,
+                      TITLE_INSTRUCTION, TITLE_PROMPT, Prompt, assemble_prompt)
+from .budget import BudgetExceeded, count_prompt_tokens, count_tokens, estimate_output_tokens, get_token_budget, model_for, plan_request
+from .scheduler import get_scheduler
+from .tracing import estimate_cost, get_trace_store, percentile, span
+from .proposal import (extract_title_from_text, split_prompt_sections, normalize_section_text, assemble_proposal,
+                       replace_section)
+from .sections import SectionTreeParser, parse_sections
+from .validation import FormatIgnored, ProposalValidator, insert_sections, validate_proposal
+
+MAX_SECTION_CONCURRENCY = 4
+
+# --- OpenAI Calls ---
+# These raise on failure so they can run off the Streamlit script thread; the app wraps them with st.error.
+# `concept` is a dict with communication_issue, need_and_audience and main_goal.
+# Responses go through the persistent response cache unless use_cache=False, and every request that does reach
+# OpenAI is paced and retried by the per-model scheduler (create clients with max_retries=0).
+# `task` picks the model tier (see budget.MODEL_TIERS) unless a model is given; every request that is sent is
+# sized (max_tokens) and booked against the session's token budget first, and raises BudgetExceeded if it does not fit.
+# A prompt is either a plain string (sent as one user message) or a prompts.Prompt, whose static system message
+# lets OpenAI serve the shared prefix from its prompt cache; usage.prompt_tokens_details.cached_tokens is recorded.
+
+IMAGE_PARAMS = {'size': "1024x1024", 'quality': "standard", 'n': 1}
+
+def _usage_attrs(usage):
+    if usage is None: return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {'prompt_tokens': usage.prompt_tokens, 'completion_tokens': usage.completion_tokens,
+            'cached_tokens': (getattr(details, "cached_tokens", None) or 0) if details else 0}
+
+def _chat_messages(prompt):
+    return prompt.messages() if isinstance(prompt, Prompt) else [{"role": "user", "content": prompt}]
+
+def _chat_cache_key(model, prompt):
+    return cache_key("chat", model, prompt.messages() if isinstance(prompt, Prompt) else prompt)
+
+def _used_tokens(usage, prompt_tokens, text, model):
+    if usage is not None: return usage.prompt_tokens + usage.completion_tokens
+    return prompt_tokens + count_tokens(text or "", model)
+
+def complete(client, prompt_text, model=None, use_cache=True, task="proposal", expected_tokens=None):
+    model = model or model_for(task)
+    with span("generate_text", model=model, task=task, stream=False) as stage:
+        cache = get_response_cache()
+        key = _chat_cache_key(model, prompt_text)
+        cached = cache.get(key) if use_cache else None
+        if cached is not None:
+            stage.set(cache_hit=True, bytes=len(cached)); return cached.decode('utf-8')
+        prompt_tokens, max_tokens, booked = plan_request(str(prompt_text), model, task, expected_tokens)
+        try:
+            response = get_scheduler(model).call(lambda: client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=_chat_messages(prompt_text),
+                max_tokens=max_tokens
+            ), tokens=prompt_tokens + max_tokens).parse()
+        except BaseException:
+            get_token_budget().settle(booked, 0); raise
+        text = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+        get_token_budget().settle(booked, _used_tokens(usage, prompt_tokens, text, model))
+        if use_cache and text: cache.set(key, text.encode('utf-8'))
+        stage.set(cache_hit=False, bytes=len((text or "").encode('utf-8')), max_tokens=max_tokens, **_usage_attrs(usage))
+        return text
+
+def stream_complete(client, prompt_text, on_delta=None, model=None, use_cache=True, task="proposal", expected_tokens=None):
+    # Streams the completion, calling on_delta(text_so_far) as tokens arrive; returns (text, stats).
+    model = model or model_for(task)
+    with span("generate_text", model=model, task=task, stream=True) as stage:
+        text, stats = _stream_complete(client, prompt_text, on_delta, model, use_cache, task, expected_tokens)
+        stage.set(cache_hit=bool(stats.get('cached')), bytes=len(text.encode('utf-8')), ttft_s=stats['ttft_s'],
+                  tokens_per_s=stats['tokens_per_s'], prompt_tokens=stats.get('prompt_tokens'),
+                  completion_tokens=stats['completion_tokens'], cached_tokens=stats.get('cached_tokens'))
+        return text, stats
+
+def _stream_complete(client, prompt_text, on_delta, model, use_cache, task, expected_tokens):
+    start = time.perf_counter(); first_token_at = None; text = ""; chunks = 0; usage = None; finish_reason = None
+    cache = get_response_cache()
+    key = _chat_cache_key(model, prompt_text)
+    cached = cache.get(key) if use_cache else None
+    if cached is not None:
+        text = cached.decode('utf-8')
+        if on_delta: on_delta(text)
+        return text, {'ttft_s': time.perf_counter() - start, 'total_s': time.perf_counter() - start,
+                      'completion_tokens': 0, 'tokens_per_s': None, 'cached': True}
+    prompt_tokens, max_tokens, booked = plan_request(str(prompt_text), model, task, expected_tokens)
+    try:
+        # Only opening the stream is retried; a failure mid-stream would otherwise replay deltas already shown.
+        stream = get_scheduler(model).call(lambda: client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=_chat_messages(prompt_text),
+            max_tokens=max_tokens, stream=True, stream_options={"include_usage": True}
+        ), tokens=prompt_tokens + max_tokens).parse()
+        # Closing the stream when on_delta aborts (FormatIgnored, JobCancelled) drops the response, so the server
+        # stops generating and the pooled connection is freed instead of draining tokens nobody reads.
+        with stream:
+            for chunk in stream:
+                if getattr(chunk, "usage", None): usage = chunk.usage
+                if not chunk.choices: continue
+                finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+                delta = chunk.choices[0].delta.content
+                if not delta: continue
+                if first_token_at is None: first_token_at = time.perf_counter()
+                text += delta; chunks += 1
+                if on_delta: on_delta(text)
+    finally:
+        get_token_budget().settle(booked, _used_tokens(usage, prompt_tokens, text, model) if text else 0)
+    end = time.perf_counter()
+    if use_cache and text: cache.set(key, text.encode('utf-8'))
+    tokens = usage.completion_tokens if usage else chunks
+    stats = {
+        'ttft_s': (first_token_at - start) if first_token_at else None,
+        'total_s': end - start, 'completion_tokens': tokens, 'prompt_tokens': usage.prompt_tokens if usage else None,
+        'cached_tokens': _usage_attrs(usage).get('cached_tokens'), 'finish_reason': finish_reason,
+        'tokens_per_s': tokens / (end - first_token_at) if first_token_at and end > first_token_at else None}
+    return text, stats
+
+def request_image(client, prompt_text, use_cache=True):
+    with span("generate_image", model="dall-e-3") as stage:
+        cache = get_response_cache()
+        key = cache_key("image", "dall-e-3", prompt_text, **IMAGE_PARAMS)
+        cached = cache.get(key) if use_cache else None
+        if cached is not None:
+            stage.set(cache_hit=True, bytes=len(cached) * 3 // 4); return cached.decode('ascii')
+        response = get_scheduler("dall-e-3").call(lambda: client.images.with_raw_response.generate(
+            model="dall-e-3", prompt=prompt_text, response_format="b64_json", **IMAGE_PARAMS
+        )).parse()
+        image_b64 = response.data[0].b64_json
+        if use_cache and image_b64: cache.set(key, image_b64.encode('ascii'))
+        stage.set(cache_hit=False, images=IMAGE_PARAMS['n'], bytes=len(image_b64 or "") * 3 // 4)
+        return image_b64
+
+def build_proposal_prompt(prompt_text, concept, campaign_title=None):
+    # prompt_text is DEFAULT_PROPOSAL_PROMPT or the user's edited copy; with a title, TITLE_INSTRUCTION pins it.
+    template = prompt_text + TITLE_INSTRUCTION if campaign_title else prompt_text
+    return assemble_prompt(template, campaign_title=campaign_title, **concept)
+
+def generate_cover_image(client, prompt_text, use_cache=True):
+    # Decodes the DALL-E response once into a CoverImage holding original, preview and report variants.
+    return cover_image_from_b64(request_image(client, prompt_text, use_cache=use_cache))
+
+def generate_title(client, concept, use_cache=True):
+    # Cheap up-front title so the cover image can start before the long proposal body is written.
+    title = complete(client, assemble_prompt(TITLE_PROMPT, **concept), use_cache=use_cache, task="title")
+    return extract_title_from_text(title.strip().strip('"'))
+
+# --- Section-Parallel Proposal Engine ---
+# One short shared outline (title, goals, theory), then every `##`/`###` section as its own request.
+# Wall-clock time is roughly outline + slowest section instead of the sum of all sections.
+
+def generate_outline(client, concept, model=None, use_cache=True):
+    return complete(client, assemble_prompt(OUTLINE_PROMPT, **concept), model=model, use_cache=use_cache, task="outline").strip()
+
+def build_section_prompt(concept, outline, sections, index):
+    section = sections[index]
+    subsections = []
+    for following in sections[index + 1:]:
+        if following.level <= section.level: break
+        subsections.append(following.name)
+    length = PARENT_SECTION_LENGTH.format(subsections=", ".join(subsections)) if subsections else SECTION_LENGTH
+    guidance = "\n\n".join(f"**{s.header}**\n{s.guidance}" for s in sections)
+    return Prompt(SECTION_SYSTEM_PROMPT.strip() + "\n\n" + guidance,
+                  SECTION_PROMPT.format(outline=outline, header=section.header, length=length, **concept).strip())
+
+def generate_proposal_by_sections(client, prompt_text, concept, max_concurrency=MAX_SECTION_CONCURRENCY,
+                                  on_outline=None, on_section=None, model=None, use_cache=True):
+    # prompt_text supplies the canonical sections and their guidance (normally DEFAULT_PROPOSAL_PROMPT).
+    # By default the outline goes to the small tier and the sections to the large one; `model` pins both.
+    sections = split_prompt_sections(prompt_text)
+    if not sections:
+        raise ValueError("The proposal prompt contains no '**## Section**' guidance blocks to generate from.")
+    outline = generate_outline(client, concept, model=model, use_cache=use_cache)
+    title = extract_title_from_text(outline)
+    if on_outline: on_outline(title, outline)
+
+    section_texts = [None] * len(sections)
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        # copy_context keeps the caller's scheduler session on the worker threads.
+        futures = {pool.submit(contextvars.copy_context().run, complete, client,
+                               build_section_prompt(concept, outline, sections, i), model, use_cache, "section"): i
+                   for i in range(len(sections))}
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                section_texts[i] = normalize_section_text(sections[i].header, future.result())
+                if on_section: on_section(i, sections[i], section_texts[i])
+        except BaseException:
+            for future in futures: future.cancel()
+            raise
+    return assemble_proposal(title, section_texts)
+
+# --- Single-Section Regeneration ---
+# Rewrites one entry of parse_text_for_html in place; the rest of the text (and the cover) is left alone,
+# so an edit costs one section's tokens instead of the whole document's.
+
+def build_rewrite_prompt(concept, text, index, prompt_text=DEFAULT_PROPOSAL_PROMPT, note=""):
+    nodes = parse_sections(text, dialects=("markdown",)).sections
+    node = nodes[index]
+    guidance = {s.name.lower(): s.guidance for s in split_prompt_sections(prompt_text)}.get(node.title.lower(), "")
+    def neighbour(i): return f"{nodes[i].header}\n{nodes[i].content}" if 0 <= i < len(nodes) else "(none)"
+    if node.children:
+        length = PARENT_SECTION_LENGTH.format(subsections=", ".join(child.title for child in node.children))
+    else: length = REWRITE_SECTION_LENGTH
+    return assemble_prompt(REWRITE_SECTION_PROMPT, title=extract_title_from_text(text), headers=", ".join(n.title for n in nodes),
+        previous=neighbour(index - 1), following=neighbour(index + 1), header=node.header, guidance=guidance,
+        current=node.content or "(empty)", note=note.strip() or "Make it clearer, more specific, and better argued.",
+        length=length, **concept)
+
+def regenerate_section(client, text, index, concept, prompt_text=DEFAULT_PROPOSAL_PROMPT, note="", model=None,
+                       use_cache=True):
+    node = parse_sections(text, dialects=("markdown",)).sections[index]
+    header = node.header
+    # The rewrite keeps the current length, so that (not a word count in the prompt) sizes the reply.
+    reply = complete(client, build_rewrite_prompt(concept, text, index, prompt_text, note), model=model, use_cache=use_cache,
+                     task="rewrite", expected_tokens=count_tokens(node.content) + 50)
+    if not reply or not reply.strip(): raise ValueError(f"The model returned an empty rewrite for '{header}'.")
+    return replace_section(text, index, normalize_section_text(header, reply))
+
+# --- Structure Repair ---
+# A single-pass proposal that drifted from the section format is fixed in place (see validation.py): headers are
+# normalized and duplicates dropped locally, and only sections that are missing, empty or cut off are written again,
+# with the section-parallel prompts. Only an answer that ignored the format altogether is regenerated as a whole.
+
+def draft_outline(text, max_chars=240):
+    # Stands in for the shared outline when single sections of an existing draft are (re)written.
+    lines = [extract_title_from_text(text)]
+    for node in parse_sections(text, dialects=("markdown",)).sections:
+        if node.content:
+            summary = " ".join(node.content.split())
+            lines.append(f"{node.title}: {summary[:max_chars]}{'…' if len(summary) > max_chars else ''}")
+    return "\n".join(lines)
+
+def repair_proposal(client, text, concept, prompt_text=DEFAULT_PROPOSAL_PROMPT, validator=None, finish_reason=None,
+                    use_cache=True, max_concurrency=MAX_SECTION_CONCURRENCY, title=None):
+    # Returns (text, issues); issues is empty when the text already had the expected structure.
+    # validator may be one that already followed the text while it streamed; title stands in for a missing title line.
+    sections = split_prompt_sections(prompt_text)
+    if not sections: return text, []
+    if validator is None: validator = validate_proposal(text, sections, finish_reason)
+    elif not validator.finished: validator.feed_text(text); validator.finish(finish_reason)
+    if validator.ok: return text, []
+    with span("repair_structure", issues=len(validator.problems)) as stage:
+        if validator.collapsed or not validator.occurrences:
+            stage.set(rewritten="all")
+            return generate_proposal_by_sections(client, prompt_text, concept, max_concurrency, use_cache=use_cache), validator.problems
+        repaired = validator.normalized(text, title)
+        failed = validator.failed_headers()
+        stage.set(rewritten=len(failed))
+        if failed:
+            outline = draft_outline(repaired)
+            order = [s.header for s in sections]
+            with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+                futures = {header: pool.submit(contextvars.copy_context().run, complete, client,
+                                               build_section_prompt(concept, outline, sections, order.index(header)),
+                                               None, use_cache, "section") for header in failed}
+                written = {header: normalize_section_text(header, future.result()) for header, future in futures.items()}
+            repaired = insert_sections(repaired, sections, written)
+        return repaired, validator.problems
+
+# --- Campaign Pipeline ---
+# The whole Generate click, without the UI, for the app's background jobs and the batch CLI. The cover only needs the
+# title, so DALL-E runs alongside the proposal body: it starts from the outline (sections), from the first streamed
+# line (stream) or from a cheap up-front title request (single pass).
+
+@dataclass
+class Campaign:
+    title: str
+    text: str
+    cover: object = None        # CoverImage, or None if the image request failed
+    cover_error: str = None
+    stats: dict = None          # stream_complete-style stats (ttft_s, tokens_per_s, completion_tokens, total_s, unit)
+    warnings: list = None
+
+def generate_campaign(client, concept, proposal_prompt=DEFAULT_PROPOSAL_PROMPT, image_prompt=DEFAULT_IMAGE_PROMPT,
+                      parallel_sections=True, use_cache=True, max_section_concurrency=MAX_SECTION_CONCURRENCY,
+                      stream=False, on_text=None, on_title=None, on_issue=None, on_section=None):
+    # on_text(text_so_far) follows the proposal as it grows (streamed tokens or finished sections),
+    # on_title(title) fires once the title is known, on_section(title) as each section is complete (sections and
+    # stream modes) and on_issue(issue) for each structure problem found in a single-pass answer (see validation.py).
+    # An exception raised from any of them aborts the run; a non-streamed single-pass proposal is one request, so
+    # there the last chance before it is on_title and the next one comes only once the whole answer has arrived.
+    image_pool = ThreadPoolExecutor(max_workers=1)
+    cover_job, warnings, started, validator = {}, [], time.perf_counter(), None
+    def start_cover(campaign_title, *_):
+        if 'future' in cover_job: return
+        cover_job['title'] = campaign_title
+        if on_title: on_title(campaign_title)
+        cover_job['future'] = image_pool.submit(contextvars.copy_context().run,
+            generate_cover_image, client, image_prompt.format(campaign_title=campaign_title), use_cache)
+    try:
+        if parallel_sections and split_prompt_sections(proposal_prompt):
+            done = {}
+            def section_done(index, section, section_text):
+                done[index] = section_text
+                if on_section: on_section(section.name)
+                if on_text: on_text(assemble_proposal(cover_job['title'], [done[i] for i in sorted(done)]))
+            text = generate_proposal_by_sections(client, proposal_prompt, concept, max_concurrency=max_section_concurrency,
+                                                 on_outline=start_cover, on_section=section_done, use_cache=use_cache)
+            stats = {'ttft_s': None, 'tokens_per_s': None, 'completion_tokens': len(done),
+                     'total_s': time.perf_counter() - started, 'unit': 'sections'}
+        elif stream:
+            validator = ProposalValidator(split_prompt_sections(proposal_prompt), on_issue=on_issue)
+            tree = None
+            if on_section: tree = SectionTreeParser(on_close=lambda node: on_section(node.title), dialects=("markdown",))
+            streamed = 0
+            def progress(text_so_far):
+                nonlocal streamed
+                # The title is the first line, so the image can start as soon as that line is complete.
+                if 'future' not in cover_job and '\n' in text_so_far.lstrip():
+                    start_cover(extract_title_from_text(text_so_far.lstrip()))
+                if tree: tree.feed(text_so_far[streamed:]); streamed = len(text_so_far)
+                if on_text: on_text(text_so_far)
+                # Stop paying for an answer that ignores the section format; it is rewritten section by section.
+                if validator.sections and validator.feed_text(text_so_far) and validator.collapsed: raise FormatIgnored()
+            try:
+                text, stats = stream_complete(client, build_proposal_prompt(proposal_prompt, concept), on_delta=progress,
+                                              use_cache=use_cache)
+                if tree: tree.finish()
+            except FormatIgnored:
+                text, stats = "", None
+        else:
+            prompt = build_proposal_prompt(proposal_prompt, concept)
+            try:
+                start_cover(generate_title(client, concept, use_cache=use_cache))
+                prompt = build_proposal_prompt(proposal_prompt, concept, cover_job['title'])
+            except BudgetExceeded: raise
+            except Exception as e:
+                warnings.append(f"Could not settle the title up front, the cover image followed the text: {e}")
+            text = complete(client, prompt, use_cache=use_cache)
+            stats, validator = None, ProposalValidator(split_prompt_sections(proposal_prompt), on_issue=on_issue)
+        if validator is not None:
+            text, issues = repair_proposal(client, text or "", concept, proposal_prompt, validator,
+                (stats or {}).get('finish_reason'), use_cache, max_section_concurrency, title=cover_job.get('title'))
+            if issues: warnings.append("The proposal's structure was repaired: " + "; ".join(map(str, issues)) + ".")
+        if not text or not text.strip(): raise ValueError("The model returned an empty proposal.")
+        campaign = Campaign(title=extract_title_from_text(text), text=text, stats=stats, warnings=warnings)
+        start_cover(campaign.title)
+        try:
+            campaign.cover = cover_job['future'].result()
+        except Exception as e:
+            campaign.cover_error = str(e)
+        return campaign
+    finally:
+        # On failure or cancellation, do not wait for a cover nobody will see.
+        image_pool.shutdown(wait=False, cancel_futures=True)
+
+# --- Pre-flight Estimate ---
+# What a Generate click will cost before it is made: the prompts the run would send, counted locally, with the
+# output sized from their word counts. Throughput comes from this server's recent traces once there are any.
+# Cache hits are not predicted, so this is an upper bound.
+
+DEFAULT_TOKENS_PER_S = {'gpt-4o': 60.0, 'gpt-4o-mini': 90.0}
+DEFAULT_FIRST_TOKEN_S = 0.6
+DEFAULT_IMAGE_S = 12.0
+
+@dataclass
+class Estimate:
+    requests: list          # (task, model, prompt_tokens, completion_tokens) per text request
+    images: int
+    latency_s: float
+
+    @property
+    def prompt_tokens(self): return sum(r[2] for r in self.requests)
+
+    @property
+    def completion_tokens(self): return sum(r[3] for r in self.requests)
+
+    @property
+    def cost_usd(self):
+        return (sum(estimate_cost(model, prompt, completion) for _, model, prompt, completion in self.requests)
+                + estimate_cost("dall-e-3", images=self.images))
+
+def _observed(name, model, field, default, recent=50):
+    values = [s[field] for s in get_trace_store().spans()
+              if s['name'] == name and s.get('model') == model and not s.get('cache_hit') and s.get(field)][-recent:]
+    return percentile(values, 50) if values else default
+
+def _request_s(model, completion_tokens):
+    rate = _observed("generate_text", model, 'tokens_per_s', DEFAULT_TOKENS_PER_S.get(model, 50.0))
+    return _observed("generate_text", model, 'ttft_s', DEFAULT_FIRST_TOKEN_S) + completion_tokens / rate
+
+def _makespan(durations, workers):
+    # Wall time of running the durations in order on `workers` parallel slots (as the section pool does).
+    slots = [0.0] * max(1, workers)
+    for duration in durations:
+        slot = slots.index(min(slots)); slots[slot] += duration
+    return max(slots) if durations else 0.0
+
+def estimate_campaign(concept, proposal_prompt=DEFAULT_PROPOSAL_PROMPT, parallel_sections=True, stream=True,
+                      max_section_concurrency=MAX_SECTION_CONCURRENCY):
+    def request(task, prompt_text, extra_prompt_tokens=0):
+        model = model_for(task)
+        return (task, model, count_prompt_tokens(str(prompt_text), model) + extra_prompt_tokens,
+                estimate_output_tokens(str(prompt_text), task))
+    image_s = _observed("generate_image", "dall-e-3", 'duration_s', DEFAULT_IMAGE_S)
+    sections = split_prompt_sections(proposal_prompt) if parallel_sections else []
+    if sections:
+        outline = request("outline", assemble_prompt(OUTLINE_PROMPT, **concept))
+        # Section prompts carry the outline, which is not written yet; count it at its expected length.
+        body = [request("section", build_section_prompt(concept, "", sections, i), outline[3]) for i in range(len(sections))]
+        outline_s = _request_s(outline[1], outline[3])
+        text_s = outline_s + _makespan([_request_s(r[1], r[3]) for r in body], max_section_concurrency)
+        return Estimate([outline] + body, 1, max(text_s, outline_s + image_s))
+    proposal = request("proposal", build_proposal_prompt(proposal_prompt, concept))
+    if stream:
+        # The cover starts once the streamed title line is in.
+        return Estimate([proposal], 1, max(_request_s(proposal[1], proposal[3]), _request_s(proposal[1], 20) + image_s))
+    title = request("title", assemble_prompt(TITLE_PROMPT, **concept))
+    title_s = _request_s(title[1], title[3])
+    return Estimate([title, proposal], 1, max(title_s + _request_s(proposal[1], proposal[3]), title_s + image_s))
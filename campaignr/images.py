@@ -0,0 +1,54 @@
+import base64
+import io
+from dataclasses import dataclass
+from functools import cached_property
+
+# --- Cover Image Variants ---
+# DALL-E returns a ~1.5-2 MB PNG. It is decoded once, then kept as raw bytes in three sizes: the original for
+# download, a small preview for the screen and a print-resolution JPEG for the HTML/PDF report.
+# (JPEG rather than WebP for the report because wkhtmltopdf's WebKit cannot display WebP.)
+
+PREVIEW_MAX_SIDE, PREVIEW_FORMAT, PREVIEW_QUALITY = 640, "WEBP", 80
+REPORT_MAX_SIDE, REPORT_FORMAT, REPORT_QUALITY = 1024, "JPEG", 82
+_MIME = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+@dataclass
+class CoverImage:
+    original: bytes
+    original_mime: str
+    preview: bytes
+    preview_mime: str
+    report: bytes
+    report_mime: str
+
+    @cached_property
+    def report_b64(self): return base64.b64encode(self.report).decode('ascii')
+
+    @property
+    def nbytes(self):
+        # Variants share the original's buffer when Pillow is unavailable, so count each buffer once.
+        return sum(len(data) for data in {id(data): data for data in (self.original, self.preview, self.report)}.values())
+
+def _encode(image, max_side, fmt, quality):
+    if max(image.size) > max_side:
+        image = image.copy(); image.thumbnail((max_side, max_side))
+    out = io.BytesIO()
+    image.save(out, format=fmt, quality=quality, optimize=True)
+    return out.getvalue()
+
+def make_cover_image(image_bytes):
+    try:
+        from PIL import Image
+    except ImportError:
+        # Without Pillow every variant is the original; the app still works, just with larger reports.
+        return CoverImage(image_bytes, "image/png", image_bytes, "image/png", image_bytes, "image/png")
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        original_mime = _MIME.get(image.format, "image/png")
+        rgb = image.convert("RGB")
+    return CoverImage(
+        original=image_bytes, original_mime=original_mime,
+        preview=_encode(rgb, PREVIEW_MAX_SIDE, PREVIEW_FORMAT, PREVIEW_QUALITY), preview_mime=_MIME[PREVIEW_FORMAT],
+        report=_encode(rgb, REPORT_MAX_SIDE, REPORT_FORMAT, REPORT_QUALITY), report_mime=_MIME[REPORT_FORMAT])
+
+def cover_image_from_b64(image_b64):
+    return make_cover_image(base64.b64decode(image_b64))
@@ -0,0 +1,247 @@
+import contextvars
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import engine
+from .archive import get_archive
+from .images import make_cover_image
+from .scheduler import session_scope
+from .tracing import trace_scope
+
+# --- Background Jobs ---
+# Generation runs on a server-side worker pool instead of the Streamlit script thread: the UI submits a job, keeps
+# its id (also in the page URL) and polls. A rerun, a closed tab or a second browser window no longer throws away
+# work in flight, and waiting users do not hold script threads. Each job's state and results are written to
+# .campaignr_jobs/<job id>/ (job.json, proposal.txt, cover.png), so a finished job can be picked up again after a
+# reconnect or a server restart. Jobs are cancelled cooperatively, at the next token, section or stage boundary; a
+# non-streamed single-pass proposal is one request, so a cancel made while it runs lands once that request returns.
+# Finished jobs leave memory after JOB_KEEP_S (get() reloads them from disk) and disk after JOB_TTL_S.
+
+DEFAULT_JOBS_DIR = os.environ.get("CAMPAIGNR_JOBS_DIR", ".campaignr_jobs")
+JOB_WORKERS = int(os.environ.get("CAMPAIGNR_JOB_WORKERS", "8"))
+JOBS_PER_USER = int(os.environ.get("CAMPAIGNR_JOBS_PER_USER", "1"))
+JOB_TTL_S = float(os.environ.get("CAMPAIGNR_JOB_TTL_H", "24")) * 3600
+JOB_KEEP_S = float(os.environ.get("CAMPAIGNR_JOB_KEEP_MIN", "10")) * 60
+PRUNE_INTERVAL_S = 60
+
+ACTIVE, FINISHED = ("queued", "running"), ("done", "failed", "cancelled", "interrupted")
+
+class JobLimitReached(RuntimeError):
+    pass
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, job_id, owner, kind, params=None, status="queued", created=None):
+        self.id, self.owner, self.kind, self.params, self.status = job_id, owner, kind, params or {}, status
+        self.created, self.started, self.finished = created or time.time(), None, None
+        self.error = None
+        self.archive_id = None      # the finished campaign's id in the archive (see archive.py)
+        self.progress = {}          # live, in memory only: e.g. text, title, sections
+        self.result = None          # the finished engine.Campaign
+        self.cancel_requested = threading.Event()
+        self.future = None
+
+    @property
+    def active(self): return self.status in ACTIVE
+
+    def check_cancelled(self):
+        if self.cancel_requested.is_set(): raise JobCancelled()
+
+    def to_dict(self):
+        return {'id': self.id, 'owner': self.owner, 'kind': self.kind, 'params': self.params, 'status': self.status,
+                'created': self.created, 'started': self.started, 'finished': self.finished, 'error': self.error,
+                'archive_id': self.archive_id}
+
+class JobRunner:
+    # Thread-safe; one per process (see get_job_runner).
+
+    def __init__(self, directory=DEFAULT_JOBS_DIR, workers=JOB_WORKERS, per_user=JOBS_PER_USER, ttl_s=JOB_TTL_S,
+                 keep_s=JOB_KEEP_S):
+        self.directory, self.workers, self.per_user = directory, workers, per_user
+        self.ttl_s, self.keep_s = ttl_s, keep_s
+        self._jobs = {}
+        self._pruned = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="campaignr-job")
+        os.makedirs(directory, exist_ok=True)
+        self.prune()
+
+    # -- submitting --
+
+    def submit(self, owner, kind, fn, params=None):
+        # fn(job) runs on a worker inside session_scope(owner) and trace_scope(job.id) and returns the result.
+        self._maybe_prune()
+        with self._lock:
+            running = [job for job in self._jobs.values() if job.owner == owner and job.active]
+            if self.per_user and len(running) >= self.per_user:
+                raise JobLimitReached(f"You already have {len(running)} generation(s) running; "
+                                      f"wait for it to finish or cancel it first.")
+            job = Job(uuid.uuid4().hex, owner, kind, params)
+            self._jobs[job.id] = job
+        self._save(job)
+        job.future = self._pool.submit(contextvars.copy_context().run, self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        if job.cancel_requested.is_set(): return self._finish(job, "cancelled")
+        job.status, job.started = "running", time.time(); self._save(job)
+        try:
+            with session_scope(job.owner), trace_scope(job.id):
+                job.result = fn(job)
+        except JobCancelled:
+            self._finish(job, "cancelled")
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            self._finish(job, "failed")
+        else:
+            self._finish(job, "done")
+
+    def _finish(self, job, status):
+        job.status, job.finished = status, time.time()
+        self._save(job)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or not job.active: return False
+        job.cancel_requested.set()
+        if job.future is not None and job.future.cancel(): self._finish(job, "cancelled")  # never started
+        return True
+
+    # -- reading --
+
+    def get(self, job_id):
+        self._maybe_prune()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load(job_id)
+
+    def forget(self, job_id):
+        # Drops a finished job from memory once its results have been picked up; get() reloads it from disk.
+        with self._lock:
+            if job_id in self._jobs and not self._jobs[job_id].active: del self._jobs[job_id]
+
+    def active(self, owner):
+        with self._lock: return [job for job in self._jobs.values() if job.owner == owner and job.active]
+
+    def stats(self):
+        with self._lock: jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs: counts[job.status] = counts.get(job.status, 0) + 1
+        return {'workers': self.workers, 'per_user': self.per_user, **counts}
+
+    # -- persistence --
+
+    def job_dir(self, job_id): return os.path.join(self.directory, job_id)
+
+    def _save(self, job):
+        directory = self.job_dir(job.id)
+        os.makedirs(directory, exist_ok=True)
+        campaign = job.result if job.status == "done" else None
+        if campaign is not None:
+            _write(os.path.join(directory, "proposal.txt"), campaign.text.encode('utf-8'))
+            if campaign.cover: _write(os.path.join(directory, "cover.png"), campaign.cover.original)
+        state = job.to_dict()
+        if campaign is not None:
+            state['result'] = {'title': campaign.title, 'cover_error': campaign.cover_error, 'stats': campaign.stats,
+                               'warnings': campaign.warnings, 'has_cover': campaign.cover is not None}
+        _write(os.path.join(directory, "job.json"), json.dumps(state, indent=2).encode('utf-8'))
+
+    def _load(self, job_id):
+        # Jobs from an earlier process (or evicted from memory); one that never finished was interrupted.
+        if not job_id or not all(c in "0123456789abcdef" for c in job_id): return None
+        directory = self.job_dir(job_id)
+        try:
+            with open(os.path.join(directory, "job.json"), encoding="utf-8") as f: state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = Job(state['id'], state['owner'], state['kind'], state.get('params'), state['status'], state['created'])
+        job.started, job.finished, job.error = state.get('started'), state.get('finished'), state.get('error')
+        job.archive_id = state.get('archive_id')
+        if job.active: job.status, job.error = "interrupted", "The server restarted while this job was running."
+        result = state.get('result')
+        if job.status == "done" and result:
+            with open(os.path.join(directory, "proposal.txt"), encoding="utf-8") as f: text = f.read()
+            cover = None
+            if result.get('has_cover'):
+                with open(os.path.join(directory, "cover.png"), 'rb') as f: cover = make_cover_image(f.read())
+            job.result = engine.Campaign(result['title'], text, cover, result.get('cover_error'), result.get('stats'),
+                                         result.get('warnings'))
+        with self._lock: self._jobs.setdefault(job.id, job)
+        return job
+
+    def _maybe_prune(self):
+        # submit() and get() (polled by every waiting page) prune at most once per PRUNE_INTERVAL_S.
+        with self._lock:
+            if time.monotonic() - self._pruned < PRUNE_INTERVAL_S: return
+            self._pruned = time.monotonic()
+        self.prune()
+
+    def prune(self):
+        # Drops finished jobs older than keep_s from memory (their results stay on disk) and older than ttl_s from disk.
+        forget, cutoff = time.time() - self.keep_s, time.time() - self.ttl_s
+        with self._lock:
+            for job_id in [i for i, job in self._jobs.items() if not job.active and (job.finished or 0) < forget]:
+                del self._jobs[job_id]
+            active = {i for i, job in self._jobs.items() if job.active}
+            self._pruned = time.monotonic()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name not in active and os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def close(self):
+        with self._lock: jobs = list(self._jobs.values())
+        for job in jobs: job.cancel_requested.set()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+def _write(path, data):
+    # Write-then-rename so a crash never leaves a half-written result behind.
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f: f.write(data)
+    os.replace(tmp, path)
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_job_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None: _runner = JobRunner()
+        return _runner
+
+# --- Campaign Jobs ---
+
+def submit_campaign(owner, client, concept, proposal_prompt, image_prompt, parallel_sections, stream, use_cache, author=None):
+    # Runs engine.generate_campaign on the job pool; job.progress carries the live text, the title, the sections
+    # finished so far and any structure problems found in the text, for the UI to poll. The finished campaign is
+    # archived here, not by the UI, so it is kept even if nobody comes back for it.
+    def run(job):
+        job.progress.update(text="", sections=[], issues=[])
+        def on_text(text):
+            job.check_cancelled(); job.progress['text'] = text
+        def on_title(title):
+            job.check_cancelled(); job.progress['title'] = title
+        def on_section(title):
+            job.check_cancelled(); job.progress['sections'].append(title)
+        def on_issue(issue):
+            if issue.kind != "unexpected": job.progress['issues'].append(str(issue))
+        campaign = engine.generate_campaign(client, concept, proposal_prompt, image_prompt,
+            parallel_sections=parallel_sections, use_cache=use_cache, stream=stream, on_text=on_text, on_title=on_title,
+            on_issue=on_issue, on_section=on_section)
+        job.check_cancelled()
+        try:
+            job.archive_id = get_archive().add(campaign.title, campaign.text, campaign.cover.original if campaign.cover else None,
+                concept=concept, author=author, source=f"job:{job.id}", meta={'parallel_sections': parallel_sections, 'stats': campaign.stats})
+        except (OSError, sqlite3.Error) as e:
+            campaign.warnings.append(f"The campaign could not be archived: {e}")
+        return campaign
+    params = {'concept': concept, 'parallel_sections': parallel_sections, 'stream': stream, 'use_cache': use_cache}
+    return get_job_runner().submit(owner, "campaign", run, params)
@@ -0,0 +1,240 @@
+import argparse
+import base64
+import glob
+import hashlib
+import html
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .prompts import DEFAULT_PROPOSAL_PROMPT
+from .proposal import canonical_header, split_prompt_sections
+
+# --- Offline OpenAI Stand-In ---
+# A local server speaking enough of the chat-completions (streaming and not) and images APIs for the app, the batch
+# CLI and the benchmarks to run without the live API. It replays the recorded proposals and covers in old_jupyter
+# with configurable latency, token rate, rate limits and injected errors. Like the real API it caches prompt
+# prefixes of 1024+ tokens in 128-token steps, reports them as usage.prompt_tokens_details.cached_tokens and
+# answers them with a shorter time to first token.
+#   python -m campaignr.mock_server --port 8765 --ttft 0.8 --tokens-per-sec 40
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run campaignr_app.py
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDINGS_DIR = os.path.join(REPO_DIR, "old_jupyter")
+_SECTIONS = split_prompt_sections(DEFAULT_PROPOSAL_PROMPT)
+
+# --- Recorded Proposals ---
+
+def _to_proposal_text(title, blocks):
+    # blocks: [(raw header, body)] in whatever header dialect the recording used.
+    parts, in_formative = [title.strip()], False
+    for raw_header, body in blocks:
+        header = canonical_header(raw_header, _SECTIONS)
+        if header is None:
+            parts[-1] += f"\n\n{raw_header.strip('*# ')}\n{body.strip()}"; continue
+        if header.startswith("### ") and not in_formative:
+            parts.append("## Formative Research\nThe formative research below examines the problem, the audience and earlier efforts.")
+        in_formative = header.startswith("### ") or header == "## Formative Research"
+        parts.append(f"{header}\n{body.strip()}")
+    return "\n\n".join(parts) + "\n"
+
+def load_html_recording(path):
+    source = open(path, encoding='utf-8').read()
+    title = html.unescape(re.search(r'<h1>(.*?)</h1>', source, re.S).group(1))
+    blocks = [(html.unescape(header), html.unescape(re.sub(r'<[^>]+>', '', body)))
+              for header, body in re.findall(r'<h2>(.*?)</h2>\s*<div class="section-content">(.*?)</div>', source, re.S)]
+    return _to_proposal_text(title, blocks)
+
+def load_text_recording(path):
+    lines = open(path, encoding='utf-8').read().splitlines()
+    title, blocks = lines[0], []
+    for line in lines[1:]:
+        if len(line) < 120 and canonical_header(line, _SECTIONS): blocks.append((line, ""))
+        elif blocks: blocks[-1] = (blocks[-1][0], blocks[-1][1] + line + "\n")
+    return _to_proposal_text(title, blocks)
+
+def load_recordings(recordings_dir=RECORDINGS_DIR):
+    proposals = [load_html_recording(path) for path in sorted(glob.glob(os.path.join(recordings_dir, "01_output", "*", "*.html")))]
+    proposals += [load_text_recording(path) for path in sorted(glob.glob(os.path.join(recordings_dir, "00_ingredients", "*.txt")))]
+    covers = sorted(glob.glob(os.path.join(recordings_dir, "01_output", "*", "*_Cover.png")))
+    return proposals or ["Mock Campaign\n\n## Introduction\nNo recordings were found.\n"], covers
+
+def _section_body(proposal, header):
+    match = re.search(rf'^{re.escape(header)}\n(.*?)(?=^#{{2,3}} |\Z)', proposal, re.M | re.S)
+    return match.group(1).strip() if match else f"This section was not part of the recording it was replayed from."
+
+# --- Server ---
+
+class MockConfig:
+    # rpm/tpm default to limits high enough never to trigger, but are still reported in the headers like the real API.
+    def __init__(self, ttft_s=0.5, tokens_per_s=50.0, image_latency_s=12.0, jitter=0.1, rpm=10000, tpm=30000000, error_rate=0.0):
+        self.ttft_s, self.tokens_per_s, self.image_latency_s, self.jitter = ttft_s, tokens_per_s, image_latency_s, jitter
+        self.rpm, self.tpm, self.error_rate = rpm, tpm, error_rate
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config, recordings_dir=RECORDINGS_DIR):
+        super().__init__(address, MockOpenAIHandler)
+        self.config = config
+        self.proposals, cover_paths = load_recordings(recordings_dir)
+        self._covers = [base64.b64encode(open(path, 'rb').read()).decode('ascii') for path in cover_paths[:3]]
+        self._next_proposal = itertools.count()
+        self._window_start, self._window_requests, self._window_tokens = time.monotonic(), 0, 0
+        self._lock = threading.Lock()
+        self._prefixes = OrderedDict()
+        self.requests_served = 0
+
+    @property
+    def base_url(self): return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def admit(self, tokens):
+        # Fixed one-minute window, enough to exercise the client-side scheduler. Returns (ok, headers).
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60: self._window_start, self._window_requests, self._window_tokens = now, 0, 0
+            reset = f"{60 - (now - self._window_start):.1f}s"
+            over = self._window_requests + 1 > self.config.rpm or self._window_tokens + tokens > self.config.tpm
+            if not over: self._window_requests += 1; self._window_tokens += tokens; self.requests_served += 1
+            headers = {'x-ratelimit-reset-requests': reset, 'x-ratelimit-reset-tokens': reset,
+                       'x-ratelimit-limit-requests': str(self.config.rpm),
+                       'x-ratelimit-remaining-requests': str(max(0, self.config.rpm - self._window_requests)),
+                       'x-ratelimit-limit-tokens': str(self.config.tpm),
+                       'x-ratelimit-remaining-tokens': str(max(0, self.config.tpm - self._window_tokens))}
+            if over: headers['retry-after'] = reset.rstrip('s')
+            return not over, headers
+
+    def cached_prefix_tokens(self, prompt, min_tokens=1024, step_tokens=128, max_entries=100000):
+        # Longest already-seen prefix, at ~4 characters per token; records this prompt's prefixes for later requests.
+        data = prompt.encode('utf-8')
+        boundaries = range(min_tokens * 4, len(data) + 1, step_tokens * 4)
+        digest, position, hashes = hashlib.sha256(), 0, []
+        for boundary in boundaries:
+            digest.update(data[position:boundary]); position = boundary
+            hashes.append((boundary, digest.hexdigest()))
+        with self._lock:
+            cached = max((boundary for boundary, key in hashes if key in self._prefixes), default=0)
+            for _, key in hashes:
+                self._prefixes[key] = True; self._prefixes.move_to_end(key)
+            while len(self._prefixes) > max_entries: self._prefixes.popitem(last=False)
+        return cached // 4
+
+    def reply_for(self, prompt):
+        # Pick what a real model would have said to this kind of prompt, from a recorded proposal.
+        proposal = self.proposals[next(self._next_proposal) % len(self.proposals)]
+        title = proposal.split('\n', 1)[0]
+        forced_title = re.search(r'Use exactly this as the title on the first line: (.+)', prompt)
+        section = re.search(r'first line of your response must be exactly `([^`]+)`', prompt)
+        if section:
+            return f"{section.group(1)}\n{_section_body(proposal, section.group(1))}"
+        if "Write a short outline" in prompt:
+            return f"{title}\nGoals:\n1. {_section_body(proposal, '## Goals')[:300]}\nTheory: Social Norms Approach.\nCore message: Most peers make the safer choice."
+        if "Reply with the title only" in prompt:
+            return title
+        if forced_title:
+            return forced_title.group(1).strip() + "\n" + proposal.split('\n', 1)[1]
+        return proposal
+
+    def cover_b64(self):
+        return random.choice(self._covers) if self._covers else ""
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse can be measured
+
+    def log_message(self, format, *args): pass
+
+    def _delay(self, seconds):
+        jitter = self.server.config.jitter
+        time.sleep(max(0.0, seconds * random.uniform(1 - jitter, 1 + jitter)))
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items(): self.send_header(name, value)
+        self.end_headers(); self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.server.config
+        if self.path.endswith("/chat/completions"): prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+        elif self.path.endswith("/images/generations"): prompt = body.get("prompt", "")
+        else: return self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+        ok, headers = self.server.admit(len(prompt) // 4)
+        if not ok:
+            return self._send_json(429, {"error": {"message": "Rate limit reached (mock).", "type": "rate_limit_error"}}, headers)
+        if config.error_rate and random.random() < config.error_rate:
+            return self._send_json(503, {"error": {"message": "Injected failure (mock).", "type": "server_error"}}, headers)
+        if self.path.endswith("/images/generations"): return self._image(body, headers)
+        return self._chat(body, prompt, headers)
+
+    def _image(self, body, headers):
+        self._delay(self.server.config.image_latency_s)
+        self._send_json(200, {"created": int(time.time()), "data": [{"b64_json": self.server.cover_b64(), "revised_prompt": body.get("prompt")}]}, headers)
+
+    def _chat(self, body, prompt, headers):
+        config, model = self.server.config, body.get("model", "gpt-4o")
+        text = self.server.reply_for(prompt)
+        tokens = re.findall(r'\S+\s*|\s+', text)
+        prompt_tokens, cached_tokens = len(prompt) // 4, self.server.cached_prefix_tokens(prompt)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens),
+                 "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+        base = {"id": f"chatcmpl-mock{random.getrandbits(32):x}", "created": int(time.time()), "model": model}
+        # Prefill is most of the time to first token; a cached prefix skips it.
+        self._delay(config.ttft_s * (1 - 0.5 * cached_tokens / max(1, prompt_tokens)))
+        if not body.get("stream"):
+            self._delay(len(tokens) / config.tokens_per_s)
+            return self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]), headers)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream"); self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers.items(): self.send_header(name, value)
+        self.end_headers()
+        def event(choices, **extra):
+            self._write_chunk(b"data: " + json.dumps(dict(base, object="chat.completion.chunk", choices=choices, **extra)).encode('utf-8') + b"\n\n")
+        started = time.monotonic()
+        for i, token in enumerate(tokens):
+            event([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+            lag = started + (i + 1) / config.tokens_per_s - time.monotonic()
+            if lag > 0: time.sleep(lag)
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"): event([], usage=usage)
+        self._write_chunk(b"data: [DONE]\n\n"); self._write_chunk(b"")
+        self.wfile.flush()
+
+def start_mock_server(host="127.0.0.1", port=0, **config):
+    # Starts the server on a daemon thread and returns it; use server.base_url as the client's base_url.
+    server = MockOpenAIServer((host, port), MockConfig(**config))
+    threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the OpenAI chat-completions and images APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--image-latency", type=float, default=12.0, help="seconds per image")
+    parser.add_argument("--jitter", type=float, default=0.1, help="relative random variation of all delays")
+    parser.add_argument("--rpm", type=int, default=10000, help="requests/min before answering 429")
+    parser.add_argument("--tpm", type=int, default=30000000, help="prompt tokens/min before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args(argv)
+    server = MockOpenAIServer((args.host, args.port), MockConfig(args.ttft, args.tokens_per_sec, args.image_latency,
+                                                                 args.jitter, args.rpm, args.tpm, args.error_rate))
+    print(f"Mock OpenAI API on {server.base_url} ({len(server.proposals)} recorded proposals); "
+          f"run the app with OPENAI_BASE_URL={server.base_url}")
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+PDF_OPTIONS = {'enable-local-file-access': None, 'quiet': None}
+DEFAULT_BACKEND = os.environ.get("CAMPAIGNR_PDF_BACKEND", "pdfkit")
+DEFAULT_WORKERS = int(os.environ.get("CAMPAIGNR_PDF_WORKERS", "2"))
+DEFAULT_QUEUE = int(os.environ.get("CAMPAIGNR_PDF_QUEUE", "8"))
+DEFAULT_TIMEOUT_S = float(os.environ.get("CAMPAIGNR_PDF_TIMEOUT", "60"))
+
+class PdfRenderError(RuntimeError): pass
+class PdfQueueFull(PdfRenderError): pass
+class PdfRenderTimeout(PdfRenderError): pass
+
+# --- Backends ---
+# A backend turns one HTML document into PDF bytes. Backends must be safe to call from several worker threads.
+
+class PdfBackend:
+    name = None
+    def render(self, html_content, timeout_s): raise NotImplementedError
+    def close(self): pass
+
+class PdfkitBackend(PdfBackend):
+    # wkhtmltopdf through pdfkit: one process per document, killed if it overruns the job timeout.
+    name = "pdfkit"
+
+    def __init__(self, options=None):
+        import pdfkit
+        self._pdfkit, self.options = pdfkit, options or PDF_OPTIONS
+
+    def render(self, html_content, timeout_s):
+        kit = self._pdfkit.PDFKit(html_content, 'string', options=self.options)
+        try:
+            result = subprocess.run(kit.command(), input=html_content.encode('utf-8'), capture_output=True,
+                                    timeout=timeout_s, env=kit.environ)
+        except subprocess.TimeoutExpired:
+            raise PdfRenderTimeout(f"wkhtmltopdf did not finish within {timeout_s:.0f} s")
+        # wkhtmltopdf exits non-zero for harmless asset warnings, so trust the output rather than the exit code.
+        if not result.stdout.startswith(b'%PDF'):
+            raise PdfRenderError(f"wkhtmltopdf failed: {result.stderr.decode('utf-8', errors='replace').strip()}")
+        return result.stdout
+
+class WeasyPrintBackend(PdfBackend):
+    # In-process renderer (optional `weasyprint` dependency, see requirements-optional.txt): no process startup per
+    # document, so batches pay start-up once per worker. Python threads cannot be killed, so the timeout only bounds
+    # how long callers wait.
+    name = "weasyprint"
+
+    def __init__(self, base_url=None):
+        import weasyprint
+        self._weasyprint, self.base_url = weasyprint, base_url
+
+    def render(self, html_content, timeout_s):
+        return self._weasyprint.HTML(string=html_content, base_url=self.base_url).write_pdf()
+
+PDF_BACKENDS = {backend.name: backend for backend in (PdfkitBackend, WeasyPrintBackend)}
+
+def make_backend(name):
+    if name not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend {name!r}; choose one of {', '.join(PDF_BACKENDS)}.")
+    return PDF_BACKENDS[name]()
+
+# --- Worker Pool ---
+
+class PdfRenderPool:
+    # A bounded number of renders run at once; at most `max_queue` more may wait. Further submissions block
+    # (or fail with PdfQueueFull) instead of piling up processes. Jobs that waited longer than the job timeout
+    # are dropped unrendered, since whoever asked for them has usually given up.
+
+    def __init__(self, backend=DEFAULT_BACKEND, workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE, timeout_s=DEFAULT_TIMEOUT_S):
+        self.backend = make_backend(backend) if isinstance(backend, str) else backend
+        self.workers, self.max_queue, self.timeout_s = workers, max_queue, timeout_s
+        self.rendered = self.failed = self.rejected = 0
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-render")
+        self._lock = threading.Lock()
+
+    def _run(self, html_content, queued_at):
+        try:
+            if time.monotonic() - queued_at > self.timeout_s:
+                raise PdfRenderTimeout(f"PDF job waited more than {self.timeout_s:.0f} s in the queue")
+            pdf_content = self.backend.render(html_content, self.timeout_s)
+            with self._lock: self.rendered += 1
+            return pdf_content
+        except BaseException:
+            with self._lock: self.failed += 1
+            raise
+        finally:
+            self._slots.release()
+
+    def submit(self, html_content, block=True, wait_s=None):
+        if not self._slots.acquire(blocking=block, timeout=wait_s if block else None):
+            with self._lock: self.rejected += 1
+            raise PdfQueueFull("The PDF renderer is busy; please try again in a moment.")
+        try:
+            return self._pool.submit(self._run, html_content, time.monotonic())
+        except BaseException:
+            self._slots.release(); raise
+
+    def render(self, html_content, wait_s=None):
+        # Blocks for a free queue slot (up to wait_s), then for the result (up to twice the job timeout).
+        future = self.submit(html_content, wait_s=wait_s)
+        try:
+            return future.result(timeout=2 * self.timeout_s)
+        except TimeoutError:
+            raise PdfRenderTimeout(f"PDF rendering did not finish within {2 * self.timeout_s:.0f} s")
+
+    def render_many(self, html_documents):
+        # Yields (index, pdf_bytes or exception) in input order; submission blocks while the queue is full,
+        # so a long iterable of documents is never read into memory all at once.
+        pending = deque()
+        for index, html_content in enumerate(html_documents):
+            pending.append((index, self.submit(html_content)))
+            while pending and pending[0][1].done(): yield self._collect(*pending.popleft())
+        while pending: yield self._collect(*pending.popleft())
+
+    @staticmethod
+    def _collect(index, future):
+        try: return index, future.result()
+        except Exception as e: return index, e
+
+    def stats(self):
+        return {'backend': self.backend.name, 'workers': self.workers, 'max_queue': self.max_queue,
+                'rendered': self.rendered, 'failed': self.failed, 'rejected': self.rejected}
+
+    def close(self):
+        self._pool.shutdown(wait=True); self.backend.close()
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_pdf_pool():
+    # One pool per process, shared by every Streamlit session.
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None: _default_pool = PdfRenderPool()
+        return _default_pool
+
+# --- Batch Rendering ---
+# e.g. python -m campaignr.pdf "old_jupyter/01_output/*/*.html" --out pdfs --backend weasyprint --workers 4
+
+def main(argv=None):
+    import glob
+    parser = argparse.ArgumentParser(description="Render many HTML proposals to PDF through one worker pool.")
+    parser.add_argument("inputs", nargs="+", help="HTML files or glob patterns")
+    parser.add_argument("--out", default="pdf_output", help="output directory (default: %(default)s)")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=sorted(PDF_BACKENDS))
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_S, help="per-document timeout in seconds")
+    args = parser.parse_args(argv)
+
+    paths = sorted({path for pattern in args.inputs for path in (glob.glob(pattern) or [pattern])})
+    os.makedirs(args.out, exist_ok=True)
+    pool = PdfRenderPool(args.backend, workers=args.workers, max_queue=args.workers * 2, timeout_s=args.timeout)
+    started = time.perf_counter()
+    # Read lazily so only the queued documents are held in memory.
+    documents = (open(path, encoding='utf-8').read() for path in paths)
+    failures = 0
+    for index, result in pool.render_many(documents):
+        name = os.path.splitext(os.path.basename(paths[index]))[0] + ".pdf"
+        if isinstance(result, Exception):
+            failures += 1; print(f"FAILED {paths[index]}: {result}")
+            continue
+        with open(os.path.join(args.out, name), 'wb') as f: f.write(result)
+        print(f"ok     {name} ({len(result) / 1024:.0f} KB)")
+    pool.close()
+    elapsed = time.perf_counter() - started
+    print(f"{len(paths) - failures}/{len(paths)} rendered in {elapsed:.1f} s with {args.backend} x{args.workers}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,187 @@
+import re
+from typing import NamedTuple
+
+# --- MASTER PROMPT ---
+# This is the final, most detailed prompt, engineered to produce a substantive, elaborate, and professional proposal in a single pass.
+DEFAULT_PROPOSAL_PROMPT = """
+You are a top-tier public communication campaign strategist with a Ph.D. in health communication. Your task is to write a complete, detailed, and comprehensive campaign proposal draft based on the user's concept. The final document should be professional, substantive, and suitable for a grant application or strategic review.
+
+**Campaign Concept:**
+- **Issue:** {communication_issue}
+- **Need and Audience:** {need_and_audience}
+- **Main Goal:** {main_goal}
+
+**CRITICAL INSTRUCTIONS:**
+1.  **Structure and Formatting:**
+    - The very first line of your response must be the campaign's main title. Do not use Markdown like '#' for the main title.
+    - Every subsequent main section MUST start with a `##` Markdown header (e.g., `## Introduction`).
+    - Sub-sections within "Formative Research" must start with a `###` header (e.g., `### Situation Analysis`).
+    - Do not include any conversational text, preambles, or postscripts. Your output must be ONLY the proposal itself.
+
+2.  **Depth and Length:**
+    - This is the most important instruction. Each section must be **thoroughly elaborated**. Do not write short, bullet-point summaries.
+    - Develop a coherent, written argument for each section, aiming for a substantial length of **at least 500-700 words per main section**.
+    - The goal is a document of several pages, not a brief outline.
+
+---
+**SECTION-SPECIFIC GUIDANCE (Follow these closely):**
+
+**## Introduction**
+Frame the problem with compelling background statistics from reputable sources (e.g., CDC, NIH). Articulate the campaign's core purpose and why it is urgently needed. This should serve as a powerful mission statement and executive summary, setting a professional and evidence-based tone for the entire document.
+
+**## Goals**
+Specify 3-5 distinct campaign goals using the SMART framework (Specific, Measurable, Attainable, Relevant, Time-bound). Number each goal. Clearly differentiate between awareness goals (e.g., "Increase knowledge of X by 20%"), attitude/belief goals (e.g., "Reduce perceived peer approval of Y by 15%"), and behavioral goals (e.g., "Achieve a 10% reduction in self-reported Z behavior"). For each goal, define the specific metric and the timeline (e.g., "as measured by pre- and post-campaign surveys over a six-month period").
+
+**## Formative Research**
+This section must contain the following three sub-sections, each fully developed.
+
+**### Situation Analysis**
+Provide a deep analysis of the problem's causal web. Discuss the social, cultural, economic, and psychological factors contributing to the issue. Cite relevant research to support your analysis. Conclude by identifying the most malleable factors that the campaign can realistically target.
+
+**### Audience Analysis**
+Develop a detailed profile of the primary audience. Go beyond demographics to discuss psychographics: their values, beliefs, media consumption habits (be specific: which platforms, who do they follow?), and key barriers or motivators for change. Identify and describe important secondary audiences (e.g., parents, university staff) and their potential role.
+
+**### Analysis of Previous Communication Efforts**
+Analyze at least two real, well-known campaigns that have addressed similar health issues. For each, critically evaluate its theoretical basis, messaging strategy, successes, and failures, citing published evaluations if possible. Conclude with a summary of actionable lessons that will inform this new campaign's design.
+
+**## Theory and Messages**
+Select a primary socio-behavioral theory (e.g., Health Belief Model, Theory of Planned Behavior, Social Norms Approach). Justify why this theory is the best fit for this specific problem and audience. Then, based on the theory's core constructs, outline the key message strategies. Provide 3-4 detailed examples of message concepts that a creative team could develop into full ads.
+
+**## Exposure and Channels**
+Propose a strategic, multi-channel media plan with a clear timeline. Detail a phased rollout: Phase 1 (Awareness/Teaser), Phase 2 (Main Engagement/Education), Phase 3 (Reinforcement/Call-to-Action). For each phase, specify the channels (e.g., targeted social media ads, on-campus events, influencer collaborations) and the specific type of content to be deployed on each.
+
+**## Evaluation**
+Design a comprehensive evaluation plan that directly links back to the stated goals. Distinguish clearly between **Process Evaluation** (monitoring campaign implementation, reach, engagement, and fidelity) and **Outcome Evaluation** (measuring the achievement of the SMART goals). Describe the methodology in detail, including specific survey instruments, digital analytics to track, and qualitative methods like focus groups. Crucially, explain the research design, including the need for a **baseline measurement** and the use of a **control group** or quasi-experimental design to help establish the campaign's causal impact, explaining that this is necessary to rule out other societal trends.
+
+**## Summary and Outlook**
+Write a powerful, concluding statement that summarizes the strategic approach and reiterates the campaign's potential for meaningful, lasting change.
+
+**## Appendix**
+Briefly list and describe the types of materials that would be included in a full proposal appendix (e.g., "1. Detailed Timeline (Gantt Chart): A visual project plan...", "2. Creative Briefs: Detailed guides for the creative team...", "3. Detailed Budget Breakdown...", "4. Sample Survey Instruments...").
+
+---
+Begin the proposal now.
+"""
+
+DEFAULT_IMAGE_PROMPT = """
+A cover image for a public health campaign titled: "{campaign_title}".
+Atmospheric, themed to a university campus milieu (Michigan State University, green and white colors, a subtle Spartan helmet motif).
+The style should hint at a hard-boiled detective genre but with a quirky, positive spirit.
+The outer edges of the image are blurred and in shadow, focusing the viewer on the center.
+"""
+
+TITLE_INSTRUCTION = "\nUse exactly this as the title on the first line: {campaign_title}\n"
+
+TITLE_PROMPT = """
+Suggest a short, compelling title for a public communication campaign with this concept.
+Reply with the title only, on a single line, without quotes or Markdown.
+
+- Issue: {communication_issue}
+- Need and Audience: {need_and_audience}
+- Main Goal: {main_goal}
+"""
+
+# --- SECTION-PARALLEL PROMPTS ---
+# Used by the outline-then-fan-out engine: one short shared outline, then one request per section.
+OUTLINE_PROMPT = """
+You are a top-tier public communication campaign strategist with a Ph.D. in health communication. Before a team of writers drafts the individual sections of a campaign proposal, you fix the shared plan they all follow.
+
+**Campaign Concept:**
+- **Issue:** {communication_issue}
+- **Need and Audience:** {need_and_audience}
+- **Main Goal:** {main_goal}
+
+Write a short outline (at most 250 words) in exactly this form:
+- The very first line is the campaign's main title, without quotes or Markdown.
+- Then a line starting with `Goals:` followed by 3-5 numbered SMART goals, one per line.
+- Then a line starting with `Theory:` naming the single primary socio-behavioral theory and why it fits, in one or two sentences.
+- Then a line starting with `Core message:` with the campaign's central message idea in one sentence.
+Do not include anything else.
+"""
+
+# The system part is the same for every section of every campaign (instructions plus the guidance for all sections),
+# and the concept and outline open the user part, so all of a campaign's section requests share a long prefix.
+SECTION_SYSTEM_PROMPT = """
+You are a top-tier public communication campaign strategist with a Ph.D. in health communication. You are writing one section of a professional campaign proposal draft, suitable for a grant application or strategic review. Other writers are drafting the remaining sections in parallel from the same outline, so stay consistent with it (same title, goals, and theory).
+
+**CRITICAL INSTRUCTIONS:**
+- The very first line of your response must be exactly the header of your section, as given at the end of the request.
+- Write ONLY this section. Do not repeat the title, do not write other sections, and do not add `##` or `###` headers of your own.
+- Do not include any conversational text, preambles, or postscripts.
+
+**SECTION-SPECIFIC GUIDANCE (for the whole proposal; follow the guidance for your section):**
+"""
+
+SECTION_PROMPT = """
+**Campaign Concept:**
+- **Issue:** {communication_issue}
+- **Need and Audience:** {need_and_audience}
+- **Main Goal:** {main_goal}
+
+**Shared Outline:**
+{outline}
+
+**Your Section:** {header}
+- The very first line of your response must be exactly `{header}`.
+- {length}
+"""
+
+SECTION_LENGTH = "Develop a coherent, written argument rather than bullet-point summaries, aiming for **at least 500-700 words**."
+PARENT_SECTION_LENGTH = "This section's sub-sections ({subsections}) are written separately; write only a brief introductory paragraph of 80-150 words that frames them."
+
+REWRITE_SECTION_PROMPT = """
+You are a top-tier public communication campaign strategist with a Ph.D. in health communication. A finished campaign proposal needs one of its sections rewritten; everything else in the proposal stays as it is, so the new version must fit seamlessly between its neighbours.
+
+**Campaign Concept:**
+- **Issue:** {communication_issue}
+- **Need and Audience:** {need_and_audience}
+- **Main Goal:** {main_goal}
+
+**Proposal Title:** {title}
+**Proposal Sections:** {headers}
+
+**Section Before:**
+{previous}
+
+**Section After:**
+{following}
+
+**Section To Rewrite:** {header}
+{guidance}
+
+**Current Version:**
+{current}
+
+**Requested Changes:** {note}
+
+**CRITICAL INSTRUCTIONS:**
+- The very first line of your response must be exactly `{header}`.
+- Write ONLY this section. Do not repeat the title, do not write other sections, and do not add `##` or `###` headers of your own.
+- Keep the title, goals, and theory the rest of the proposal uses. {length}
+- Do not include any conversational text, preambles, or postscripts.
+"""
+
+REWRITE_SECTION_LENGTH = "Keep roughly the length of the current version."
+
+# --- Prompt Assembly ---
+# OpenAI caches prompt prefixes (from 1024 tokens on), so every request is sent as a byte-stable system message with
+# the static instructions, followed by a user message with whatever varies. assemble_prompt() splits any template,
+# including a prompt edited in the app, by paragraph: paragraphs with a {placeholder} go to the user message, in
+# their original order, and everything else stays in the system message.
+
+class Prompt(NamedTuple):
+    system: str     # identical for every request made from the same template
+    user: str       # concept fields, outline, title and other per-request text
+
+    def messages(self):
+        return [{"role": "system", "content": self.system}, {"role": "user", "content": self.user}]
+
+    def __str__(self): return f"{self.system}\n\n{self.user}"
+
+_PLACEHOLDER_RE = re.compile(r'(?<!\{)\{\w+\}(?!\})')
+
+def assemble_prompt(template, **fields):
+    static, variable = [], []
+    for paragraph in re.split(r'\n[ \t]*\n', template.strip()):
+        (variable if _PLACEHOLDER_RE.search(paragraph) else static).append(paragraph)
+    return Prompt("\n\n".join(static).format(**fields), "\n\n".join(variable).format(**fields))
@@ -0,0 +1,67 @@
+import re
+from dataclasses import dataclass
+
+from .sections import parse_sections
+
+
+# --- Proposal Text Format ---
+# A proposal is a bare title line followed by `## ` main sections and `### ` sub-sections.
+
+@dataclass
+class ProposalSection:
+    header: str     # e.g. "## Introduction" or "### Situation Analysis"
+    guidance: str   # the section-specific guidance from the proposal prompt
+
+    @property
+    def level(self): return len(self.header) - len(self.header.lstrip('#'))
+
+    @property
+    def name(self): return self.header.lstrip('#').strip()
+
+# Called per streamed chunk and per rerun, so deliberately not wrapped in spans (see tracing.py).
+
+def extract_title_from_text(text):
+    lines = text.splitlines()
+    return lines[0].strip().replace("#", "") if lines else "Untitled Campaign"
+
+def parse_text_for_html(text):
+    # Flat (header, content) pairs for the report template, one per `## ` / `### ` header.
+    return parse_sections(text, dialects=("markdown",)).flat()
+
+# Guidance blocks in the proposal prompt look like "**## Introduction**" followed by free text.
+_GUIDANCE_RE = re.compile(r'^\*\*(#{2,3} [^*\n]+)\*\*[ \t]*\n(.*?)(?=^\*\*#{2,3} |^---|\Z)', re.M | re.S)
+
+def split_prompt_sections(prompt_text):
+    # Canonical section order is whatever order the (possibly user-edited) prompt lists them in.
+    return [ProposalSection(m.group(1).strip(), m.group(2).strip()) for m in _GUIDANCE_RE.finditer(prompt_text)]
+
+def normalize_section_text(header, text):
+    # Make a separately generated section start with exactly its header and carry no stray title or headers.
+    body = text.strip()
+    first, _, rest = body.partition('\n')
+    if first.strip().strip('*').strip() in (header, header.lstrip('#').strip()):
+        body = rest.strip()
+    body = re.sub(r'^#{2,3} ', '', body, flags=re.M)
+    return f"{header}\n{body}"
+
+def assemble_proposal(title, section_texts):
+    return "\n\n".join([title.strip()] + [text.strip() for text in section_texts]) + "\n"
+
+def replace_section(text, index, section_text):
+    # Splice a rewritten section over the index-th entry of parse_text_for_html, leaving every other byte alone.
+    # A "##" section with sub-sections only replaces its own introductory text; the sub-sections stay.
+    node = parse_sections(text, dialects=("markdown",)).sections[index]
+    before, after = text[:node.start], text[node.own_end:]
+    return before + section_text.strip() + ("\n\n" + after.lstrip("\n") if after.strip() else "\n")
+
+# Older drafts (see old_jupyter) mark headers as "**1. Introduction**", "3.2 Formative Research - Audience Analysis"
+# or "### Exposure and Channels" regardless of level. Map such a line to its canonical "##"/"###" header.
+_DRIFTED_HEADER_RE = re.compile(r'^[#*\s]*(?:\{\{)?\s*(?:\d+(?:\.\d+)*\.?\s*)?(?:Formative Research\s*-\s*)?(.+?)\s*(?:\}\})?[*:\s]*$')
+
+def canonical_header(line, sections):
+    match = _DRIFTED_HEADER_RE.match(line.strip())
+    if not match: return None
+    name = match.group(1).strip().rstrip(':*').strip().lower()
+    for section in sections:
+        if section.name.lower() == name: return section.header
+    return None
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from .pdf import get_pdf_pool
+from .proposal import parse_text_for_html
+from .tracing import span
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+REPORT_TEMPLATE = "report_template.html"
+
+# --- Render Cache ---
+# Streamlit re-runs the whole script on every widget interaction. The compiled template is kept process-wide
+# and rendered HTML/PDF bytes are memoized on a hash of everything that goes into them, so reruns cost nothing.
+
+class _LRU:
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries, self.max_bytes, self._items, self._lock = max_entries, max_bytes, OrderedDict(), threading.Lock()
+        self.hits = self.misses = 0; self.nbytes = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1; return None
+            self._items.move_to_end(key); self.hits += 1
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._items: self.nbytes -= len(self._items[key])
+            self._items[key] = value; self._items.move_to_end(key); self.nbytes += len(value)
+            # Reports embed the cover image, so entries run to megabytes: bound the bytes as well as the count.
+            while len(self._items) > self.max_entries or (self.nbytes > self.max_bytes and len(self._items) > 1):
+                self.nbytes -= len(self._items.popitem(last=False)[1])
+
+_html_cache, _pdf_cache = _LRU(64, 32 * 1024 * 1024), _LRU(32, 32 * 1024 * 1024)
+_template_lock = threading.Lock()
+_template = {}
+
+def get_report_template():
+    # Returns (template, source_hash); recompiles only when the template file changes on disk.
+    path = os.path.join(TEMPLATE_DIR, REPORT_TEMPLATE)
+    mtime = os.path.getmtime(path)
+    with _template_lock:
+        if _template.get('mtime') != mtime:
+            from jinja2 import Environment, FileSystemLoader  # only once a report is actually opened
+            env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), auto_reload=False)
+            source = env.loader.get_source(env, REPORT_TEMPLATE)[0]
+            _template.update(mtime=mtime, template=env.get_template(REPORT_TEMPLATE),
+                             hash=hashlib.sha256(source.encode('utf-8')).hexdigest())
+        return _template['template'], _template['hash']
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+        h.update(len(data).to_bytes(8, 'big')); h.update(data)
+    return h.hexdigest()
+
+def render_report_html(text, title, author_name, image_b64=None, generation_date=None, image_mime=None):
+    generation_date = generation_date or datetime.now().strftime('%Y-%m-%d')
+    template, template_hash = get_report_template()
+    image_mime = image_mime or "image/png"
+    key = _digest(template_hash, text, title, author_name, image_b64 or "", image_mime, generation_date)
+    with span("jinja_render") as stage:
+        html_content = _html_cache.get(key)
+        stage.set(cache_hit=html_content is not None)
+        if html_content is None:
+            sections = parse_text_for_html(text)
+            stage.set(sections=len(sections))
+            html_content = template.render({
+                'report_title': title, 'author_name': author_name, 'title_image_b64': image_b64, 'title_image_mime': image_mime,
+                'sections': sections, 'generation_date': generation_date})
+            _html_cache.set(key, html_content)
+        stage.set(bytes=len(html_content))
+        return html_content
+
+def render_report_pdf(html_content):
+    # Raises on failure (e.g. wkhtmltopdf missing); failures are not cached so a fixed setup works on retry.
+    key = _digest(html_content)
+    with span("pdf_render") as stage:
+        pdf_content = _pdf_cache.get(key)
+        stage.set(cache_hit=pdf_content is not None)
+        if pdf_content is None:
+            pool = get_pdf_pool(); stage.set(backend=pool.backend.name)
+            pdf_content = pool.render(html_content, wait_s=30)
+            _pdf_cache.set(key, pdf_content)
+        stage.set(bytes=len(pdf_content))
+        return pdf_content
+
+def render_cache_stats():
+    return {'html_hits': _html_cache.hits, 'html_misses': _html_cache.misses,
+            'pdf_hits': _pdf_cache.hits, 'pdf_misses': _pdf_cache.misses}
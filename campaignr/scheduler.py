@@ -0,0 +1,178 @@
+import contextlib
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+# --- Rate-Limit-Aware Request Scheduler ---
+# Every OpenAI call goes through the scheduler for its model. It keeps token buckets for requests/min and
+# tokens/min that are re-synced from the x-ratelimit-* response headers, retries 429s, 5xx and connection errors
+# with jittered exponential backoff (honouring Retry-After), and when the budget is exhausted it serves waiting
+# sessions round-robin, so one user's fan-out of section requests cannot starve everyone else.
+# Clients should be created with max_retries=0 so the SDK's own retries do not multiply ours.
+
+DEFAULT_LIMITS = {  # (requests/min, tokens/min) until the first response headers tell us the real values
+    'gpt-4o': (500, 30000), 'gpt-4o-mini': (500, 200000), 'dall-e-3': (50, None)}
+FALLBACK_LIMITS = (int(os.environ.get("CAMPAIGNR_RPM", "500")), int(os.environ.get("CAMPAIGNR_TPM", "30000")))
+MAX_RETRIES = int(os.environ.get("CAMPAIGNR_MAX_RETRIES", "5"))
+BASE_DELAY_S, MAX_DELAY_S = 1.0, 60.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_CONNECTION_ERRORS = {'APIConnectionError', 'APITimeoutError', 'ConnectionError', 'Timeout', 'ReadTimeout', 'ConnectTimeout'}
+
+current_session = contextvars.ContextVar("campaignr_session", default="default")
+
+@contextlib.contextmanager
+def session_scope(session_id):
+    # Requests made inside the block (and in threads started with contextvars.copy_context().run) queue as this session.
+    token = current_session.set(session_id)
+    try: yield
+    finally: current_session.reset(token)
+
+def parse_duration(value):
+    # OpenAI reset headers look like "1s", "6m0s", "20ms" or "0.5s".
+    if value is None: return None
+    value = str(value).strip()
+    try: return float(value)
+    except ValueError: pass
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    parts = re.findall(r'([\d.]+)(ms|h|m|s)', value)
+    return sum(float(number) * units[unit] for number, unit in parts) if parts else None
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute); self.level = float(per_minute)
+        self.rate = self.capacity / 60.0; self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate); self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)  # an oversized request waits for a full bucket, not forever
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now); self.level -= min(amount, self.capacity)
+
+    def sync(self, limit, remaining, reset_s, now):
+        if limit: self.capacity = float(limit); self.rate = self.capacity / 60.0
+        if remaining is not None:
+            self.level = float(remaining); self.updated = now
+            # If the server says the window resets sooner than our refill rate implies, trust the server.
+            if reset_s and limit and reset_s > 0: self.rate = max(self.rate, (self.capacity - self.level) / reset_s)
+
+def _status_and_headers(error):
+    response = getattr(error, 'response', None)
+    status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    return status, getattr(response, 'headers', None)
+
+def is_retryable(error):
+    status, _ = _status_and_headers(error)
+    if status is not None: return status in RETRYABLE_STATUS
+    return any(cls.__name__ in _CONNECTION_ERRORS for cls in type(error).__mro__)
+
+class RequestScheduler:
+    def __init__(self, requests_per_min, tokens_per_min=None, max_retries=MAX_RETRIES,
+                 base_delay_s=BASE_DELAY_S, max_delay_s=MAX_DELAY_S):
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min) if tokens_per_min else None
+        self.max_retries, self.base_delay_s, self.max_delay_s = max_retries, base_delay_s, max_delay_s
+        self.calls = self.retries = self.rate_limited = self.failures = 0
+        self.queue_wait_s = 0.0
+        self._cond = threading.Condition()
+        self._waiting = {}          # session -> deque of tickets
+        self._rotation = deque()    # sessions with waiters, in round-robin order
+        self._paused_until = 0.0    # set after a 429 so the whole model backs off, not just the unlucky caller
+
+    def _acquire(self, session, tokens):
+        ticket, queued_at = object(), time.monotonic()
+        with self._cond:
+            queue = self._waiting.setdefault(session, deque()); queue.append(ticket)
+            if session not in self._rotation: self._rotation.append(session)
+            while True:
+                now, wait = time.monotonic(), None
+                if self._rotation[0] == session and queue[0] is ticket:
+                    wait = max(self._paused_until - now, self.requests.wait_time(1, now),
+                               self.tokens.wait_time(tokens, now) if self.tokens else 0.0)
+                    if wait <= 0:
+                        self.requests.take(1, now)
+                        if self.tokens: self.tokens.take(tokens, now)
+                        queue.popleft(); self._rotation.popleft()
+                        if queue: self._rotation.append(session)
+                        else: del self._waiting[session]
+                        self.queue_wait_s += now - queued_at
+                        self._cond.notify_all()
+                        return
+                self._cond.wait(timeout=wait if wait is not None else 1.0)
+
+    def observe(self, headers):
+        if not headers: return
+        now = time.monotonic()
+        def number(name):
+            try: return float(headers.get(name))
+            except (TypeError, ValueError): return None
+        with self._cond:
+            self.requests.sync(number('x-ratelimit-limit-requests'), number('x-ratelimit-remaining-requests'),
+                               parse_duration(headers.get('x-ratelimit-reset-requests')), now)
+            if self.tokens:
+                self.tokens.sync(number('x-ratelimit-limit-tokens'), number('x-ratelimit-remaining-tokens'),
+                                 parse_duration(headers.get('x-ratelimit-reset-tokens')), now)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt, headers):
+        retry_after = None
+        if headers and headers.get('retry-after-ms'): retry_after = parse_duration(headers['retry-after-ms']) / 1000
+        elif headers and headers.get('retry-after'): retry_after = parse_duration(headers['retry-after'])
+        if retry_after is not None: return min(retry_after, self.max_delay_s) + random.uniform(0, 0.25)
+        # Full jitter: spreads retries out so simultaneous failures do not come back in lockstep.
+        return random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2 ** attempt))
+
+    def call(self, fn, tokens=1, session=None):
+        # Runs fn() under the budget, retrying transient failures. If fn returns a response with .headers
+        # (an OpenAI raw response or a requests.Response), the buckets are re-synced from them.
+        session = session or current_session.get()
+        for attempt in range(self.max_retries + 1):
+            self._acquire(session, tokens)
+            with self._cond: self.calls += 1
+            try:
+                result = fn()
+            except Exception as e:
+                status, headers = _status_and_headers(e)
+                self.observe(headers)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    with self._cond: self.failures += 1
+                    raise
+                delay = self._backoff(attempt, headers)
+                with self._cond:
+                    self.retries += 1
+                    if status == 429:
+                        self.rate_limited += 1
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                time.sleep(delay)
+                continue
+            self.observe(getattr(result, 'headers', None))
+            return result
+
+    def stats(self):
+        with self._cond:
+            return {'calls': self.calls, 'retries': self.retries, 'rate_limited': self.rate_limited,
+                    'failures': self.failures, 'waiting': sum(len(q) for q in self._waiting.values()),
+                    'avg_queue_wait_s': self.queue_wait_s / self.calls if self.calls else 0.0,
+                    'requests_left': round(self.requests.level), 'tokens_left': round(self.tokens.level) if self.tokens else None}
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(model):
+    # One scheduler per model per process; OpenAI rate limits are per organisation and model.
+    with _schedulers_lock:
+        if model not in _schedulers:
+            _schedulers[model] = RequestScheduler(*DEFAULT_LIMITS.get(model, FALLBACK_LIMITS))
+        return _schedulers[model]
+
+def estimate_tokens(text, max_output_tokens=2000):
+    # Rough budget for the tokens/min bucket: ~4 characters per token plus the expected completion.
+    return len(text) // 4 + max_output_tokens
@@ -0,0 +1,153 @@
+import re
+
+# --- Incremental Section Tree Parser ---
+# Consumes a proposal as it streams in and keeps a nested section tree current. Two header dialects are understood:
+#   markdown: "## Section" / "### Sub-section" at the start of a line (the app's format)
+#   legacy:   "{{1. Introduction}}", "{{3.1 Formative Research - ...}}" anywhere in the text (old_jupyter/utils.py)
+# Each character is examined once when its line completes, so feeding a whole document costs O(n) however it is
+# chunked. Text before the first header is kept on the root node instead of being dropped, and a section is
+# reported as closed as soon as the next header at the same or a higher level starts.
+
+_MARKDOWN_HEADER_RE = re.compile(r'(##|###) (.*)')
+_LEGACY_MARKER_RE = re.compile(r'\{\{(\d+(?:\.\d+)*)\.?[^}]*\}\}')
+DIALECTS = ("markdown", "legacy")
+
+class SectionNode:
+    def __init__(self, level, header, number=None, parent=None, start=0):
+        self.level, self.header, self.number, self.parent = level, header, number, parent
+        self.children, self.closed = [], False
+        self.start, self.end = start, None     # character offsets of the header and of the next section
+        self._parts, self._content = [], None
+
+    @property
+    def title(self):
+        if self.number is not None: return self.header[2:-2].strip()
+        return self.header.lstrip('#').strip()
+
+    @property
+    def raw_content(self):
+        # Joined once when the section closes; while it is still open, joined on demand.
+        if self._content is not None: return self._content
+        return "".join(self._parts)
+
+    @property
+    def content(self): return self.raw_content.strip()
+
+    def _append(self, text):
+        self._parts.append(text)
+
+    @property
+    def own_end(self):
+        # Where this section's own text stops: its first sub-section, or its end.
+        return self.children[0].start if self.children else self.end
+
+    def _close(self, end):
+        if not self.closed:
+            self._content = "".join(self._parts); self._parts = None; self.closed = True; self.end = end
+
+    def walk(self):
+        yield self
+        for child in self.children: yield from child.walk()
+
+    def __repr__(self):
+        return f"SectionNode({self.header!r}, children={len(self.children)}, closed={self.closed})"
+
+class SectionTreeParser:
+    def __init__(self, on_close=None, dialects=DIALECTS):
+        self.root = SectionNode(1, "")
+        self.on_close = on_close
+        self._markdown, self._legacy = "markdown" in dialects, "legacy" in dialects
+        self._open = [self.root]        # path from the root to the section currently receiving text
+        self._tail = []                 # pieces of the current, not yet complete line
+        self._pending_marker = ""       # a legacy "{{" marker whose "}}" has not arrived yet
+        self._position = 0              # offset of the next line to be parsed
+        self._closed = []
+
+    # -- feeding --
+
+    def feed(self, chunk):
+        # Returns the sections closed by this chunk, in document order.
+        self._closed = []
+        if "\n" not in chunk:
+            self._tail.append(chunk); return self._closed
+        head, _, rest = chunk.rpartition("\n")
+        self._tail.append(head + "\n")
+        text, self._tail = "".join(self._tail), [rest] if rest else []
+        for line in text.splitlines(keepends=True): self._line(line)
+        return self._closed
+
+    def finish(self):
+        self._closed = []
+        if self._tail: self._line("".join(self._tail)); self._tail = []
+        if self._pending_marker: self._text(self._pending_marker); self._pending_marker = ""
+        while len(self._open) > 1: self._close_top(self._position)
+        self.root._close(self._position)
+        return self._closed
+
+    def _line(self, line):
+        start = self._position
+        self._position += len(line)
+        if self._pending_marker:
+            start -= len(self._pending_marker)
+            line, self._pending_marker = self._pending_marker + line, ""
+        elif self._markdown and line.startswith("##"):
+            match = _MARKDOWN_HEADER_RE.match(line.rstrip("\r\n"))
+            if match:
+                self._open_section(len(match.group(1)), f"{match.group(1)} {match.group(2)}", start=start); return
+        if not self._legacy or "{{" not in line:
+            self._text(line); return
+        position = 0
+        for match in _LEGACY_MARKER_RE.finditer(line):
+            self._text(line[position:match.start()])
+            number = match.group(1)
+            self._open_section(2 + number.count("."), match.group(0), number, start=start + match.start())
+            position = match.end()
+        rest = line[position:]
+        if "{{" in rest and "}}" not in rest[rest.index("{{"):]:
+            # The marker continues on a later line; hold it back until it closes.
+            start = rest.index("{{")
+            self._text(rest[:start]); self._pending_marker = rest[start:]
+        else:
+            self._text(rest)
+
+    def _text(self, text):
+        if text: self._open[-1]._append(text)
+
+    def _close_top(self, end):
+        node = self._open.pop(); node._close(end); self._closed.append(node)
+        if self.on_close: self.on_close(node)
+
+    def _open_section(self, level, header, number=None, start=0):
+        while len(self._open) > 1 and self._open[-1].level >= level: self._close_top(start)
+        parent = self._open[-1]
+        if number is not None and "." in number:
+            # Legacy "3.1" nests only under an open "3."; without one it stays a top-level section.
+            parent_number = number.rsplit(".", 1)[0]
+            if parent.number != parent_number:
+                while len(self._open) > 1: self._close_top(start)
+                parent, level = self.root, 2
+        node = SectionNode(level, header, number, parent, start)
+        parent.children.append(node); self._open.append(node)
+
+    # -- views --
+
+    @property
+    def sections(self):
+        return [node for node in self.root.walk() if node is not self.root]
+
+    @property
+    def preamble(self): return self.root.content
+
+    def flat(self):
+        # The (header, content) pairs parse_text_for_html has always returned.
+        return [(node.header, node.content) for node in self.sections]
+
+    def marked(self):
+        # The strings split_text_into_sections has always returned: the preamble (only if there is one), then
+        # "{{n. ...}} text" per section.
+        return ([self.preamble] if self.preamble else []) + [f"{node.header} {node.content}".strip() for node in self.sections]
+
+def parse_sections(text, dialects=DIALECTS):
+    parser = SectionTreeParser(dialects=dialects)
+    parser.feed(text); parser.finish()
+    return parser
@@ -0,0 +1,116 @@
+import os
+import re
+import threading
+import zlib
+
+from .archive import get_archive
+
+# --- Similar-Concept Lookup ---
+# The response cache only helps when a prompt is repeated byte for byte; a workshop full of people typing the
+# placeholder concept in their own words misses it every time. Here every archived concept (issue, audience, goal)
+# gets a MinHash signature over its words and word pairs, bucketed by LSH banding, so a new concept is matched
+# against tens of thousands of past ones by a handful of dictionary lookups. The app offers the best match as a
+# ready draft before anything is sent to OpenAI. The index follows the archive incrementally. numpy is imported on
+# the first lookup, not with the app.
+
+NUM_PERM, BANDS = 96, 32                 # 32 bands of 3 rows: pairs above ~50% shingle overlap almost always collide
+ROWS = NUM_PERM // BANDS
+MIN_SIMILARITY = float(os.environ.get("CAMPAIGNR_SIMILAR_MIN", "0.5"))
+_PRIME = (1 << 31) - 1
+_permutations = []
+_permutations_lock = threading.Lock()
+
+def _hash_params():
+    # (A, B) of the NUM_PERM hash functions; fixed seed, so signatures mean the same in every process.
+    import numpy as np
+    with _permutations_lock:
+        if not _permutations:
+            rng = np.random.default_rng(0x5EED)
+            _permutations.extend(rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)[:, None] for _ in range(2))
+        return _permutations
+
+CONCEPT_FIELDS = ('communication_issue', 'need_and_audience', 'main_goal')
+
+def concept_text(concept):
+    return " ".join(str(concept.get(field) or "") for field in CONCEPT_FIELDS)
+
+def shingles(text):
+    words = re.findall(r'[a-z0-9]+', text.lower())
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+def signature(text):
+    # MinHash over 31-bit CRCs of the shingles; None for text without words.
+    tokens = shingles(text)
+    if not tokens: return None
+    import numpy as np
+    a, b = _hash_params()
+    hashes = np.fromiter((zlib.crc32(token.encode('utf-8')) & _PRIME for token in tokens), dtype=np.uint64, count=len(tokens))
+    return ((a * hashes + b) % _PRIME).min(axis=1)
+
+class SimilarConceptIndex:
+    # Thread-safe. Keys are archive campaign ids; re-adding a key replaces its signature.
+
+    def __init__(self):
+        self._keys, self._signatures, self._rows = [], None, {}     # signatures: uint64 array, allocated on first add
+        self._buckets = [{} for _ in range(BANDS)]  # band bytes -> rows
+        self._lock = threading.Lock()
+
+    def __len__(self): return len(self._keys)
+
+    def add(self, key, text):
+        import numpy as np
+        sig = signature(text)
+        if sig is None: return
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = len(self._keys); self._keys.append(key)
+                if self._signatures is None: self._signatures = np.empty((64, NUM_PERM), dtype=np.uint64)
+                elif row == len(self._signatures):
+                    self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+            # A replaced signature leaves its old bucket entries behind; query() re-scores every candidate anyway.
+            self._signatures[row] = sig
+            for band in range(BANDS):
+                self._buckets[band].setdefault(sig[band * ROWS:(band + 1) * ROWS].tobytes(), []).append(row)
+
+    def query(self, text, limit=3, min_similarity=MIN_SIMILARITY):
+        # [(key, estimated Jaccard similarity)], most similar first.
+        import numpy as np
+        sig = signature(text)
+        if sig is None: return []
+        with self._lock:
+            candidates = set()
+            for band in range(BANDS):
+                candidates.update(self._buckets[band].get(sig[band * ROWS:(band + 1) * ROWS].tobytes(), ()))
+            if not candidates: return []
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            scores = (self._signatures[rows] == sig).mean(axis=1)
+            keys = self._keys
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [(keys[rows[i]], float(scores[i])) for i in order if scores[i] >= min_similarity]
+
+# --- Archive-Backed Lookup ---
+
+_index = SimilarConceptIndex()
+_synced = {'updated': 0.0}
+_sync_lock = threading.Lock()
+
+def _sync(archive):
+    # Picks up campaigns archived (or updated) since the last call, from this or another process.
+    with _sync_lock:
+        for campaign_id, concept, updated in archive.concepts_since(_synced['updated']):
+            _index.add(campaign_id, concept_text(concept))
+            _synced['updated'] = max(_synced['updated'], updated)
+
+def find_similar(concept, limit=3, min_similarity=MIN_SIMILARITY, archive=None, exclude=()):
+    # [(campaign_id, title, similarity)] for archived campaigns whose concept is close to this one, leaving out the
+    # campaign ids in exclude (the draft the user already has open, say).
+    archive = archive or get_archive()
+    _sync(archive)
+    exclude = {campaign_id for campaign_id in exclude if campaign_id is not None}
+    matches = []
+    for campaign_id, similarity in _index.query(concept_text(concept), limit + len(exclude), min_similarity):
+        if campaign_id in exclude: continue
+        campaign = archive.get(campaign_id)
+        if campaign is not None and campaign.text_key: matches.append((campaign_id, campaign.title, similarity))
+    return matches[:limit]
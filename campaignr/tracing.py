@@ -0,0 +1,188 @@
+import argparse
+import contextlib
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from .scheduler import current_session
+
+# --- Stage Tracing ---
+# Each pipeline stage (OpenAI text, DALL-E, structure repair, Jinja, PDF) runs inside a span that records wall
+# time, token counts, throughput, bytes produced and cache hits. Microsecond helpers called inside those stages
+# (title extraction, section parsing) are not traced on their own: every span costs a flushed log line. Finished spans go to an in-memory
+# ring (for the running server's percentile panel) and are appended to a size-rotated JSONL log on disk.
+# All spans recorded inside trace_scope() share a trace id, so one click's stages can be read back together.
+
+DEFAULT_TRACE_DIR = os.environ.get("CAMPAIGNR_TRACE_DIR", ".campaignr_traces")
+TRACE_MAX_BYTES = int(os.environ.get("CAMPAIGNR_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.environ.get("CAMPAIGNR_TRACE_BACKUPS", "5"))
+RECENT_SPANS = 5000
+
+# USD per 1M prompt / cached prompt / completion tokens, and per image. Update when OpenAI's prices change.
+MODEL_PRICES = {'gpt-4o': (2.50, 1.25, 10.00), 'gpt-4o-mini': (0.15, 0.075, 0.60)}
+IMAGE_PRICES = {'dall-e-3': 0.040}
+
+current_trace = contextvars.ContextVar("campaignr_trace", default=None)
+
+@contextlib.contextmanager
+def trace_scope(trace_id=None):
+    # Spans recorded inside the block (and in threads started with contextvars.copy_context().run) share trace_id.
+    token = current_trace.set(trace_id or uuid.uuid4().hex)
+    try: yield current_trace.get()
+    finally: current_trace.reset(token)
+
+def estimate_cost(model, prompt_tokens=0, completion_tokens=0, images=0, cached_tokens=0):
+    # cached_tokens is the part of prompt_tokens served from OpenAI's prompt cache, billed at the lower rate.
+    if model in IMAGE_PRICES: return images * IMAGE_PRICES[model]
+    prompt_price, cached_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0, 0.0))
+    return ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price
+            + completion_tokens * completion_price) / 1e6
+
+class Span:
+    def __init__(self, name, attrs):
+        self.name, self.attrs = name, attrs
+        self.started = time.time(); self._start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record(self, error=None):
+        duration = time.perf_counter() - self._start
+        attrs = self.attrs
+        if attrs.get('completion_tokens') and duration > 0 and 'tokens_per_s' not in attrs:
+            attrs['tokens_per_s'] = attrs['completion_tokens'] / duration
+        if 'model' in attrs and 'cost_usd' not in attrs:
+            attrs['cost_usd'] = 0.0 if attrs.get('cache_hit') else estimate_cost(attrs['model'],
+                attrs.get('prompt_tokens') or 0, attrs.get('completion_tokens') or 0, attrs.get('images') or 0,
+                attrs.get('cached_tokens') or 0)
+        entry = {'name': self.name, 'start': self.started, 'duration_s': duration,
+                 'trace': current_trace.get(), 'session': current_session.get(), **attrs}
+        if error is not None: entry['error'] = f"{type(error).__name__}: {error}"
+        return entry
+
+class TraceStore:
+    # Thread-safe; the JSONL log rotates to traces.jsonl.1 ... .N once it exceeds max_bytes.
+
+    def __init__(self, directory=DEFAULT_TRACE_DIR, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS,
+                 export=True, recent=RECENT_SPANS):
+        self.directory, self.max_bytes, self.backups, self.export = directory, max_bytes, backups, export
+        self.path = os.path.join(directory, "traces.jsonl")
+        self.recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+        self._file = None
+        if export: os.makedirs(directory, exist_ok=True)
+
+    def add(self, entry):
+        with self._lock:
+            self.recent.append(entry)
+            if not self.export: return
+            try:
+                if self._file is None: self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps(entry, default=str) + "\n"); self._file.flush()
+                if self._file.tell() >= self.max_bytes: self._rotate()
+            except OSError:
+                self.export = False  # a read-only or full disk must not break generation
+
+    def _rotate(self):
+        self._file.close(); self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"): os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0: os.replace(self.path, f"{self.path}.1")
+        else: os.remove(self.path)
+
+    def spans(self):
+        with self._lock: return list(self.recent)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None: self._file.close(); self._file = None
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_trace_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TraceStore(export=os.environ.get("CAMPAIGNR_TRACE", "on").lower() not in ("0", "off", "false", "no"))
+        return _store
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    # with span("generate_text", model=model) as s: ...; s.set(completion_tokens=n)
+    current = Span(name, attrs)
+    try: yield current
+    except BaseException as e:
+        get_trace_store().add(current.record(error=e)); raise
+    get_trace_store().add(current.record())
+
+def percentile(values, q):
+    if not values: return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def summarize(spans):
+    # {stage: {count, p50_s, p95_s, p99_s, tokens_per_s, cache_hit_rate, cached_token_rate, errors, bytes, cost_usd}}
+    # in first-seen order. cache_hit_rate is our response cache; cached_token_rate is OpenAI's prompt cache.
+    stages = {}
+    for entry in spans: stages.setdefault(entry['name'], []).append(entry)
+    summary = {}
+    for name, entries in stages.items():
+        durations = [e['duration_s'] for e in entries]
+        rates = [e['tokens_per_s'] for e in entries if e.get('tokens_per_s')]
+        hits = [e['cache_hit'] for e in entries if 'cache_hit' in e]
+        prompt_tokens = sum(e.get('prompt_tokens') or 0 for e in entries)
+        summary[name] = {
+            'count': len(entries), 'p50_s': percentile(durations, 50), 'p95_s': percentile(durations, 95),
+            'p99_s': percentile(durations, 99), 'tokens_per_s': percentile(rates, 50),
+            'cache_hit_rate': sum(hits) / len(hits) if hits else None,
+            'cached_token_rate': sum(e.get('cached_tokens') or 0 for e in entries) / prompt_tokens if prompt_tokens else None,
+            'errors': sum(1 for e in entries if 'error' in e), 'bytes': sum(e.get('bytes') or 0 for e in entries),
+            'cost_usd': sum(e.get('cost_usd') or 0.0 for e in entries)}
+    return summary
+
+def stage_summary():
+    return summarize(get_trace_store().spans())
+
+def read_trace_log(directory=DEFAULT_TRACE_DIR):
+    # Oldest first: traces.jsonl.N ... traces.jsonl.1, traces.jsonl.
+    paths = sorted(glob.glob(os.path.join(directory, "traces.jsonl.*")), key=lambda p: -int(p.rsplit(".", 1)[1]))
+    for path in paths + [os.path.join(directory, "traces.jsonl")]:
+        if not os.path.exists(path): continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    try: yield json.loads(line)
+                    except json.JSONDecodeError: pass  # a line cut short by a crash
+
+# --- Command Line ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m campaignr.tracing",
+        description="Summarise the stage timings recorded in the campaignr trace log.")
+    parser.add_argument("--dir", default=DEFAULT_TRACE_DIR, help="trace directory (default: %(default)s)")
+    parser.add_argument("--since", type=float, default=None, help="only spans from the last N hours")
+    args = parser.parse_args(argv)
+
+    spans = list(read_trace_log(args.dir))
+    if args.since is not None:
+        cutoff = time.time() - args.since * 3600
+        spans = [s for s in spans if s.get('start', 0) >= cutoff]
+    if not spans:
+        print(f"No spans in {args.dir}."); return 1
+    print(f"{'stage':<18}{'n':>7}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'tok/s':>8}{'cache':>7}{'prefix':>8}{'err':>5}{'USD':>9}")
+    for name, s in summarize(spans).items():
+        rate = f"{s['tokens_per_s']:.0f}" if s['tokens_per_s'] else "-"
+        hits = f"{s['cache_hit_rate']:.0%}" if s['cache_hit_rate'] is not None else "-"
+        prefix = f"{s['cached_token_rate']:.0%}" if s['cached_token_rate'] is not None else "-"
+        print(f"{name:<18}{s['count']:>7}{s['p50_s']:>9.3f}{s['p95_s']:>9.3f}{s['p99_s']:>9.3f}{rate:>8}{hits:>7}{prefix:>8}"
+              f"{s['errors']:>5}{s['cost_usd']:>9.2f}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
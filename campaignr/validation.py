@@ -0,0 +1,191 @@
+import re
+from dataclasses import dataclass
+
+from .proposal import canonical_header
+
+# --- Streaming Structure Validation ---
+# The proposal prompt asks for a bare title line, then `## ` sections and `### ` sub-sections in the order its
+# guidance blocks list them. Models drift: "**1. Introduction**" instead of "## Introduction", a "###" promoted to
+# "##", a section skipped or written twice, an answer cut off at max_tokens. parse_text_for_html then quietly returns
+# a partial list. ProposalValidator checks the text against the expected sections while it streams in, so each
+# problem is known as soon as the line that shows it arrives: a skipped section when the next one starts, a body
+# that ignores the format altogether after FORMAT_GRACE_CHARS (the caller can abort the stream right there).
+# normalized() fixes what can be fixed without the model; engine.repair_proposal() re-requests only the rest.
+
+FORMAT_GRACE_CHARS = 2000           # body text allowed after the title before some recognisable header must appear
+MAX_HEADER_CHARS = 120
+_MARKDOWN_HEADER_RE = re.compile(r'^(#{1,6})\s+\S')
+_CUT_OFF_RE = re.compile(r'[,;(–-]$')               # a prose line ending in an open clause stopped mid-sentence
+_LIST_ITEM_RE = re.compile(r'^([-*•+|]|\d+[.)])')
+
+class FormatIgnored(Exception):
+    # Raised from a streaming callback to abort an answer that ignores the section format (validator.collapsed).
+    pass
+
+@dataclass
+class StructureIssue:
+    kind: str           # title, drift, unexpected, order, duplicate, missing, empty, truncated, format
+    header: str         # the canonical header concerned; "" for the title and the document as a whole
+    detail: str
+    offset: int = None  # character offset in the text, where there is one
+
+    @property
+    def needs_model(self):
+        # Issues the model has to write new text for; everything else is fixed by normalized().
+        return self.kind in ("missing", "empty", "truncated", "format")
+
+    def __str__(self): return f"{self.header or 'Proposal'}: {self.detail}"
+
+class ProposalValidator:
+    # feed() streamed text (whole text so far or successive chunks, see feed_text), then finish(). `sections` are
+    # proposal.ProposalSection objects, normally split_prompt_sections(prompt). on_issue(issue) fires as each is found.
+
+    def __init__(self, sections, on_issue=None, grace_chars=FORMAT_GRACE_CHARS):
+        self.sections, self.on_issue, self.grace_chars = list(sections), on_issue, grace_chars
+        self._order = {section.header: i for i, section in enumerate(self.sections)}
+        self.issues = []
+        self.title = None
+        self.occurrences = []           # (canonical header, offset of the header line, length of that line), in order
+        self.collapsed = False          # no recognisable header within grace_chars: the format was ignored
+        self.finished = False
+        self._tail, self._position, self._fed = "", 0, 0
+        self._next = 0                  # index into sections of the next header expected
+        self._body_chars = 0            # non-blank characters in the current section (or after the title)
+        self._seen = set()
+        self._last_line = ""
+
+    # -- feeding --
+
+    def feed(self, chunk):
+        # Returns the issues found in this chunk.
+        found = len(self.issues)
+        self._fed += len(chunk)
+        text = self._tail + chunk
+        head, newline, self._tail = text.rpartition("\n")
+        if newline:
+            for line in (head + "\n").splitlines(keepends=True): self._line(line)
+        return self.issues[found:]
+
+    def feed_text(self, text_so_far):
+        # For on_delta-style callbacks, which pass the whole text so far: only the new tail is examined.
+        return self.feed(text_so_far[self._fed:])
+
+    def finish(self, finish_reason=None):
+        # finish_reason is OpenAI's ("length" means max_tokens cut the answer off) when it is known; only without it
+        # (a cached answer, say) is the last line checked for an unterminated clause.
+        found = len(self.issues)
+        if self._tail: self._line(self._tail); self._tail = ""
+        self._close_section()
+        for section in self.sections[self._next:]:
+            if section.header not in self._seen: self._issue("missing", section.header, "section is missing")
+        last = self.occurrences[-1][0] if self.occurrences else ""
+        if finish_reason == "length":
+            self._issue("truncated", last, "the answer was cut off at the token limit", self._position)
+        elif finish_reason is None and self.occurrences and _CUT_OFF_RE.search(self._last_line) and not _LIST_ITEM_RE.match(self._last_line):
+            self._issue("truncated", last, "the text stops mid-sentence", self._position)
+        if self.title is None: self._issue("format", "", "the answer is empty")
+        self.finished = True
+        return self.issues[found:]
+
+    def _line(self, line):
+        start = self._position
+        self._position += len(line)
+        stripped = line.strip()
+        if not stripped: return
+        self._last_line = stripped
+        if self.title is None:
+            if not (stripped in self._order or canonical_header(stripped, self.sections)):
+                self.title = stripped
+                if stripped.startswith('#'): self._issue("title", "", "the title line carries Markdown '#'", start)
+                return
+            # The answer starts with a section: no title line, and this line is the first header.
+            self.title = ""
+            self._issue("title", "", "the answer has no title line", start)
+        header = None
+        if len(stripped) <= MAX_HEADER_CHARS:
+            header = stripped if stripped in self._order else canonical_header(stripped, self.sections)
+            if header is None and _MARKDOWN_HEADER_RE.match(stripped):
+                self._issue("unexpected", stripped, "header is not one of the proposal's sections", start)
+        if header is None:
+            self._body_chars += len(stripped)
+            if not self.occurrences and not self.collapsed and self._body_chars > self.grace_chars:
+                self.collapsed = True
+                self._issue("format", "", f"no section header in the first {self.grace_chars} characters", start)
+            return
+        self._close_section(next_header=header)
+        if stripped != header:
+            self._issue("drift", header, f"header written as '{stripped[:60]}'", start)
+        if header in self._seen:
+            self._issue("duplicate", header, "section appears more than once", start)
+        else:
+            index = self._order[header]
+            if index < self._next:
+                self._issue("order", header, "section is out of order", start)
+            for skipped in self.sections[self._next:index]:
+                if skipped.header not in self._seen: self._issue("missing", skipped.header, "section was skipped", start)
+            self._next = max(self._next, index + 1)
+            self._seen.add(header)
+        self.occurrences.append((header, start, len(line)))
+        self._body_chars = 0
+
+    def _close_section(self, next_header=None):
+        # A section with no text of its own is only a problem when no sub-section follows it.
+        if not self.occurrences or self._body_chars: return
+        header = self.occurrences[-1][0]
+        level = self.sections[self._order[header]].level
+        if next_header is None or self.sections[self._order[next_header]].level <= level:
+            self._issue("empty", header, "section has no text", self.occurrences[-1][1])
+
+    def _issue(self, kind, header, detail, offset=None):
+        issue = StructureIssue(kind, header, detail, offset)
+        self.issues.append(issue)
+        if self.on_issue: self.on_issue(issue)
+
+    # -- results --
+
+    @property
+    def problems(self):
+        # Headers outside the prompt's sections (a "### Phase 1" inside a section, say) are reported but harmless.
+        return [issue for issue in self.issues if issue.kind != "unexpected"]
+
+    @property
+    def ok(self): return not self.problems
+
+    def failed_headers(self):
+        # Sections that need new text from the model, in canonical order.
+        failed = {issue.header for issue in self.issues if issue.needs_model and issue.header}
+        return [section.header for section in self.sections if section.header in failed]
+
+    def normalized(self, text, title=None):
+        # Rebuilds the text with canonical headers, sections in prompt order and the first copy of each duplicate.
+        # Sections that failed_headers() lists are left out; the caller writes them afresh (see insert_sections).
+        # title is used when the answer had no title line of its own.
+        title = (self.title or "").lstrip('#').strip() or title or "Untitled Campaign"
+        first = self.occurrences[0][1] if self.occurrences else len(text)
+        preamble = text[:first].strip().split("\n", 1)[1].strip() if "\n" in text[:first].strip() else ""
+        bodies = {}
+        for i, (header, start, length) in enumerate(self.occurrences):
+            end = self.occurrences[i + 1][1] if i + 1 < len(self.occurrences) else len(text)
+            bodies.setdefault(header, text[start + length:end].strip())
+        failed = set(self.failed_headers())
+        parts = [title] + ([preamble] if preamble else [])
+        parts += [f"{header}\n{bodies[header]}".strip() for header in self._order if header in bodies and header not in failed]
+        return "\n\n".join(parts) + "\n"
+
+def validate_proposal(text, sections, finish_reason=None):
+    validator = ProposalValidator(sections)
+    validator.feed(text); validator.finish(finish_reason)
+    return validator
+
+def insert_sections(text, sections, written):
+    # Splices {header: section text} into a normalized proposal at each section's place in prompt order.
+    order = {section.header: i for i, section in enumerate(sections)}
+    lines = text.split("\n")
+    for header, section_text in sorted(written.items(), key=lambda item: order[item[0]]):
+        position = len(lines)
+        for i, line in enumerate(lines):
+            if line in order and order[line] > order[header]: position = i; break
+        block = section_text.strip().split("\n") + [""]
+        if position and lines[position - 1].strip(): block = [""] + block
+        lines[position:position] = block
+    return "\n".join(lines).rstrip("\n") + "\n"
@@ -1,126 +1,61 @@
 import streamlit as st
-from openai import OpenAI
-import re
+import time
+import uuid
 from datetime import datetime
-from jinja2 import Environment, FileSystemLoader
-import pdfkit
-import base64
+from campaignr.prompts import DEFAULT_PROPOSAL_PROMPT, DEFAULT_IMAGE_PROMPT
+from campaignr.proposal import split_prompt_sections, parse_text_for_html
+from campaignr import engine
+from campaignr.cache import get_response_cache
+from campaignr.scheduler import session_scope
+from campaignr.clients import get_client, client_stats
+from campaignr.render import render_report_html, render_report_pdf
+from campaignr.jobs import JobLimitReached, get_job_runner, submit_campaign
+from campaignr.artifacts import get_artifact_store, store_cover
+from campaignr.tracing import stage_summary, trace_scope
+from campaignr.budget import get_token_budget
+from campaignr.archive import get_archive
+from campaignr.similar import find_similar
+from campaignr.images import make_cover_image
 
 # --- App Configuration ---
 st.set_page_config(page_title="campAIgnR 🚀", page_icon="🎯", layout="wide")
 
 
-# --- MASTER PROMPT ---
-# This is the final, most detailed prompt, engineered to produce a substantive, elaborate, and professional proposal in a single pass.
-DEFAULT_PROPOSAL_PROMPT = """
-You are a top-tier public communication campaign strategist with a Ph.D. in health communication. Your task is to write a complete, detailed, and comprehensive campaign proposal draft based on the user's concept. The final document should be professional, substantive, and suitable for a grant application or strategic review.
-
-**Campaign Concept:**
-- **Issue:** {communication_issue}
-- **Need and Audience:** {need_and_audience}
-- **Main Goal:** {main_goal}
-
-**CRITICAL INSTRUCTIONS:**
-1.  **Structure and Formatting:**
-    - The very first line of your response must be the campaign's main title. Do not use Markdown like '#' for the main title.
-    - Every subsequent main section MUST start with a `##` Markdown header (e.g., `## Introduction`).
-    - Sub-sections within "Formative Research" must start with a `###` header (e.g., `### Situation Analysis`).
-    - Do not include any conversational text, preambles, or postscripts. Your output must be ONLY the proposal itself.
-
-2.  **Depth and Length:**
-    - This is the most important instruction. Each section must be **thoroughly elaborated**. Do not write short, bullet-point summaries.
-    - Develop a coherent, written argument for each section, aiming for a substantial length of **at least 500-700 words per main section**.
-    - The goal is a document of several pages, not a brief outline.
-
----
-**SECTION-SPECIFIC GUIDANCE (Follow these closely):**
-
-**## Introduction**
-Frame the problem with compelling background statistics from reputable sources (e.g., CDC, NIH). Articulate the campaign's core purpose and why it is urgently needed. This should serve as a powerful mission statement and executive summary, setting a professional and evidence-based tone for the entire document.
-
-**## Goals**
-Specify 3-5 distinct campaign goals using the SMART framework (Specific, Measurable, Attainable, Relevant, Time-bound). Number each goal. Clearly differentiate between awareness goals (e.g., "Increase knowledge of X by 20%"), attitude/belief goals (e.g., "Reduce perceived peer approval of Y by 15%"), and behavioral goals (e.g., "Achieve a 10% reduction in self-reported Z behavior"). For each goal, define the specific metric and the timeline (e.g., "as measured by pre- and post-campaign surveys over a six-month period").
-
-**## Formative Research**
-This section must contain the following three sub-sections, each fully developed.
-
-**### Situation Analysis**
-Provide a deep analysis of the problem's causal web. Discuss the social, cultural, economic, and psychological factors contributing to the issue. Cite relevant research to support your analysis. Conclude by identifying the most malleable factors that the campaign can realistically target.
-
-**### Audience Analysis**
-Develop a detailed profile of the primary audience. Go beyond demographics to discuss psychographics: their values, beliefs, media consumption habits (be specific: which platforms, who do they follow?), and key barriers or motivators for change. Identify and describe important secondary audiences (e.g., parents, university staff) and their potential role.
-
-**### Analysis of Previous Communication Efforts**
-Analyze at least two real, well-known campaigns that have addressed similar health issues. For each, critically evaluate its theoretical basis, messaging strategy, successes, and failures, citing published evaluations if possible. Conclude with a summary of actionable lessons that will inform this new campaign's design.
-
-**## Theory and Messages**
-Select a primary socio-behavioral theory (e.g., Health Belief Model, Theory of Planned Behavior, Social Norms Approach). Justify why this theory is the best fit for this specific problem and audience. Then, based on the theory's core constructs, outline the key message strategies. Provide 3-4 detailed examples of message concepts that a creative team could develop into full ads.
-
-**## Exposure and Channels**
-Propose a strategic, multi-channel media plan with a clear timeline. Detail a phased rollout: Phase 1 (Awareness/Teaser), Phase 2 (Main Engagement/Education), Phase 3 (Reinforcement/Call-to-Action). For each phase, specify the channels (e.g., targeted social media ads, on-campus events, influencer collaborations) and the specific type of content to be deployed on each.
-
-**## Evaluation**
-Design a comprehensive evaluation plan that directly links back to the stated goals. Distinguish clearly between **Process Evaluation** (monitoring campaign implementation, reach, engagement, and fidelity) and **Outcome Evaluation** (measuring the achievement of the SMART goals). Describe the methodology in detail, including specific survey instruments, digital analytics to track, and qualitative methods like focus groups. Crucially, explain the research design, including the need for a **baseline measurement** and the use of a **control group** or quasi-experimental design to help establish the campaign's causal impact, explaining that this is necessary to rule out other societal trends.
-
-**## Summary and Outlook**
-Write a powerful, concluding statement that summarizes the strategic approach and reiterates the campaign's potential for meaningful, lasting change.
-
-**## Appendix**
-Briefly list and describe the types of materials that would be included in a full proposal appendix (e.g., "1. Detailed Timeline (Gantt Chart): A visual project plan...", "2. Creative Briefs: Detailed guides for the creative team...", "3. Detailed Budget Breakdown...", "4. Sample Survey Instruments...").
-
----
-Begin the proposal now.
-"""
-
-DEFAULT_IMAGE_PROMPT = """
-A cover image for a public health campaign titled: "{campaign_title}".
-Atmospheric, themed to a university campus milieu (Michigan State University, green and white colors, a subtle Spartan helmet motif).
-The style should hint at a hard-boiled detective genre but with a quirky, positive spirit.
-The outer edges of the image are blurred and in shadow, focusing the viewer on the center.
-"""
-
 # --- Helper Functions ---
-def get_openai_client(api_key): return OpenAI(api_key=api_key)
-
-def generate_text(client, prompt_text):
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt_text}]
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        st.error(f"An error occurred with the OpenAI API: {e}"); return None
-
-def generate_image(client, prompt_text):
-    try:
-        response = client.images.generate(
-            model="dall-e-3", prompt=prompt_text, size="1024x1024",
-            quality="standard", n=1, response_format="b64_json"
-        )
-        return response.data[0].b64_json
-    except Exception as e:
-        st.error(f"An error occurred with DALL-E: {e}"); return None
-
-def extract_title_from_text(text):
-    lines = text.splitlines()
-    return lines[0].strip().replace("#", "") if lines else "Untitled Campaign"
-
-def parse_text_for_html(text):
-    sections = []
-    # Split the text by '## ' and '### ' headers
-    parts = re.split(r'\n(## |### )', '\n' + text)
-    if len(parts) > 1:
-        for i in range(1, len(parts), 2):
-            header_marker = parts[i]
-            content_block = parts[i+1]
-            block_lines = content_block.splitlines()
-            header_text = header_marker + block_lines[0]
-            content = '\n'.join(block_lines[1:]).strip()
-            sections.append((header_text, content))
-    return sections
+def get_openai_client(api_key): return get_client(api_key)
+
+RESULT_KEYS = ('final_text_output', 'campaign_title', 'cover_image', 'generation_stats', 'archive_id', 'result_concept')
+
+def open_archived_campaign(campaign_id):
+    # Button callback: shows a past campaign from the archive as if it had just been generated.
+    archive = get_archive(); campaign = archive.get(campaign_id)
+    text = archive.text(campaign) if campaign else None
+    if text is None:
+        st.session_state.job_message = ('warning', "Only the PDF of this campaign was archived; there is no text to open."); return
+    for key in RESULT_KEYS: st.session_state.pop(key, None)
+    store = get_artifact_store()
+    st.session_state.final_text_output = store.put(text, st.session_state.session_id)
+    st.session_state.campaign_title, st.session_state.archive_id = campaign.title, campaign.id
+    st.session_state.result_concept = campaign.concept
+    cover = archive.cover(campaign)
+    if cover: st.session_state.cover_image = store_cover(make_cover_image(cover), st.session_state.session_id)
+
+def format_stream_stats(stats):
+    if stats.get('cached'): return f"served from the response cache in {stats['total_s'] * 1000:.0f} ms"
+    parts = []
+    if stats.get('ttft_s') is not None: parts.append(f"first token after {stats['ttft_s']:.1f} s")
+    if stats.get('tokens_per_s'): parts.append(f"{stats['tokens_per_s']:.0f} tokens/s")
+    parts.append(f"{stats['completion_tokens']} {stats.get('unit', 'tokens')} in {stats['total_s']:.0f} s")
+    if stats.get('cached_tokens'): parts.append(f"{stats['cached_tokens']} of {stats['prompt_tokens']} prompt tokens from OpenAI's prompt cache")
+    return " · ".join(parts)
 
 # --- Streamlit UI ---
+st.session_state.setdefault('session_id', uuid.uuid4().hex)  # identifies this browser session to the request scheduler
+if 'job_id' not in st.session_state and st.query_params.get("job"):
+    # A reload or a new tab on a job link: follow that job, as the session that started it.
+    adopted = get_job_runner().get(st.query_params["job"])
+    if adopted: st.session_state.job_id, st.session_state.session_id = adopted.id, adopted.owner
+    else: st.query_params.pop("job", None)
 st.title("🚀 campAIgnR: Proposal Draft Assistant")
 
 with st.sidebar:
@@ -131,6 +66,41 @@ with st.sidebar:
     with st.expander("Advanced: Edit Prompts"):
         st.text_area("Main Proposal Prompt", value=DEFAULT_PROPOSAL_PROMPT, height=300, key="prompt_main")
         st.text_area("Cover Image Prompt", value=DEFAULT_IMAGE_PROMPT, height=150, key="prompt_image")
+    st.toggle("⚡ Stream proposal text as it is written", value=True, key="stream_input")
+    st.radio("🧩 Generation mode:", ["Single pass", "Parallel sections"], key="mode_input", horizontal=True,
+        help="Parallel sections drafts a short shared outline first, then writes every section at the same time. "
+             "Much faster, but sections are written by separate requests.")
+    st.checkbox("♻️ Reuse cached responses for identical requests", value=True, key="cache_input",
+        help="Untick to always call OpenAI again, e.g. to get a fresh draft for the same concept.")
+    cache_stats = get_response_cache().stats()
+    st.caption(f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses · "
+               f"{cache_stats['entries']} entries, {cache_stats['bytes'] / 1e6:.1f} MB")
+    http_stats = client_stats()
+    st.caption(f"API connections: {http_stats['requests']} requests over {http_stats['connections']} connections "
+               f"({http_stats['reuse_rate']:.0%} reused{', HTTP/2' if http_stats['http2'] else ''})")
+    storage = get_artifact_store().stats()
+    st.caption(f"Session storage: {get_artifact_store().session_bytes(st.session_state.session_id) / 1e6:.1f} MB this session · "
+               f"{storage['memory_bytes'] / 1e6:.0f} of {storage['memory_limit'] / 1e6:.0f} MB in memory, "
+               f"{storage['disk_bytes'] / 1e6:.0f} MB on disk for {storage['sessions']} sessions"
+               + (f" · server RSS {storage['rss_bytes'] / 1e6:.0f} MB" if storage['rss_bytes'] else ""))
+    with st.expander("🗂️ Past campaigns"):
+        query = st.text_input("Search the archive", key="archive_query_input", placeholder="e.g. vaccine students")
+        results = get_archive().search(query, limit=10)
+        for campaign_id, title, created, snippet in results:
+            st.button(f"{title} ({datetime.fromtimestamp(created):%Y-%m-%d})", key=f"archive_open_{campaign_id}",
+                      on_click=open_archived_campaign, args=(campaign_id,), use_container_width=True)
+            if snippet: st.caption(" ".join(snippet.split()))
+        if not results: st.caption("No matching campaigns." if query else "Nothing archived yet.")
+    with st.expander("⏱️ Stage timings (this server)"):
+        summary = stage_summary()
+        if summary:
+            st.dataframe([{'stage': name, 'n': s['count'], 'p50 s': round(s['p50_s'], 3), 'p95 s': round(s['p95_s'], 3),
+                           'p99 s': round(s['p99_s'], 3), 'tok/s': round(s['tokens_per_s']) if s['tokens_per_s'] else None,
+                           'cache': f"{s['cache_hit_rate']:.0%}" if s['cache_hit_rate'] is not None else None,
+                           'prefix': f"{s['cached_token_rate']:.0%}" if s['cached_token_rate'] is not None else None,
+                           'USD': round(s['cost_usd'], 3)} for name, s in summary.items()],
+                         hide_index=True, use_container_width=True)
+        else: st.caption("No stages recorded yet.")
     st.caption("A tool for rapid campaign prototyping.")
 
 st.info(
@@ -147,73 +117,178 @@ with col2:
     need_and_audience = st.text_area("2. The Need and Intended Audience:", height=150, placeholder="e.g., College students (18-24) often misperceive peer drinking norms...", key="audience_input")
 main_goal = st.text_area("3. The Main Campaign Goal:", height=100, placeholder="e.g., To correct misperceptions of drinking norms and reduce high-risk drinking behaviors...", key="goal_input")
 
+# Pre-flight estimate for the current concept and settings; counted locally, nothing is sent.
+if all([communication_issue, need_and_audience, main_goal]):
+    concept = {'communication_issue': communication_issue, 'need_and_audience': need_and_audience, 'main_goal': main_goal}
+    # A near-identical concept was drafted before: offer that draft before spending anything on a new one. Not for
+    # the concept behind the draft already shown, and never the shown draft itself (the job has just archived it).
+    similar = None
+    if 'final_text_output' not in st.session_state or concept != st.session_state.get('result_concept'):
+        similar = find_similar(concept, limit=1, exclude=(st.session_state.get('archive_id'),))
+    if similar:
+        similar_id, similar_title, similarity = similar[0]
+        st.info(f"💡 A similar concept has been drafted before: **{similar_title}** ({similarity:.0%} overlap). "
+                "You can open that draft instantly instead of generating a new one.")
+        st.button("📂 Open the existing draft", key="open_similar_button", on_click=open_archived_campaign, args=(similar_id,))
+    try:
+        estimate = engine.estimate_campaign(concept, st.session_state.prompt_main,
+            parallel_sections=st.session_state.mode_input == "Parallel sections", stream=st.session_state.stream_input)
+    except (KeyError, IndexError, ValueError): estimate = None  # an edited prompt with stray {braces}; reported on Generate
+    if estimate:
+        budget = get_token_budget(); remaining = budget.remaining(st.session_state.session_id)
+        st.caption(f"🧮 Estimate: ~{estimate.prompt_tokens:,} prompt + ~{estimate.completion_tokens:,} completion tokens "
+                   f"in {len(estimate.requests)} requests · ~${estimate.cost_usd:.2f} · ~{estimate.latency_s:.0f} s "
+                   f"(upper bound; cached responses are free)"
+                   + (f" · session budget left: {remaining:,} of {budget.session_limit:,} tokens" if remaining is not None else ""))
+        if remaining is not None and estimate.prompt_tokens + estimate.completion_tokens > remaining:
+            st.warning("This run may not fit in what is left of this session's token budget; it stops at the first request that does not.")
+
 if st.button("🎨 Generate Campaign Components", use_container_width=True):
     for key in list(st.session_state.keys()):
-        if key not in ['api_key_input', 'author_input', 'issue_input', 'audience_input', 'goal_input', 'prompt_main', 'prompt_image']:
+        if key not in ['api_key_input', 'author_input', 'issue_input', 'audience_input', 'goal_input', 'prompt_main', 'prompt_image', 'stream_input', 'mode_input', 'cache_input', 'session_id', 'job_id', 'archive_query_input']:
             st.session_state.pop(key)
             
     if not all([st.session_state.api_key_input, st.session_state.author_input, st.session_state.issue_input, st.session_state.audience_input, st.session_state.goal_input]):
         st.error("Please fill out all fields, including your API Key and Name in the sidebar.")
     else:
-        client = get_openai_client(st.session_state.api_key_input)
-        with st.spinner("Generating full, detailed proposal and cover image... This may take several minutes."):
-            full_prompt = st.session_state.prompt_main.format(
-                communication_issue=st.session_state.issue_input,
-                need_and_audience=st.session_state.audience_input,
-                main_goal=st.session_state.goal_input
-            )
-            proposal_text = generate_text(client, full_prompt)
-            if not proposal_text:
-                st.error("Failed to generate proposal text. The AI may have returned an empty response. Please try again."); st.stop()
-            st.session_state.final_text_output = proposal_text
-            
-            campaign_title = extract_title_from_text(proposal_text)
-            st.session_state.campaign_title = campaign_title
-            
-            image_prompt = st.session_state.prompt_image.format(campaign_title=campaign_title)
-            image_b64 = generate_image(client, image_prompt)
-            if image_b64: st.session_state.cover_image_b64 = image_b64
-        
-        st.success("✅ Campaign components generated successfully!")
+        concept = {'communication_issue': st.session_state.issue_input,
+            'need_and_audience': st.session_state.audience_input, 'main_goal': st.session_state.goal_input}
+        parallel = st.session_state.mode_input == "Parallel sections"
+        if parallel and not split_prompt_sections(st.session_state.prompt_main):
+            parallel = False
+            st.info("The edited proposal prompt has no `**## Section**` guidance blocks, so it is generated in a single pass.")
+        get_artifact_store().release(st.session_state.session_id)  # the previous draft was just discarded
+        # The run happens on the server's job pool; this script only submits it and polls (see show_job below).
+        try:
+            job = submit_campaign(st.session_state.session_id, get_openai_client(st.session_state.api_key_input), concept,
+                st.session_state.prompt_main, st.session_state.prompt_image, parallel_sections=parallel,
+                stream=st.session_state.stream_input, use_cache=st.session_state.cache_input, author=st.session_state.author_input)
+            st.session_state.job_id = job.id
+            st.query_params["job"] = job.id  # reopening this link picks the job back up after a disconnect
+        except JobLimitReached as e:
+            st.error(str(e))
+
+@st.fragment(run_every=1.0)
+def show_job(job_id):
+    job = get_job_runner().get(job_id)
+    if job is not None and job.active:
+        elapsed = time.time() - (job.started or job.created)
+        st.info(f"⏳ Generating full, detailed proposal and cover image... ({job.status}, {elapsed:.0f} s) "
+                "This may take several minutes; you can close this tab and come back to this page's link.")
+        progress = job.progress
+        if progress.get('sections'): st.caption("✔️ " + " · ".join(progress['sections']))
+        if progress.get('issues'): st.caption("🩹 To be repaired: " + " · ".join(progress['issues'][-5:]))
+        if progress.get('text') and (job.params.get('stream') or job.params.get('parallel_sections')):
+            live_tab, = st.tabs(["📜 **Full Proposal Text**"])
+            with live_tab: st.markdown(progress['text'])
+        if st.button("✖️ Cancel generation", use_container_width=True):
+            get_job_runner().cancel(job_id)
+        return
+    st.session_state.pop('job_id', None); st.query_params.pop("job", None)
+    if job is None:
+        st.session_state.job_message = ('warning', "This generation is no longer available; please generate again.")
+    elif job.status == "done":
+        campaign = job.result
+        # Session state only keeps handles; the text and the cover variants go to the artifact store.
+        store = get_artifact_store()
+        st.session_state.final_text_output = store.put(campaign.text, st.session_state.session_id)
+        st.session_state.campaign_title, st.session_state.archive_id = campaign.title, job.archive_id
+        st.session_state.result_concept = job.params.get('concept')
+        if campaign.cover: st.session_state.cover_image = store_cover(campaign.cover, st.session_state.session_id)
+        if campaign.stats: st.session_state.generation_stats = campaign.stats
+        st.session_state.generation_warnings = list(campaign.warnings or [])
+        if campaign.cover_error: st.session_state.generation_warnings.append(f"An error occurred with DALL-E: {campaign.cover_error}")
+        st.session_state.just_generated = True
+    elif job.status == "cancelled":
+        st.session_state.job_message = ('info', "Generation cancelled.")
+    else:
+        st.session_state.job_message = ('error', f"Failed to generate the proposal: {job.error}")
+    if job is not None: get_job_runner().forget(job_id)  # results stay on disk; a later get() reloads them
+    st.rerun()  # show the finished tabs
+
+if 'job_id' in st.session_state:
+    show_job(st.session_state.job_id)
+
+if 'job_message' in st.session_state:
+    kind, message = st.session_state.pop('job_message')
+    getattr(st, kind)(message)
+if st.session_state.pop('just_generated', False):
+    st.success("✅ Campaign components generated successfully!")
+    for warning in st.session_state.pop('generation_warnings', []): st.warning(warning)
+if 'just_regenerated' in st.session_state:
+    st.success(f"✅ Rewrote \"{st.session_state.pop('just_regenerated')}\"; the rest of the proposal and the cover are unchanged.")
 
 # --- Display Results ---
-if 'final_text_output' in st.session_state:
+# A draft whose payload was evicted from the artifact store (disk cap reached) cannot be shown any more.
+proposal_text = st.session_state.final_text_output.text() if 'final_text_output' in st.session_state else None
+if 'final_text_output' in st.session_state and proposal_text is None:
+    for key in RESULT_KEYS: st.session_state.pop(key, None)
+    st.warning("This draft was removed from server storage to free space; please generate it again.")
+if 'cover_image' in st.session_state and not st.session_state.cover_image.exists():
+    st.session_state.pop('cover_image')
+
+if proposal_text is not None:
     st.markdown("---"); st.header(f"Campaign: {st.session_state.get('campaign_title', 'Untitled')}")
     
     tab1, tab2, tab3 = st.tabs(["📜 **Full Proposal Text**", "🖼️ **Cover Image**", "📄 **Formatted Report (Optional)**"])
     
     with tab1:
-        st.subheader("Raw Proposal Text"); st.text_area(
+        st.subheader("Raw Proposal Text")
+        if 'generation_stats' in st.session_state:
+            st.caption(f"⚡ Generated: {format_stream_stats(st.session_state.generation_stats)}")
+        st.text_area(
             "This is the complete raw text for your proposal. Copy it or use the download button.", 
-            value=st.session_state.final_text_output, height=500
+            value=proposal_text, height=500
         )
-        st.download_button("⬇️ Download Text File (.txt)", st.session_state.final_text_output.encode('utf-8'),
+        st.download_button("⬇️ Download Text File (.txt)", st.session_state.final_text_output.read,
             f"{st.session_state.campaign_title}.txt", "text/plain", use_container_width=True)
 
+        # Rewrite one weak section in place instead of regenerating the whole proposal and the cover. The section list
+        # is parsed once per draft (keyed by its artifact), not on every rerun.
+        draft_key = st.session_state.final_text_output.key
+        if st.session_state.get('draft_sections', (None,))[0] != draft_key:
+            st.session_state.draft_sections = (draft_key, parse_text_for_html(proposal_text))
+        sections = st.session_state.draft_sections[1]
+        if sections:
+            with st.expander("🔁 Regenerate a single section"):
+                index = st.selectbox("Section", range(len(sections)), format_func=lambda i: sections[i][0], key="regen_section_input")
+                note = st.text_input("What should change? (optional)", key="regen_note_input")
+                if st.button("Regenerate section", use_container_width=True):
+                    if not st.session_state.api_key_input: st.error("Please enter your OpenAI API Key in the sidebar."); st.stop()
+                    concept = {'communication_issue': st.session_state.issue_input,
+                        'need_and_audience': st.session_state.audience_input, 'main_goal': st.session_state.goal_input}
+                    with st.spinner(f"Rewriting {sections[index][0].lstrip('#').strip()}..."), session_scope(st.session_state.session_id), trace_scope():
+                        try:
+                            rewritten = engine.regenerate_section(get_openai_client(st.session_state.api_key_input),
+                                proposal_text, index, concept, st.session_state.prompt_main, note,
+                                use_cache=st.session_state.cache_input)
+                            st.session_state.final_text_output = get_artifact_store().put(rewritten, st.session_state.session_id)
+                            if st.session_state.get('archive_id'): get_archive().update_text(st.session_state.archive_id, rewritten)
+                            st.session_state.just_regenerated = sections[index][0].lstrip('#').strip()
+                        except Exception as e:
+                            st.error(f"An error occurred with the OpenAI API: {e}"); st.stop()
+                    st.rerun()
+
     with tab2:
         st.subheader("Campaign Cover Image")
-        if 'cover_image_b64' in st.session_state:
-            st.image(f"data:image/png;base64,{st.session_state.cover_image_b64}", caption="AI-generated cover image.")
-            image_bytes = base64.b64decode(st.session_state.cover_image_b64)
-            st.download_button("⬇️ Download Image (.png)", image_bytes,
-                f"{st.session_state.campaign_title}_cover.png", "image/png", use_container_width=True)
+        if 'cover_image' in st.session_state:
+            cover = st.session_state.cover_image
+            st.image(cover.preview, caption="AI-generated cover image.")
+            st.download_button("⬇️ Download Image (.png)", cover.original_artifact.read,
+                f"{st.session_state.campaign_title}_cover.png", cover.original_mime, use_container_width=True)
         else: st.warning("Could not generate an image.")
 
     with tab3:
         st.subheader("Generate Formatted Report")
         st.warning("PDF generation requires `wkhtmltopdf` to be installed on your system.")
         if st.checkbox("Generate styled report from the text above"):
-            with st.spinner("Creating formatted documents..."):
-                sections_for_html = parse_text_for_html(st.session_state.final_text_output)
-                env = Environment(loader=FileSystemLoader("templates"))
-                template = env.get_template("report_template.html")
-                report_data = {
-                    'report_title': st.session_state.campaign_title, 'author_name': f"Directed by {st.session_state.author_input}",
-                    'title_image_b64': st.session_state.get('cover_image_b64'), 'sections': sections_for_html,
-                    'generation_date': datetime.now().strftime('%Y-%m-%d')}
-                html_content = template.render(report_data)
+            with st.spinner("Creating formatted documents..."), session_scope(st.session_state.session_id):
+                cover = st.session_state.get('cover_image')
+                html_content = render_report_html(proposal_text, st.session_state.campaign_title,
+                    f"Directed by {st.session_state.author_input}", cover.report_b64 if cover else None,
+                    image_mime=cover.report_mime if cover else None)
                 
-                try: pdf_content = pdfkit.from_string(html_content, False, options={'enable-local-file-access': None})
+                try: pdf_content = render_report_pdf(html_content)
                 except Exception as e: pdf_content = None; st.error(f"PDF generation failed: {e}", icon="⚠️")
 
                 st.markdown("---"); st.subheader("Downloads")
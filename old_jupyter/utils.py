@@ -1,63 +1,136 @@
-from openai import OpenAI
-import os, requests, warnings, fnmatch, sys, re
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
-from IPython.display import display, Image, Audio
-import numpy as np
+import os, warnings, fnmatch, sys, re, importlib, threading, json, queue
+from collections.abc import Mapping
 warnings.filterwarnings('ignore')
 
-OpenAI.api_key   = os.environ["OPENAI_API_KEY"]
-openai_client	= OpenAI(api_key = OpenAI.api_key) 
-headers		  = {"Content-Type": "application/json","Authorization": f"Bearer {OpenAI.api_key}"}
+# Share the app's rate-limit-aware scheduler (retries, backoff, request/token budgets) with the notebooks.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from campaignr.scheduler import get_scheduler, estimate_tokens
+from campaignr.clients import get_client
+from campaignr.sections import parse_sections
+
+
+# Heavy modules are imported on first use, and OPENAI_API_KEY is read with the first API call, so importing
+# utils (in a notebook, a batch worker or a fresh container) costs milliseconds instead of seconds.
+class _LazyModule:
+	# Stands in for a module until one of its attributes is used, e.g. `np.arange` after `from utils import *`.
+	def __init__(self, name):
+		self._name, self._module = name, None
+
+	def _resolve(self):
+		if self._module is None: self._module = importlib.import_module(self._name)
+		return self._module
+
+	def __getattr__(self, attr):
+		return getattr(self._resolve(), attr)
+
+
+class _LazyObject(_LazyModule):
+	# The same for an object made on first use: `openai_client.chat...` or `OpenAI(api_key=...)`.
+	def __init__(self, load):
+		self._load, self._module = load, None
+
+	def _resolve(self):
+		if self._module is None: self._module = self._load()
+		return self._module
+
+	def __call__(self, *args, **kwargs):
+		return self._resolve()(*args, **kwargs)
+
+
+class _LazyHeaders(Mapping):
+	# `headers`, read-only: a Mapping, so `requests.post(url, headers=headers)` merges it like the dict it used to be.
+	def __getitem__(self, key): return _api()['headers'][key]
+	def __iter__(self): return iter(_api()['headers'])
+	def __len__(self): return len(_api()['headers'])
+
+requests	= _LazyModule("requests")
+np			= _LazyModule("numpy")
+plt			= _LazyModule("matplotlib.pyplot")
+mpimg		= _LazyModule("matplotlib.image")
+_IPYTHON_NAMES = ("display", "Image", "Audio")
+if "IPython" in sys.modules:
+	# Inside a notebook IPython is loaded already: bind the real objects, so `from utils import *` exports them.
+	from IPython.display import display, Image, Audio
+
 gpt_model		= "gpt-4o-mini"
+_connections	= {}
+_connections_lock = threading.Lock()
+# Module attributes (not module __getattr__), so `from utils import *` still exports them to the notebooks.
+OpenAI			= _LazyObject(lambda: importlib.import_module("openai").OpenAI)
+openai_client	= _LazyObject(lambda: _api()['openai_client'])
+http_session	= _LazyObject(lambda: _api()['http_session'])
+headers			= _LazyHeaders()
+
+
+def _api():
+	# openai_client, http_session and headers, created together on the first call that needs them.
+	with _connections_lock:
+		if not _connections:
+			api_key = os.environ["OPENAI_API_KEY"]
+			_connections['chat_url'] = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/") + "/chat/completions"
+			# One keep-alive session for the raw HTTP calls, so repeated calls reuse the TLS connection.
+			http_session = requests.Session()
+			http_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16))
+			_connections.update(openai_client=get_client(api_key), http_session=http_session,
+								headers={"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"})
+		return _connections
+
+
+def __getattr__(name):
+	# Outside a notebook IPython.display's display, Image and Audio are imported on first access (utils.Image is the real class).
+	if name in _IPYTHON_NAMES: return getattr(importlib.import_module("IPython.display"), name)
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def post_chat_completion(payload, prompt_text):
+	# Raises requests.HTTPError for error statuses so the scheduler can retry 429s and 5xx with backoff.
+	def send():
+		api = _api()
+		response = api['http_session'].post(api['chat_url'], headers=api['headers'], json=payload, timeout=600)
+		response.raise_for_status()
+		return response
+	response = get_scheduler(payload["model"]).call(send, tokens=estimate_tokens(prompt_text))
+	choices = response.json().get('choices')
+	if not choices:
+		raise RuntimeError("OpenAI returned no choices: " + response.text[:500])
+	return choices[0]['message']['content']
 
 
 def generate_simple(input_prompt):
 	payload = {"model": gpt_model, "messages": [{ "role": "user", "content": [ { "type": "text",
 		"text": input_prompt  },]}],}
 	
-	response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-	
-	complex_response	= response.json()['choices'][0]['message']['content']
+	complex_response	= post_chat_completion(payload, input_prompt)
 	return complex_response
 
 
+def stream_simple(input_prompt):
+	# generate_simple, streamed: yields the answer's text piece by piece as the server sends it.
+	payload = {"model": gpt_model, "stream": True, "messages": [{ "role": "user", "content": [ { "type": "text",
+		"text": input_prompt  },]}],}
+	def send():
+		api = _api()
+		response = api['http_session'].post(api['chat_url'], headers=api['headers'], json=payload, stream=True, timeout=600)
+		response.raise_for_status()
+		return response
+	response = get_scheduler(gpt_model).call(send, tokens=estimate_tokens(input_prompt))
+	with response:
+		for line in response.iter_lines(decode_unicode=True):
+			if not line or not line.startswith("data: "): continue
+			if line == "data: [DONE]": break
+			choices = json.loads(line[6:]).get('choices')
+			if choices and choices[0].get('delta', {}).get('content'):
+				yield choices[0]['delta']['content']
+
+
 def split_text_into_sections(text):
-	# Regex pattern to match markers like {{0. ...}}, {{1. ...}}, etc.
-	pattern = r'(\{\{\d+[^}]*\}\})'
-	
-	# Split the text based on the pattern, keeping the markers as separate elements
-	sections = re.split(pattern, text)
-	
-	# List to store the structured content
-	structured_sections = []
-	current_section = ''
-
-	for part in sections:
-		# Check if the part matches the section marker
-		if re.match(pattern, part):
-			# If there's already content in current_section, add it to structured_sections
-			if current_section:
-				structured_sections.append(current_section.strip())
-			# Start a new section with the current marker
-			current_section = part
-		else:
-			# Append the text to the current section
-			current_section += " " + part.strip()
-	
-	# Add the last section if there's any leftover content
-	if current_section:
-		structured_sections.append(current_section.strip())
-	
-	# Remove any empty items from the beginning of the list
-	structured_sections = [section for section in structured_sections if section]
-	
-	return structured_sections
+	# Markers like {{0. ...}}, {{1. ...}}, {{3.1 ...}}; the preamble comes first, then one "{{marker}} text" per section
+	return parse_sections(text, dialects=("legacy",)).marked()
 
 
 
-def generate_campaign_concept(n_ideas):
-	concept_prompt	= "You are a campaign planner and organizer for a public communication campaign about health." +\
+def _concept_prompt(n_ideas):
+	return "You are a campaign planner and organizer for a public communication campaign about health." +\
 								  "You generate " + str(n_ideas) + " concept ideas for much-needed campaigns. " +\
 								  """You are free to pick the topic - whether it is 
 								  alcohol, drug use, accident prevention, etc -- that is up to you. 
@@ -73,15 +146,17 @@ def generate_campaign_concept(n_ideas):
                                   {{2. Issue: ... Need: ... Goal: ... }}
                                   ... You don't use fluffy language that is just Kumbaya, but you are factful, concise, and confident.
 								  """
-	campaign_ideas = generate_simple(concept_prompt)
+
+
+def generate_campaign_concept(n_ideas):
+	campaign_ideas = generate_simple(_concept_prompt(n_ideas))
 	campaign_ideas = split_text_into_sections(campaign_ideas)
 	
 	return campaign_ideas
 
 
-def generate_basic_campaign_plan(input_campaign_concept):
-
-		campaign_planning_prompt  = "You are a campaign planner and organizer for a public communication campaign about health. Here is a description of the campaign concept: "+\
+def _plan_prompt(input_campaign_concept):
+		return "You are a campaign planner and organizer for a public communication campaign about health. Here is a description of the campaign concept: "+\
 								"-->" + input_campaign_concept + "." +\
 								""" Your job now is to draft a first sketch of the campaign plan/proposal. 
 								The structure and format for this is fixed and includes these numbered sections, which are to be formatted exactly as follows :
@@ -145,13 +220,16 @@ def generate_basic_campaign_plan(input_campaign_concept):
 								Otherwise, you just write text in plain text without further breaks or additional symbols or comments. 
 								Only the separations between titles or subtitles have single breaks.
 								Thus, you only return larger sections for {{0. Title}}, {{1. Introduction}}, {{2 ...}}, {{3.1 ...}}, {{3.2 ...}}. . Just those large chunks. """
-		
-		basic_campaign_plan = generate_simple(campaign_planning_prompt)
+
+
+def generate_basic_campaign_plan(input_campaign_concept):
+		basic_campaign_plan = generate_simple(_plan_prompt(input_campaign_concept))
 		basic_campaign_plan = split_text_into_sections(basic_campaign_plan)
 		return basic_campaign_plan
 
 
-def generate_campaign_cover(input_campaign_title):
+def download_campaign_cover(input_campaign_title):
+	# generate_campaign_cover without the plot, so it can run on a worker thread; returns the image path.
 	cover_image_prompt	   = "Generate a prompt for a cover image for a public health campaign titled: " + input_campaign_title + "." +\
 							   "Remove  clutter text, like prompts or # and * , just focus on the description. " +\
 							   "Make it atmospheric and themed to the milieu it is set in, incorporating color and design elements " +\
@@ -161,12 +239,11 @@ def generate_campaign_cover(input_campaign_title):
 	
 	payload = {"model": gpt_model, "messages": [{ "role": "user", "content": [ { "type": "text",
 			  "text": cover_image_prompt  },]}],}
-	response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-	cover_image_prompt = response.json()['choices'][0]['message']['content']
-	response = openai_client.images.generate(model="dall-e-3",
+	cover_image_prompt = post_chat_completion(payload, cover_image_prompt)
+	response = get_scheduler("dall-e-3").call(lambda: _api()['openai_client'].images.with_raw_response.generate(model="dall-e-3",
 					prompt = cover_image_prompt,
-					size="1024x1024", quality="standard", n=1)
-	image_response = requests.get(response.data[0].url)
+					size="1024x1024", quality="standard", n=1)).parse()
+	image_response = _api()['http_session'].get(response.data[0].url, timeout=120)
 	
 	os.makedirs("./01_output/"+ input_campaign_title, exist_ok=True)
 	image_title = "./01_output/" + input_campaign_title + "/" + input_campaign_title + "_Cover.png"
@@ -174,11 +251,108 @@ def generate_campaign_cover(input_campaign_title):
 		with open(image_title, 'wb') as f:
 			f.write(image_response.content)
 		print("Image downloaded and saved ...")
-	
+	return image_title
+
+
+def generate_campaign_cover(input_campaign_title):
+	image_title = download_campaign_cover(input_campaign_title)
 	# Load and display the Cover
 	img = mpimg.imread(image_title)
 	plt.imshow(img)
 	plt.axis('off')  
 	plt.title(input_campaign_title)
 	plt.show()
-	return image_title
\ No newline at end of file
+	return image_title
+
+# --- Streaming Concept-to-Campaign Pipeline ---
+# generate_campaigns(n) streams the idea list and starts each campaign as soon as its {{n. Issue/Need/Goal}} marker
+# closes, while the later ideas are still being written. Each campaign streams its plan and starts its cover the
+# moment the {{0. Title}} marker has closed, so plan and cover overlap too. At most max_parallel campaigns are in
+# flight; the idea stream waits for a free slot, and finished campaigns wait for the caller to take them, so nothing
+# piles up in memory. n campaigns take about as long as the slowest one (plus the idea list), not the sum of all n.
+_CONCEPT_MARKER_RE = re.compile(r'\{\{\s*\d+\..*?\}\}', re.S)
+_TITLE_MARKER_RE = re.compile(r'\{\{\s*0\.?(.*?)\}\}', re.S)
+
+
+def stream_campaign_concepts(n_ideas):
+	# Yields each "{{n. Issue: ... Need: ... Goal: ...}}" idea the moment its closing braces arrive.
+	pending = ""
+	for text in stream_simple(_concept_prompt(n_ideas)):
+		pending += text
+		match = _CONCEPT_MARKER_RE.search(pending)
+		while match:
+			yield match.group(0)
+			pending = pending[match.end():]
+			match = _CONCEPT_MARKER_RE.search(pending)
+
+
+def campaign_title_from_marker(title_marker):
+	# "{{0. Raise a Glass to Health!}}" -> "Raise a Glass to Health - A campAIgnR project", safe as a folder name.
+	title = re.sub(r'[:?!/\\"*#]', '', title_marker).strip(" .")
+	return title + " - A campAIgnR project"
+
+
+def generate_campaign(input_campaign_concept, cover_pool=None):
+	# One campaign: (concept, basic_campaign_plan, campaign_title, cover_path). The cover starts on cover_pool as
+	# soon as the plan's title is known; without a pool it is downloaded after the plan.
+	plan_text, cover = "", None
+	for text in stream_simple(_plan_prompt(input_campaign_concept)):
+		plan_text += text
+		if cover is None and cover_pool is not None:
+			match = _TITLE_MARKER_RE.search(plan_text)
+			if match:
+				campaign_title = campaign_title_from_marker(match.group(1))
+				cover = cover_pool.submit(download_campaign_cover, campaign_title)
+	if cover is None:
+		match = _TITLE_MARKER_RE.search(plan_text)
+		campaign_title = campaign_title_from_marker(match.group(1) if match else plan_text.strip().split("\n", 1)[0])
+		cover_path = download_campaign_cover(campaign_title)
+	else:
+		cover_path = cover.result()
+	return input_campaign_concept, split_text_into_sections(plan_text), campaign_title, cover_path
+
+
+def generate_campaigns(n_ideas, max_parallel=4, show_covers=False):
+	# Generator of generate_campaign results, in the order the campaigns finish. A failed campaign is yielded as
+	# (concept, exception, None, None) so one bad idea does not stop the rest. show_covers plots each cover here,
+	# on the caller's thread.
+	from concurrent.futures import ThreadPoolExecutor
+	slots = threading.BoundedSemaphore(max_parallel)
+	finished = queue.Queue(maxsize=max_parallel)
+	stop = threading.Event()
+	DONE = object()
+
+	def run(concept, cover_pool):
+		try: result = generate_campaign(concept, cover_pool)
+		except Exception as e: result = (concept, e, None, None)
+		finished.put(result)
+		slots.release()
+
+	def produce(campaign_pool, cover_pool):
+		try:
+			for concept in stream_campaign_concepts(n_ideas):
+				slots.acquire()  # backpressure: the idea stream waits while max_parallel campaigns are running
+				if stop.is_set(): slots.release(); break
+				campaign_pool.submit(run, concept, cover_pool)
+		except Exception as e:
+			finished.put((None, e, None, None))
+		finally:
+			for _ in range(max_parallel): slots.acquire()  # every campaign has been handed over
+			finished.put(DONE)
+
+	with ThreadPoolExecutor(max_parallel) as campaign_pool, ThreadPoolExecutor(max_parallel) as cover_pool:
+		producer = threading.Thread(target=produce, args=(campaign_pool, cover_pool), daemon=True)
+		producer.start()
+		try:
+			while True:
+				result = finished.get()
+				if result is DONE: break
+				if show_covers and result[3]:
+					plt.imshow(mpimg.imread(result[3])); plt.axis('off'); plt.title(result[2]); plt.show()
+				yield result
+		finally:
+			# The caller stopped early: let running campaigns finish, start no new ones.
+			stop.set()
+			while producer.is_alive():
+				try: finished.get(timeout=0.1)
+				except queue.Empty: pass
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# Keep the suite off the working tree's caches, traces, jobs and archive; set before any campaignr import.
+_state_dir = tempfile.mkdtemp(prefix="campaignr-tests-")
+for name, default in (("CAMPAIGNR_TRACE", "off"), ("CAMPAIGNR_CACHE", "off"),
+                      ("CAMPAIGNR_TRACE_DIR", os.path.join(_state_dir, "traces")),
+                      ("CAMPAIGNR_CACHE_DIR", os.path.join(_state_dir, "cache")),
+                      ("CAMPAIGNR_JOBS_DIR", os.path.join(_state_dir, "jobs")),
+                      ("CAMPAIGNR_ARTIFACT_DIR", os.path.join(_state_dir, "artifacts")),
+                      ("CAMPAIGNR_ARCHIVE_DIR", os.path.join(_state_dir, "archive"))):
+    os.environ.setdefault(name, default)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
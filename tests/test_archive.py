@@ -0,0 +1,57 @@
+import pytest
+
+from campaignr.archive import CampaignArchive
+
+TEXT = "Raise a Glass to Health\n\n## Introduction\nStudents overestimate how much their peers drink.\n\n" \
+       "## Formative Research\nOverview.\n\n### Audience Analysis\nFirst-year students.\n"
+CONCEPT = {'communication_issue': "Binge drinking", 'need_and_audience': "College students", 'main_goal': "Drink less"}
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = CampaignArchive(str(tmp_path))
+    yield archive
+    archive.close()
+
+def test_round_trip(archive):
+    campaign_id = archive.add("Raise a Glass to Health", TEXT, cover=b"\x89PNG...", concept=CONCEPT, author="Ann",
+                              meta={'parallel_sections': True})
+    campaign = archive.get(campaign_id)
+    assert (campaign.title, campaign.author, campaign.concept, campaign.meta) == (
+        "Raise a Glass to Health", "Ann", CONCEPT, {'parallel_sections': True})
+    assert [(level, header) for level, header, _ in campaign.sections] == [
+        (2, "Introduction"), (2, "Formative Research"), (3, "Audience Analysis")]
+    assert archive.text(campaign) == TEXT and archive.cover(campaign) == b"\x89PNG..."
+    assert archive.get(campaign_id + 1) is None
+
+def test_search_matches_prefixes_in_body_and_concept(archive):
+    first = archive.add("Raise a Glass to Health", TEXT, concept=CONCEPT)
+    second = archive.add("Buckle Up", "Buckle Up\n\n## Introduction\nSeat belts save lives.\n")
+    assert [row[0] for row in archive.search("overestim")] == [first]
+    assert [row[0] for row in archive.search("binge")] == [first]
+    assert "**" in archive.search("peers")[0][3]
+    assert {row[0] for row in archive.search("")} == {first, second}
+
+def test_same_source_replaces_the_entry(archive):
+    archive.add("Old", TEXT, source="job:1")
+    campaign_id = archive.add("New", TEXT, source="job:1")
+    assert archive.stats()['campaigns'] == 1 and archive.get(campaign_id).title == "New"
+
+def test_update_text_reindexes(archive):
+    campaign_id = archive.add("Raise a Glass to Health", TEXT, html=b"<html>", pdf=b"%PDF")
+    assert archive.update_text(campaign_id, TEXT.replace("peers drink", "roommates drink"))
+    campaign = archive.get(campaign_id)
+    assert (campaign.html_key, campaign.pdf_key) == (None, None)
+    assert archive.search("roommates")[0][0] == campaign_id and not archive.search("peers")
+    assert not archive.update_text(campaign_id + 1, TEXT)
+
+def test_delete_and_concepts_since(archive):
+    kept = archive.add("Kept", TEXT, concept=CONCEPT)
+    dropped = archive.add("Dropped", TEXT, concept=CONCEPT)
+    archive.delete(dropped)
+    assert archive.get(dropped) is None and not archive.search("Dropped")
+    assert [(campaign_id, concept) for campaign_id, concept, _ in archive.concepts_since(0)] == [(kept, CONCEPT)]
+
+def test_reopens_from_disk(tmp_path):
+    campaign_id = CampaignArchive(str(tmp_path)).add("Raise a Glass to Health", TEXT)
+    reopened = CampaignArchive(str(tmp_path))
+    assert reopened.text(reopened.get(campaign_id)) == TEXT
@@ -0,0 +1,44 @@
+from campaignr.artifacts import ArtifactStore
+
+def test_round_trip_and_deduplication(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    first, second = store.put("proposal text", session="a"), store.put(b"proposal text", session="b")
+    assert first == second and store.get(first.key) == b"proposal text"
+    assert store.stats()['entries'] == 1 and store.stats()['disk_bytes'] == len("proposal text")
+
+def test_session_quota_drops_its_own_oldest_payload(tmp_path):
+    store = ArtifactStore(str(tmp_path), session_bytes=10)
+    old, new = store.put(b"a" * 6, session="a"), store.put(b"b" * 6, session="a")
+    assert store.get(old.key) is None and store.get(new.key) == b"b" * 6
+    assert store.session_bytes("a") == 6
+
+def test_quota_keeps_payloads_another_session_holds(tmp_path):
+    store = ArtifactStore(str(tmp_path), session_bytes=10)
+    shared = store.put(b"s" * 6, session="a")
+    store.put(b"s" * 6, session="b")
+    store.put(b"n" * 6, session="a")
+    assert store.get(shared.key) == b"s" * 6
+
+def test_disk_cap_evicts_least_recently_used(tmp_path):
+    store = ArtifactStore(str(tmp_path), disk_bytes=12)
+    first, second = store.put(b"1" * 6, session="a"), store.put(b"2" * 6, session="b")
+    store.get(first.key)
+    third = store.put(b"3" * 6, session="c")
+    assert store.contains(first.key) and not store.contains(second.key) and store.contains(third.key)
+    assert store.stats()['disk_bytes'] <= 12 and store.stats()['evictions'] == 1
+
+def test_large_payloads_are_read_from_disk_not_memory(tmp_path):
+    store = ArtifactStore(str(tmp_path), memory_bytes=40)
+    big = store.put(b"x" * 20, session="a")
+    assert store.stats()['memory_bytes'] == 0
+    assert store.get(big.key) == b"x" * 20 and store.stats()['loads'] == 1
+
+def test_release_forgets_a_session(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    artifact = store.put(b"draft", session="a")
+    store.release("a")
+    assert not store.contains(artifact.key) and store.session_bytes("a") == 0
+
+def test_payloads_survive_a_restart(tmp_path):
+    artifact = ArtifactStore(str(tmp_path)).put(b"kept", session="a")
+    assert ArtifactStore(str(tmp_path)).get(artifact.key) == b"kept"
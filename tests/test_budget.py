@@ -0,0 +1,51 @@
+import math
+
+import pytest
+
+from campaignr import budget
+from campaignr.budget import BudgetExceeded, TokenBudget, estimate_output_tokens, max_tokens_for, model_for
+
+def test_model_tiers_and_override(monkeypatch):
+    assert model_for("title") == "gpt-4o-mini" and model_for("section") == "gpt-4o"
+    assert model_for("something-new") == budget.MODEL_TIERS['proposal']
+    monkeypatch.setenv("CAMPAIGNR_MODEL_TITLE", "gpt-test")
+    assert model_for("title") == "gpt-test"
+
+def test_output_estimate_from_word_counts():
+    assert estimate_output_tokens("Write a summary of 80-150 words.") == math.ceil(150 * budget.TOKENS_PER_WORD)
+    prompt = "At least 500-700 words per main section.\n**## Intro**\n...\n**## Goals**\n...\n**### Detail**\n..."
+    assert estimate_output_tokens(prompt) == math.ceil(700 * 2 * budget.TOKENS_PER_WORD)     # two main sections
+    assert estimate_output_tokens("Name the campaign.", task="title") == 60
+    assert estimate_output_tokens("Name the campaign.") == budget.FALLBACK_OUTPUT_TOKENS
+
+def test_max_tokens_has_headroom_and_a_model_cap():
+    assert max_tokens_for(1000, "gpt-4o") == 1500
+    assert max_tokens_for(100000, "gpt-4o") == 16384 and max_tokens_for(100000, "unknown-model") == 4096
+
+def test_counting_falls_back_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(budget, "tiktoken", None)
+    monkeypatch.setattr(budget, "_encodings", {})
+    assert budget.count_tokens("abcdefghi") == 3
+    assert budget.count_prompt_tokens("abcd") == 1 + budget.MESSAGE_OVERHEAD_TOKENS
+
+def test_reserve_then_settle_replaces_the_booking():
+    tokens = TokenBudget(session_limit=1000, request_limit=0)
+    assert tokens.reserve(100, 200, 300, session="a") == (300, 300)
+    assert tokens.used("a") == 300 and tokens.remaining("a") == 700
+    tokens.settle(300, 150, session="a")
+    assert tokens.used("a") == 150
+
+def test_session_budget_is_per_session():
+    tokens = TokenBudget(session_limit=1000, request_limit=0)
+    tokens.reserve(100, 800, 900, session="a")
+    with pytest.raises(BudgetExceeded):
+        tokens.reserve(100, 200, 300, session="a")
+    assert tokens.used("a") == 900
+    assert tokens.reserve(100, 200, 300, session="b") == (300, 300)
+
+def test_request_ceiling_clamps_max_tokens():
+    tokens = TokenBudget(session_limit=0, request_limit=500)
+    assert tokens.reserve(450, 200, 300, session="a") == (50, 500)
+    with pytest.raises(BudgetExceeded):
+        tokens.reserve(500, 10, 10, session="a")
+    assert tokens.remaining("a") is None
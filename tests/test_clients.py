@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("openai")
+
+from campaignr import clients
+from campaignr.mock_server import start_mock_server
+
+@pytest.fixture
+def server():
+    server = start_mock_server(ttft_s=0, tokens_per_s=100000, image_latency_s=0, jitter=0)
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def one_client(monkeypatch):
+    monkeypatch.setattr(clients, "MAX_CLIENTS", 1)
+    monkeypatch.setattr(clients, "_clients", clients.OrderedDict())
+
+def test_same_key_shares_a_client(server, one_client):
+    assert clients.get_client("sk-a", server.base_url) is clients.get_client("sk-a", server.base_url)
+
+def test_idle_evicted_client_is_closed(server, one_client):
+    first = clients.get_client("sk-a", server.base_url)
+    first.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "Hi"}], max_tokens=5)
+    clients.get_client("sk-b", server.base_url)
+    assert first.is_closed()
+
+def test_evicted_client_stays_open_until_its_stream_ends(server, one_client):
+    first = clients.get_client("sk-a", server.base_url)
+    stream = first.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "Hi"}],
+                                           max_tokens=5, stream=True)
+    clients.get_client("sk-b", server.base_url)
+    assert not first.is_closed()
+    with stream:
+        for _ in stream: pass
+    assert first.is_closed()
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+from campaignr import engine
+from campaignr.jobs import JobCancelled
+from campaignr.prompts import DEFAULT_PROPOSAL_PROMPT
+from campaignr.proposal import split_prompt_sections
+from campaignr.scheduler import RequestScheduler
+from campaignr.validation import FormatIgnored
+
+SECTIONS = split_prompt_sections(DEFAULT_PROPOSAL_PROMPT)
+CONCEPT = {'communication_issue': "Binge drinking", 'need_and_audience': "Students", 'main_goal': "Drink less"}
+
+@pytest.fixture(autouse=True)
+def unlimited_scheduler(monkeypatch):
+    # The fake client's requests should not wait on the default gpt-4o tokens/min bucket.
+    scheduler = RequestScheduler(10 ** 6)
+    monkeypatch.setattr(engine, "get_scheduler", lambda model: scheduler)
+
+class FakeStream:
+    def __init__(self, deltas):
+        self.deltas, self.closed = deltas, False
+    def __iter__(self):
+        for delta in self.deltas:
+            if self.closed: return
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(finish_reason=None, delta=SimpleNamespace(content=delta))])
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): self.close()
+    def close(self): self.closed = True
+
+def fake_client(stream=None, reply="Raise a Glass to Health"):
+    def create(**kwargs):
+        if kwargs.get("stream"): return SimpleNamespace(parse=lambda: stream)
+        message = SimpleNamespace(content=reply)
+        return SimpleNamespace(parse=lambda: SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None))
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(with_raw_response=SimpleNamespace(create=create))))
+
+def test_stream_is_closed_after_reading():
+    stream = FakeStream(["Title\n", "## Introduction\n", "text"])
+    text, stats = engine.stream_complete(fake_client(stream), "prompt", use_cache=False)
+    assert text == "Title\n## Introduction\ntext" and stats['completion_tokens'] == 3
+    assert stream.closed
+
+@pytest.mark.parametrize("error", [FormatIgnored, JobCancelled])
+def test_stream_is_closed_when_on_delta_aborts(error):
+    stream = FakeStream(["a", "b", "c", "d"])
+    seen = []
+    def on_delta(text):
+        seen.append(text)
+        if len(seen) == 2: raise error()
+    with pytest.raises(error):
+        engine.stream_complete(fake_client(stream), "prompt", on_delta=on_delta, use_cache=False)
+    assert stream.closed and seen == ["a", "ab"]
+
+def test_sections_mode_reports_every_section():
+    finished = []
+    campaign = engine.generate_campaign(fake_client(), CONCEPT, use_cache=False, on_section=finished.append)
+    assert sorted(finished) == sorted(section.name for section in SECTIONS)
+    assert campaign.cover is None and campaign.cover_error
+
+def test_stream_mode_reports_the_last_section_too():
+    text = "Raise a Glass to Health\n\n" + "\n\n".join(f"{s.header}\nText for {s.name}." for s in SECTIONS) + "\n"
+    finished = []
+    engine.generate_campaign(fake_client(FakeStream([text[i:i + 9] for i in range(0, len(text), 9)])), CONCEPT,
+                             parallel_sections=False, stream=True, use_cache=False, on_section=finished.append)
+    assert sorted(finished) == sorted(section.name for section in SECTIONS) and finished[-1] == "Appendix"
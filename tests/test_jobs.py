@@ -0,0 +1,47 @@
+import threading
+import time
+
+from campaignr import jobs
+from campaignr.jobs import JobRunner
+
+def wait(runner, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while runner.get(job_id).active and time.monotonic() < deadline: time.sleep(0.01)
+    return runner.get(job_id)
+
+def test_finished_job_leaves_memory_but_reloads_from_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "PRUNE_INTERVAL_S", 0)
+    runner = JobRunner(directory=str(tmp_path), workers=1, keep_s=0)
+    try:
+        job = runner.submit("alice", "test", lambda job: None)
+        assert wait(runner, job.id).status == "done"
+        runner.prune()
+        assert job.id not in runner._jobs
+        reloaded = runner.get(job.id)
+        assert reloaded is not job and reloaded.status == "done"
+    finally:
+        runner.close()
+
+def test_get_prunes_finished_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "PRUNE_INTERVAL_S", 0)
+    runner = JobRunner(directory=str(tmp_path), workers=1, keep_s=0)
+    try:
+        first = runner.submit("alice", "test", lambda job: None)
+        wait(runner, first.id)
+        runner.get("0" * 32)
+        assert first.id not in runner._jobs
+    finally:
+        runner.close()
+
+def test_cancel_stops_a_running_job(tmp_path):
+    started = threading.Event()
+    def fn(job):
+        started.set()
+        while True: job.check_cancelled(); time.sleep(0.01)
+    runner = JobRunner(directory=str(tmp_path), workers=1)
+    try:
+        job = runner.submit("alice", "test", fn)
+        assert started.wait(5) and runner.cancel(job.id)
+        assert wait(runner, job.id).status == "cancelled"
+    finally:
+        runner.close()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "old_jupyter"))
+utils = pytest.importorskip("utils")
+
+PLAN = "{{0. Raise a Glass to Health!}}\n\n{{1. Introduction}} intro text\n\n{{2. Goals}} goals"
+
+def fake_stream(prompt):
+    for i in range(0, len(PLAN), 7): yield PLAN[i:i + 7]
+
+def test_plan_starts_with_title(monkeypatch):
+    monkeypatch.setattr(utils, "stream_simple", fake_stream)
+    monkeypatch.setattr(utils, "download_campaign_cover", lambda title: f"{title}.png")
+    concept, plan, title, cover = utils.generate_campaign("Issue: x. Need: y. Goal: z.")
+    assert plan[0] == "{{0. Raise a Glass to Health!}}"
+    assert plan[1] == "{{1. Introduction}} intro text"
+    assert title == "Raise a Glass to Health - A campAIgnR project" and cover == f"{title}.png"
+
+def test_generate_campaigns_plans_start_with_title(monkeypatch):
+    ideas = "{{1. Issue: a. Need: b. Goal: c.}}\n{{2. Issue: d. Need: e. Goal: f.}}"
+    monkeypatch.setattr(utils, "stream_simple", lambda prompt: iter([ideas]) if "concept ideas" in prompt else fake_stream(prompt))
+    monkeypatch.setattr(utils, "download_campaign_cover", lambda title: f"{title}.png")
+    results = list(utils.generate_campaigns(2, max_parallel=2))
+    assert len(results) == 2
+    assert all(plan[0].startswith("{{0.") for _, plan, _, _ in results)
+
+def test_star_import_exports_the_api_names(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    namespace = {}
+    exec("from utils import *", namespace)
+    assert {"OpenAI", "openai_client", "headers", "http_session", "np", "plt"} <= set(namespace)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(utils, "_connections", {})
+    assert dict(namespace["headers"])["Authorization"] == "Bearer sk-test"
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+from campaignr.scheduler import RequestScheduler, parse_duration
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code, self.response = status_code, None
+
+def test_parse_duration():
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("0.5") == 0.5 and parse_duration(None) is None
+
+def test_waiting_sessions_are_served_round_robin():
+    scheduler = RequestScheduler(requests_per_min=600)      # one request every 0.1 s once the bucket is empty
+    scheduler.requests.level, scheduler.requests.updated = 0.0, time.monotonic()
+    order = []
+    def request(session, number):
+        scheduler.call(lambda: order.append((session, number)), session=session)
+    threads = [threading.Thread(target=request, args=args) for args in (("a", 1), ("a", 2), ("a", 3), ("b", 1))]
+    for thread in threads: thread.start(); time.sleep(0.02)
+    for thread in threads: thread.join(5)
+    assert order == [("a", 1), ("b", 1), ("a", 2), ("a", 3)]
+
+def test_rate_limited_call_is_retried():
+    scheduler = RequestScheduler(requests_per_min=1000, base_delay_s=0)
+    attempts = []
+    def fn():
+        attempts.append(1)
+        if len(attempts) == 1: raise FakeAPIError(429)
+        return "ok"
+    assert scheduler.call(fn) == "ok"
+    stats = scheduler.stats()
+    assert (stats['calls'], stats['retries'], stats['rate_limited'], stats['failures']) == (2, 1, 1, 0)
+
+def test_client_errors_are_not_retried():
+    scheduler = RequestScheduler(requests_per_min=1000, base_delay_s=0)
+    with pytest.raises(FakeAPIError):
+        scheduler.call(lambda: (_ for _ in ()).throw(FakeAPIError(400)))
+    assert (scheduler.stats()['calls'], scheduler.stats()['failures']) == (1, 1)
+
+def test_gives_up_after_max_retries():
+    scheduler = RequestScheduler(requests_per_min=1000, max_retries=2, base_delay_s=0)
+    with pytest.raises(FakeAPIError):
+        scheduler.call(lambda: (_ for _ in ()).throw(FakeAPIError(503)))
+    assert (scheduler.stats()['calls'], scheduler.stats()['retries']) == (3, 2)
+
+def test_response_headers_resync_the_buckets():
+    scheduler = RequestScheduler(requests_per_min=500, tokens_per_min=30000)
+    scheduler.observe({'x-ratelimit-limit-requests': "100", 'x-ratelimit-remaining-requests': "5",
+                       'x-ratelimit-limit-tokens': "1000", 'x-ratelimit-remaining-tokens': "250"})
+    stats = scheduler.stats()
+    assert (stats['requests_left'], stats['tokens_left']) == (5, 250)
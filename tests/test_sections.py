@@ -0,0 +1,39 @@
+import os
+import re
+
+import pytest
+
+from campaignr.sections import parse_sections
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(REPO_DIR, "old_jupyter", "00_ingredients", "script.txt")
+
+def legacy_split(text):
+    # old_jupyter/utils.py's split_text_into_sections before the incremental parser, kept as the reference.
+    pattern = r'(\{\{\d+[^}]*\}\})'
+    structured_sections, current_section = [], ''
+    for part in re.split(pattern, text):
+        if re.match(pattern, part):
+            if current_section: structured_sections.append(current_section.strip())
+            current_section = part
+        else:
+            current_section += " " + part.strip()
+    if current_section: structured_sections.append(current_section.strip())
+    return [section for section in structured_sections if section]
+
+def marked(text):
+    return parse_sections(text, dialects=("legacy",)).marked()
+
+def test_marker_first_has_no_empty_preamble():
+    text = "{{0. My Title}}\n{{1. Introduction}} intro text"
+    assert marked(text) == legacy_split(text) == ['{{0. My Title}}', '{{1. Introduction}} intro text']
+
+def test_preamble_comes_first():
+    text = "Here is the plan.\n\n{{0. My Title}}\n\n{{1. Introduction}}: intro\n\n{{3.1 Formative Research - Situation Analysis}}, causes"
+    assert marked(text) == legacy_split(text)
+    assert marked(text)[0] == "Here is the plan."
+
+@pytest.mark.skipif(not os.path.exists(SCRIPT_PATH), reason="recorded script not available")
+def test_recorded_script():
+    with open(SCRIPT_PATH, encoding="utf-8") as f: text = f.read()
+    assert marked(text) == legacy_split(text)
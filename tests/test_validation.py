@@ -0,0 +1,29 @@
+from campaignr.prompts import DEFAULT_PROPOSAL_PROMPT
+from campaignr.proposal import split_prompt_sections
+from campaignr.validation import validate_proposal
+
+SECTIONS = split_prompt_sections(DEFAULT_PROPOSAL_PROMPT)
+
+def proposal(last_line="Thank you"):
+    parts = ["Raise a Glass to Health"]
+    parts += [f"{section.header}\nText for {section.name}." for section in SECTIONS]
+    return "\n\n".join(parts) + f"\n{last_line}\n"
+
+def kinds(validator): return [(issue.kind, issue.header) for issue in validator.problems]
+
+def test_complete_plan_is_ok():
+    assert validate_proposal(proposal(), SECTIONS).ok
+    assert validate_proposal(proposal(), SECTIONS, finish_reason="stop").ok
+
+def test_finish_reason_length_is_truncated():
+    assert kinds(validate_proposal(proposal(), SECTIONS, "length")) == [("truncated", "## Appendix")]
+
+def test_open_clause_is_truncated_without_finish_reason():
+    assert kinds(validate_proposal(proposal("and the budget covers posters,"), SECTIONS)) == [("truncated", "## Appendix")]
+
+def test_known_finish_reason_overrides_the_heuristic():
+    assert validate_proposal(proposal("and the budget covers posters,"), SECTIONS, "stop").ok
+
+def test_skipped_and_drifted_sections():
+    text = proposal().replace("## Goals\n", "**2. Goals**\n").replace("## Evaluation\nText for Evaluation.\n\n", "")
+    assert kinds(validate_proposal(text, SECTIONS)) == [("drift", "## Goals"), ("missing", "## Evaluation")]